@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import Base, DATABASE_URL
-from models import User, VoiceHistory, Payment, GeneratedVideo  # ensure all models are imported
+from models import User, VoiceHistory, Payment, GeneratedVideo, TTSJob, VideoJob  # ensure all models are imported
 
 # Load .env
 load_dotenv()
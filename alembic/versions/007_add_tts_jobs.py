@@ -0,0 +1,51 @@
+"""add tts_jobs table
+
+Revision ID: 007_add_tts_jobs
+Revises: 006_add_missing_user_columns
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_add_tts_jobs'
+down_revision = '006_add_missing_user_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Detect database type for datetime defaults
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == 'sqlite'
+    # SQLite uses datetime('now'), PostgreSQL uses now()
+    datetime_default = sa.text("(datetime('now'))") if is_sqlite else sa.text('now()')
+
+    op.create_table('tts_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('progress', sa.Float(), server_default='0', nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('voice', sa.String(), nullable=False),
+    sa.Column('word_count', sa.Integer(), nullable=False),
+    sa.Column('webhook_url', sa.String(), nullable=True),
+    sa.Column('audio_path', sa.String(), nullable=True),
+    sa.Column('audio_size', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=datetime_default, nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tts_jobs_id'), 'tts_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_tts_jobs_user_id'), 'tts_jobs', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_tts_jobs_user_id'), table_name='tts_jobs')
+    op.drop_index(op.f('ix_tts_jobs_id'), table_name='tts_jobs')
+    op.drop_table('tts_jobs')
@@ -0,0 +1,25 @@
+"""add composite (user_id, created_at, id) index to voice_history
+
+Revision ID: 008_add_voice_history_keyset_index
+Revises: 007_add_tts_jobs
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_voice_history_keyset_index'
+down_revision = '007_add_tts_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves GET /api/history pages (WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT n)
+    # straight from the index, whatever the size of the user's history
+    op.create_index('ix_voice_history_user_created_id', 'voice_history', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_voice_history_user_created_id', table_name='voice_history')
@@ -0,0 +1,67 @@
+"""add full-text search index over voice_history.text
+
+Revision ID: 009_add_voice_history_search
+Revises: 008_add_voice_history_keyset_index
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_voice_history_search'
+down_revision = '008_add_voice_history_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == 'sqlite'
+
+    if is_sqlite:
+        # External-content FTS5 table (rowid = voice_history.id) kept current by triggers
+        op.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS voice_history_fts USING fts5(
+                text, content='voice_history', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS voice_history_fts_ai AFTER INSERT ON voice_history BEGIN
+                INSERT INTO voice_history_fts(rowid, text) VALUES (new.id, new.text);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS voice_history_fts_ad AFTER DELETE ON voice_history BEGIN
+                INSERT INTO voice_history_fts(voice_history_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS voice_history_fts_au AFTER UPDATE OF text ON voice_history BEGIN
+                INSERT INTO voice_history_fts(voice_history_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO voice_history_fts(rowid, text) VALUES (new.id, new.text);
+            END
+        """)
+        # Index the existing history
+        op.execute("INSERT INTO voice_history_fts(voice_history_fts) VALUES ('rebuild')")
+    else:
+        # Generated tsvector column (computed on write, existing rows filled by the ALTER) with a GIN index
+        op.execute("""
+            ALTER TABLE voice_history ADD COLUMN IF NOT EXISTS text_search tsvector
+                GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED
+        """)
+        op.execute("CREATE INDEX IF NOT EXISTS ix_voice_history_text_search ON voice_history USING GIN (text_search)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == 'sqlite'
+
+    if is_sqlite:
+        op.execute("DROP TRIGGER IF EXISTS voice_history_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS voice_history_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS voice_history_fts_ai")
+        op.execute("DROP TABLE IF EXISTS voice_history_fts")
+    else:
+        op.execute("DROP INDEX IF EXISTS ix_voice_history_text_search")
+        op.execute("ALTER TABLE voice_history DROP COLUMN IF EXISTS text_search")
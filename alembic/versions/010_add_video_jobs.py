@@ -0,0 +1,50 @@
+"""add video_jobs table
+
+Revision ID: 010_add_video_jobs
+Revises: 009_add_voice_history_search
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_video_jobs'
+down_revision = '009_add_voice_history_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Detect database type for datetime defaults
+    bind = op.get_bind()
+    is_sqlite = bind.dialect.name == 'sqlite'
+    # SQLite uses datetime('now'), PostgreSQL uses now()
+    datetime_default = sa.text("(datetime('now'))") if is_sqlite else sa.text('now()')
+
+    op.create_table('video_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('image_paths', sa.Text(), nullable=False),
+    sa.Column('duration_seconds', sa.Integer(), nullable=False),
+    sa.Column('crossfade', sa.Boolean(), nullable=False),
+    sa.Column('transition', sa.String(), nullable=False),
+    sa.Column('video_url', sa.String(), nullable=True),
+    sa.Column('video_size', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=datetime_default, nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_video_jobs_id'), 'video_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_video_jobs_user_id'), 'video_jobs', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_video_jobs_user_id'), table_name='video_jobs')
+    op.drop_index(op.f('ix_video_jobs_id'), table_name='video_jobs')
+    op.drop_table('video_jobs')
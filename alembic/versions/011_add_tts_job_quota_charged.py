@@ -0,0 +1,25 @@
+"""add quota_charged to tts_jobs
+
+Revision ID: 011_add_tts_job_quota_charged
+Revises: 010_add_video_jobs
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_tts_job_quota_charged'
+down_revision = '010_add_video_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Set once a job's quota reservation is taken, so a job requeued after a restart is not charged twice
+    op.add_column('tts_jobs', sa.Column('quota_charged', sa.Boolean(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('tts_jobs', 'quota_charged')
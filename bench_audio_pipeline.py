@@ -0,0 +1,129 @@
+"""
+Micro-benchmark: pydub AudioSegment post-processing vs the NumPy PCM pipeline.
+
+Both paths decode an MP3 once, apply gain, peak-normalize, mix a watermark beep
+every 10 seconds, fade in/out and encode back to MP3. Times are reported per
+phase (ms, median): decode and encode run ffmpeg in both paths, "stages" is
+the in-memory processing that the pipeline vectorizes.
+
+pydub is only needed here: pip install -r requirements-dev.txt
+
+Usage:
+    python bench_audio_pipeline.py                 # 10s, 60s and 5min clips
+    python bench_audio_pipeline.py --repeat 5 --durations 10 60
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+
+from utils import audio_utils  # configures ffmpeg (FFMPEG_BINARY / PATH)
+from utils import pcm_pipeline
+
+SAMPLE_RATE = 24000
+BITRATE_KBPS = 64
+WATERMARK_INTERVAL_SECONDS = 10
+WATERMARK_MS = 300
+FADE_IN_MS = 50
+FADE_OUT_MS = 500
+
+
+def make_clip(seconds: int) -> bytes:
+    """Speech-like test clip: a wandering tone with syllable-rate amplitude modulation, as MP3"""
+    t = np.arange(seconds * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t)) ** 2 / 4
+    samples = (0.4 * envelope * (np.sin(phase) + 0.3 * np.sin(3 * phase))).astype(np.float32)
+    return pcm_pipeline.encode(pcm_pipeline.Pcm(samples, SAMPLE_RATE), "mp3", BITRATE_KBPS)
+
+
+def process_pydub(audio_data: bytes) -> dict:
+    """Returns the time spent in each phase (decode, stages, encode)"""
+    from pydub import AudioSegment
+    from pydub.effects import normalize
+    from pydub.generators import Sine
+
+    # As audio_utils configured pydub before the PCM pipeline replaced it
+    if audio_utils.ffmpeg_binary:
+        AudioSegment.converter = audio_utils.ffmpeg_binary
+
+    started = time.perf_counter()
+    # codec given explicitly so pydub does not need ffprobe
+    segment = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3", codec="mp3")
+    decoded = time.perf_counter()
+    segment = segment.apply_gain(-3)
+    segment = normalize(segment, headroom=1.0)
+    beep = Sine(audio_utils.WATERMARK_FREQUENCY, sample_rate=segment.frame_rate).to_audio_segment(
+        duration=WATERMARK_MS, volume=audio_utils.WATERMARK_VOLUME_DB
+    ).set_channels(segment.channels)
+    for position in range(0, len(segment), WATERMARK_INTERVAL_SECONDS * 1000):
+        segment = segment.overlay(beep, position=position)
+    segment = segment.fade_in(FADE_IN_MS).fade_out(FADE_OUT_MS)
+    processed = time.perf_counter()
+    output = io.BytesIO()
+    segment.export(output, format="mp3", bitrate=f"{BITRATE_KBPS}k")
+    return {"decode": decoded - started, "stages": processed - decoded, "encode": time.perf_counter() - processed}
+
+
+def _beep(sample_rate: int, channels: int) -> pcm_pipeline.Pcm:
+    return pcm_pipeline.tone(audio_utils.WATERMARK_FREQUENCY, WATERMARK_MS, sample_rate, channels, audio_utils.WATERMARK_VOLUME_DB)
+
+
+NUMPY_PIPELINE = pcm_pipeline.Pipeline(
+    pcm_pipeline.gain(-3),
+    pcm_pipeline.normalize(-1.0),
+    pcm_pipeline.overlay_every(_beep, WATERMARK_INTERVAL_SECONDS),
+    pcm_pipeline.fade_in(FADE_IN_MS),
+    pcm_pipeline.fade_out(FADE_OUT_MS),
+)
+
+
+def process_numpy(audio_data: bytes) -> dict:
+    """Same work as process_pydub through the PCM pipeline (Pipeline.process, split into phases)"""
+    started = time.perf_counter()
+    pcm = pcm_pipeline.decode(audio_data)
+    decoded = time.perf_counter()
+    pcm = NUMPY_PIPELINE.run(pcm)
+    processed = time.perf_counter()
+    pcm_pipeline.encode(pcm, "mp3", BITRATE_KBPS)
+    return {"decode": decoded - started, "stages": processed - decoded, "encode": time.perf_counter() - processed}
+
+
+def _time(fn, audio_data: bytes, repeat: int) -> dict:
+    """Median time per phase (ms) over repeat runs, plus the total"""
+    runs = [fn(audio_data) for _ in range(repeat)]
+    phases = {phase: statistics.median(run[phase] for run in runs) * 1000 for phase in runs[0]}
+    phases["total"] = statistics.median(sum(run.values()) for run in runs) * 1000
+    return phases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=int, nargs="+", default=[10, 60, 300], help="clip lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (median is reported)")
+    args = parser.parse_args()
+
+    header = f"{'clip':>6}  {'path':<6}" + "".join(f"{phase:>10}" for phase in ("decode", "stages", "encode", "total"))
+    print(header + f"{'stages x':>10}{'total x':>9}")
+    for seconds in args.durations:
+        clip = make_clip(seconds)
+        numpy_ms = _time(process_numpy, clip, args.repeat)
+        try:
+            pydub_ms = _time(process_pydub, clip, args.repeat)
+        except Exception as e:
+            print(f"{seconds:>5}s  pydub failed: {type(e).__name__}: {e}")
+            pydub_ms = None
+        for name, phases in (("pydub", pydub_ms), ("numpy", numpy_ms)):
+            if phases is None:
+                continue
+            row = f"{seconds:>5}s  {name:<6}" + "".join(f"{phases[phase]:>10.1f}" for phase in ("decode", "stages", "encode", "total"))
+            if name == "numpy" and pydub_ms is not None:
+                row += f"{pydub_ms['stages'] / max(numpy_ms['stages'], 1e-6):>9.1f}x{pydub_ms['total'] / numpy_ms['total']:>8.1f}x"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
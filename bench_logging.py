@@ -0,0 +1,157 @@
+"""
+Benchmark: request throughput with logging to a slow stdout consumer.
+
+Each simulated request goes through RequestContextMiddleware and emits the
+lines a TTS request used to (about 30 INFO lines, one of them a header dump).
+The worker process's stdout is a pipe drained by a deliberately slow reader,
+as when logs go to a busy log shipper or a slow terminal. Modes:
+
+    print     print(..., flush=True), as routes/video.py and main.serve_video did
+    sync      a StreamHandler on stdout, written on the event loop
+    queue     utils.logging_setup: JSON records written by the QueueListener thread
+    sampled   queue, plus LOG_SAMPLING-style 1% sampling of the request's INFO lines
+
+Reported: requests/s while serving, worst event-loop stall (a 1 ms ticker runs
+alongside), records dropped because the log queue was full.
+
+Usage:
+    python bench_logging.py
+    python bench_logging.py --requests 2000 --reader-delay-ms 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+LINES_PER_REQUEST = 30
+HEADERS = {f"x-header-{i}": "value-" + "x" * 40 for i in range(20)}
+
+
+def _worker(mode: str, requests: int, concurrency: int) -> dict:
+    from utils import logging_setup
+
+    logger = logging.getLogger("bench.tts")
+    if mode == "sync":
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(logging_setup.TEXT_FORMAT.replace("[%(request_id)s] ", "")))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+    elif mode in ("queue", "sampled"):
+        logging_setup.configure_logging(sampling={"bench.tts": 0.01} if mode == "sampled" else {})
+
+    def emit(index: int) -> None:
+        for line in range(LINES_PER_REQUEST - 1):
+            message = f"[LAMONFOX] request {index} step {line}: text length 240 chars, voice sarah, format mp3"
+            if mode == "print":
+                print(message, flush=True)
+            else:
+                logger.info(message)
+        if mode == "print":
+            print(f"[LAMONFOX] Response headers: {HEADERS}", flush=True)
+        else:
+            logger.info(f"[LAMONFOX] Response headers: {HEADERS}")
+
+    async def app(scope, receive, send):
+        emit(scope["index"])
+        await asyncio.sleep(0)  # the upstream call
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = logging_setup.RequestContextMiddleware(app)
+
+    async def _noop_receive():
+        return {"type": "http.request"}
+
+    async def _noop_send(message):
+        pass
+
+    async def run() -> dict:
+        worst_stall = 0.0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal worst_stall
+            while not done.is_set():
+                before = time.perf_counter()
+                await asyncio.sleep(0.001)
+                worst_stall = max(worst_stall, time.perf_counter() - before - 0.001)
+
+        tick = asyncio.create_task(ticker())
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index: int):
+            async with semaphore:
+                await middleware({"type": "http", "headers": [], "index": index}, _noop_receive, _noop_send)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await tick
+        return {"elapsed": elapsed, "stall_ms": worst_stall * 1000}
+
+    result = asyncio.run(run())
+    stats = logging_setup.logging_stats() or {}
+    drain_started = time.perf_counter()
+    logging_setup.stop_logging()
+    result["drain"] = time.perf_counter() - drain_started
+    result["dropped"] = stats.get("dropped", 0)
+    result["written"] = stats.get("written", requests * LINES_PER_REQUEST)
+    return result
+
+
+def _slow_reader(stream, delay: float) -> None:
+    """Consume the worker's stdout in 4 KB reads with a pause after each"""
+    while stream.read(4096):
+        time.sleep(delay)
+
+
+def _run_mode(mode: str, args) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--worker", mode, "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    reader = threading.Thread(target=_slow_reader, args=(process.stdout, args.reader_delay_ms / 1000), daemon=True)
+    reader.start()
+    stderr = process.stderr.read()  # the worker reports on stderr; stdout belongs to the slow reader
+    process.wait()
+    reader.join(timeout=30)
+    lines = stderr.decode().strip().splitlines()
+    if process.returncode != 0 or not lines:
+        raise RuntimeError(f"{mode} worker failed: {stderr.decode()[-500:]}")
+    return json.loads(lines[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--reader-delay-ms", type=float, default=1.0, help="pause after each 4 KB read of stdout")
+    parser.add_argument("--modes", nargs="+", default=["print", "sync", "queue", "sampled"])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = _worker(args.worker, args.requests, args.concurrency)
+        print(json.dumps(result), file=sys.stderr)
+        return
+
+    print(f"{args.requests} requests x {LINES_PER_REQUEST} lines, stdout reader pauses {args.reader_delay_ms} ms per 4 KB")
+    print(f"{'mode':<8}{'req/s':>10}{'max stall ms':>14}{'written':>10}{'dropped':>9}{'drain s':>9}")
+    for mode in args.modes:
+        result = _run_mode(mode, args)
+        print(
+            f"{mode:<8}{args.requests / result['elapsed']:>10.0f}{result['stall_ms']:>14.1f}"
+            f"{result['written']:>10}{result['dropped']:>9}{result['drain']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -49,6 +49,95 @@ class Settings:
     if os.getenv("CORS_ALLOW_ALL", "false").lower() == "true":
         ALLOWED_ORIGINS = ["*"]
 
+    # TTS audio cache (in-memory LRU + on-disk store), sizes in bytes
+    # Set a budget to 0 to disable that tier
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+    TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+    TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+    # Sentence-level audio store used for incremental resynthesis of edited texts
+    TTS_SENTENCE_CACHE_DIR = os.getenv("TTS_SENTENCE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_sentence_cache"))
+    TTS_SENTENCE_CACHE_MEMORY_BYTES = int(os.getenv("TTS_SENTENCE_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+    TTS_SENTENCE_CACHE_DISK_BYTES = int(os.getenv("TTS_SENTENCE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+    TTS_INCREMENTAL_DEFAULT = os.getenv("TTS_INCREMENTAL_DEFAULT", "false").lower() == "true"
+
+    # Chunked synthesis for long texts: texts longer than the threshold are split
+    # at sentence boundaries and synthesized concurrently
+    TTS_CHUNK_THRESHOLD_CHARS = int(os.getenv("TTS_CHUNK_THRESHOLD_CHARS", "600"))
+    TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "400"))
+    TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))
+
+    # Outbound HTTP clients: HTTP/2 needs the optional 'h2' package; warm-up pre-connects at startup
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+    HTTP_WARMUP_ENABLED = os.getenv("HTTP_WARMUP_ENABLED", "true").lower() == "true"
+
+    @staticmethod
+    def upstream(group: str, name: str, setting: str, default):
+        """
+        Per-upstream override <GROUP>_<NAME>_<SETTING>, or default when unset (callers cast):
+          HTTP_<NAME>_      TIMEOUT, CONNECT_TIMEOUT, MAX_CONNECTIONS, MAX_KEEPALIVE, KEEPALIVE_EXPIRY
+          GOVERNOR_<NAME>_  REQUESTS_PER_SECOND, CHARS_PER_SECOND, MIN_CONCURRENCY, MAX_CONCURRENCY,
+                            LATENCY_TARGET, MAX_ATTEMPTS, DEADLINE
+          CIRCUIT_<NAME>_   FAILURE_THRESHOLD, RESET_TIMEOUT, PROBE_INTERVAL
+        e.g. HTTP_LEMONFOX_TIMEOUT=90, GOVERNOR_LEMONFOX_REQUESTS_PER_SECOND=3
+        """
+        value = os.getenv(f"{group}_{name.upper()}_{setting}")
+        return default if value is None else value
+
+    # Token for /internal/* status endpoints (unset = the endpoints are disabled)
+    INTERNAL_STATUS_TOKEN = os.getenv("INTERNAL_STATUS_TOKEN")
+
+    # TTS providers, in order of preference (router picks the fastest healthy one)
+    TTS_PROVIDERS = [name.strip() for name in os.getenv("TTS_PROVIDERS", "lemonfox,elevenlabs").split(",") if name.strip()]
+    # Hedged requests: when the best provider is slower than its p95, also ask the next one
+    TTS_HEDGE_ENABLED = os.getenv("TTS_HEDGE_ENABLED", "false").lower() == "true"
+    TTS_HEDGE_MIN_SAMPLES = int(os.getenv("TTS_HEDGE_MIN_SAMPLES", "20"))
+
+    # Batch TTS (POST /api/generate-voice/batch): items per request, items synthesized at once
+    TTS_BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", "50"))
+    TTS_BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", "4"))
+
+    # GET /api/history page size (default and maximum ?limit=)
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+    # Content-addressed store for generated audio (paid history, finished jobs)
+    AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_store"))
+
+    # Voice catalog: list refreshed every VOICE_CATALOG_TTL_SECONDS, one pre-rendered sample per voice
+    VOICE_CATALOG_TTL_SECONDS = float(os.getenv("VOICE_CATALOG_TTL_SECONDS", "3600"))
+    VOICE_PREVIEW_DIR = os.getenv("VOICE_PREVIEW_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_previews"))
+    VOICE_PREVIEW_TEXT = os.getenv("VOICE_PREVIEW_TEXT", "Hello! This is a short sample of my voice.")
+
+    # Write-behind usage counters (opt-in): flushed to the users table every USAGE_FLUSH_INTERVAL_MS or
+    # after USAGE_FLUSH_EVENTS changes. Only for a single worker process: the counts live in its memory
+    USAGE_WRITE_BEHIND = os.getenv("USAGE_WRITE_BEHIND", "false").lower() == "true"
+    USAGE_FLUSH_INTERVAL_MS = int(os.getenv("USAGE_FLUSH_INTERVAL_MS", "500"))
+    USAGE_FLUSH_EVENTS = int(os.getenv("USAGE_FLUSH_EVENTS", "100"))
+
+    # Daily voice counts are reset for all users at midnight in this time zone
+    DAILY_RESET_TIMEZONE = os.getenv("DAILY_RESET_TIMEZONE", "Asia/Karachi")
+
+    # Background TTS jobs: TTS_JOB_WORKERS jobs run at once, at most TTS_JOB_QUEUE_SIZE wait in the queue
+    TTS_JOB_WORKERS = int(os.getenv("TTS_JOB_WORKERS", "2"))
+    TTS_JOB_QUEUE_SIZE = int(os.getenv("TTS_JOB_QUEUE_SIZE", "100"))
+    TTS_JOB_WEBHOOK_ATTEMPTS = int(os.getenv("TTS_JOB_WEBHOOK_ATTEMPTS", "3"))
+
+    # Slideshow render jobs: VIDEO_RENDER_WORKERS processes encode at once, at most
+    # VIDEO_JOB_QUEUE_SIZE jobs wait; POST /api/video/slideshow waits up to VIDEO_SLIDESHOW_WAIT_SECONDS
+    VIDEO_RENDER_WORKERS = int(os.getenv("VIDEO_RENDER_WORKERS", "1"))
+    VIDEO_JOB_QUEUE_SIZE = int(os.getenv("VIDEO_JOB_QUEUE_SIZE", "20"))
+    VIDEO_SLIDESHOW_WAIT_SECONDS = float(os.getenv("VIDEO_SLIDESHOW_WAIT_SECONDS", "300"))
+
+    # Logging: JSON (or "text") lines written by a background thread. LOG_LEVELS sets per-module
+    # levels; LOG_SAMPLING keeps that fraction of a module's sub-WARNING records per request
+    # (all of them when the request fails). Both take "module=value,..."
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "services.lamonfox_service=DEBUG")
+    LOG_SAMPLING = os.getenv("LOG_SAMPLING", "services.lamonfox_service=0.01,routes.tts=0.01")
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
     # Plan Settings
     TRIAL_DAILY_LIMIT = 3
     PLAN_PRICES = {
@@ -6,8 +6,8 @@ import shutil
 sys.stdout.flush()
 sys.stderr.flush()
 
-# Configure ffmpeg PATH before any imports that might use it (pydub, moviepy)
-# This ensures ffmpeg is available when pydub/moviepy check for it at import time
+# Configure ffmpeg PATH before any imports that might use it (moviepy, the audio pipeline)
+# This ensures ffmpeg is available when moviepy checks for it at import time
 try:
     import imageio_ffmpeg
     ffmpeg_binary = imageio_ffmpeg.get_ffmpeg_exe()
@@ -43,8 +43,20 @@ try:
     from utils.jwt_handler import get_password_hash
     print("✅ Models imported", flush=True)
     
-    from routes import auth, tts, payments, video
+    from routes import audio, auth, tts, payments, video
     print("✅ Routes imported", flush=True)
+
+    # After the route imports: modules set their logger levels at import and LOG_LEVELS overrides them
+    from config import settings as log_settings
+    from utils.logging_setup import RequestContextMiddleware, configure_logging, parse_module_settings
+    configure_logging(
+        level=log_settings.LOG_LEVEL,
+        fmt=log_settings.LOG_FORMAT,
+        module_levels=parse_module_settings(log_settings.LOG_LEVELS, str),
+        sampling=parse_module_settings(log_settings.LOG_SAMPLING, float),
+        queue_size=log_settings.LOG_QUEUE_SIZE,
+    )
+    print(f"✅ Logging configured ({log_settings.LOG_FORMAT}, written off the event loop)", flush=True)
     
     # Check TTS service configuration on startup
     print("=" * 50, flush=True)
@@ -124,8 +136,11 @@ async def startup_db_check():
     """Ensure database tables exist on startup and default admin is created"""
     try:
         from models import Admin
+        from services.history_search import history_search
         Base.metadata.create_all(bind=engine)
         print("✅ Database tables verified on startup event!", flush=True)
+        # Full-text index of voice history (SQLite FTS5 / PostgreSQL tsvector), if the migration has not created it
+        history_search.ensure_index(engine)
         
         # Ensure default admin exists
         db = SessionLocal()
@@ -142,6 +157,117 @@ async def startup_db_check():
     except Exception as e:
         print(f"⚠️ Database startup check warning: {e}", flush=True)
 
+# Pre-encode watermark variants so trial audio is watermarked without decoding
+@app.on_event("startup")
+async def startup_prepare_watermarks():
+    """Encode watermark variants in a background thread (requests fall back to decoding until ready)"""
+    import asyncio
+    from utils.audio_utils import prepare_watermarks
+
+    async def _prepare():
+        try:
+            count = await asyncio.to_thread(prepare_watermarks)
+            print(f"✅ Pre-encoded {count} watermark variants", flush=True)
+        except Exception as e:
+            print(f"⚠️ Could not pre-encode watermarks: {e}", flush=True)
+
+    asyncio.create_task(_prepare())
+
+# Process pool for CPU-bound audio post-processing (keeps the event loop free)
+@app.on_event("startup")
+async def startup_audio_executor():
+    """Start and warm the audio worker processes"""
+    from services.audio_executor import audio_executor
+    audio_executor.start()
+
+@app.on_event("shutdown")
+async def shutdown_audio_executor():
+    from services.audio_executor import audio_executor
+    audio_executor.shutdown()
+
+# Shared outbound HTTP clients (connection pooling + keep-alive per upstream)
+@app.on_event("startup")
+async def startup_http_clients():
+    """Open pooled HTTP clients for all upstreams and pre-connect in the background"""
+    from services.http_client import http_clients
+    await http_clients.startup()
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    """Close pooled HTTP clients"""
+    from services.http_client import http_clients
+    await http_clients.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_circuit_breakers():
+    """Stop background circuit breaker probes"""
+    from services.circuit_breaker import circuit_breakers
+    circuit_breakers.shutdown()
+
+# Background TTS job workers (long texts are synthesized off the request path)
+@app.on_event("startup")
+async def startup_tts_jobs():
+    """Start the TTS job workers and requeue jobs left over from a previous run"""
+    from routes.tts import tts_job_manager
+    await tts_job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_tts_jobs():
+    from routes.tts import tts_job_manager
+    await tts_job_manager.shutdown()
+
+# Slideshow render jobs: encodes run in worker processes, never on the event loop
+@app.on_event("startup")
+async def startup_video_jobs():
+    """Start the render processes and requeue render jobs left over from a previous run"""
+    from routes.video import video_job_manager
+    await video_job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_video_jobs():
+    from routes.video import video_job_manager
+    await video_job_manager.shutdown()
+
+# Voice catalog: refresh the voice list and pre-render previews in the background
+@app.on_event("startup")
+async def startup_voice_catalog():
+    from routes.tts import voice_catalog
+    await voice_catalog.start()
+
+@app.on_event("shutdown")
+async def shutdown_voice_catalog():
+    from routes.tts import voice_catalog
+    await voice_catalog.shutdown()
+
+# Daily counters: one bulk reset at local midnight (and a catch-up at startup)
+@app.on_event("startup")
+async def startup_daily_reset():
+    from services.daily_reset import daily_reset
+    await daily_reset.start()
+
+@app.on_event("shutdown")
+async def shutdown_daily_reset():
+    from services.daily_reset import daily_reset
+    await daily_reset.shutdown()
+
+# Write-behind usage counters: periodic flush to the users table
+@app.on_event("startup")
+async def startup_usage_counters():
+    from services.usage_counters import usage_counters
+    await usage_counters.start()
+
+# Shutdown hooks run in registration order: this final flush comes after the job manager's
+@app.on_event("shutdown")
+async def shutdown_usage_counters():
+    from services.usage_counters import usage_counters
+    await usage_counters.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_logging():
+    """Last hook: write out everything still queued"""
+    from utils.logging_setup import stop_logging
+    stop_logging()
+
 # ✅ FIXED: Proper CORS setup for both local + production
 # CORS middleware must be added BEFORE routers to handle OPTIONS preflight requests
 # CORS configuration - allow Netlify domains and local development
@@ -167,10 +293,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH", "HEAD"],
     allow_headers=["*"],  # Allow all headers - "*" is more permissive
-    expose_headers=["*"],
+    # "*" is ignored by browsers on credentialed requests, so list the custom headers too
+    expose_headers=["*", "X-Tokens-Used", "X-Tokens-Remaining", "X-Daily-Count", "X-Limit-Reached", "X-Audio-Url", "X-Request-ID", "X-Next-Cursor"],
     max_age=3600,
 )
 
+# Request ids and per-request log sampling; added last so it wraps CORS and every route
+app.add_middleware(RequestContextMiddleware)
+
 # Global exception handler to ensure CORS headers are included in error responses
 # Note: HTTPException is already handled by FastAPI with CORS headers
 # This handler catches unexpected exceptions
@@ -226,6 +356,7 @@ app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(tts.router, prefix="/api", tags=["text-to-speech"])
 app.include_router(payments.router, prefix="/api/payment", tags=["payments"])
 app.include_router(video.router, prefix="/api/video", tags=["video"])
+app.include_router(audio.router, tags=["audio"])
 
 # ✅ Static files for generated videos
 # Use app directory for generated_videos (writable location on Railway)
@@ -252,21 +383,15 @@ from fastapi.responses import FileResponse, Response
 from fastapi import HTTPException
 # Request is already imported above (line 179)
 
+import logging
+video_logger = logging.getLogger("main.videos")
+
+
 @app.options("/static/videos/{filename}")
 async def serve_video_options(filename: str, request: Request):
     """Handle OPTIONS preflight requests for video files with CORS"""
     origin = request.headers.get("origin", "")
-    referer = request.headers.get("referer", "")
-    user_agent = request.headers.get("user-agent", "")[:100]  # Truncate for logging
-    
-    print("=" * 80, flush=True)
-    print(f"🔍 [CORS DEBUG] OPTIONS request for video: {filename}", flush=True)
-    print(f"   Origin: {origin}", flush=True)
-    print(f"   Referer: {referer}", flush=True)
-    print(f"   User-Agent: {user_agent}", flush=True)
-    print(f"   Allowed origins: {cors_origins}", flush=True)
-    print(f"   Origin in allowed list: {origin in cors_origins}", flush=True)
-    print(f"   All request headers: {dict(request.headers)}", flush=True)
+    video_logger.debug(f"[CORS] OPTIONS {filename} origin={origin!r} allowed={origin in cors_origins}")
     
     if origin in cors_origins:
         headers = {
@@ -276,14 +401,9 @@ async def serve_video_options(filename: str, request: Request):
             "Access-Control-Allow-Headers": "*",
             "Access-Control-Max-Age": "3600",
         }
-        print(f"✅ [CORS DEBUG] Sending CORS headers for OPTIONS:", flush=True)
-        for key, value in headers.items():
-            print(f"   {key}: {value}", flush=True)
-        print("=" * 80, flush=True)
         return Response(status_code=200, headers=headers)
     
-    print(f"⚠️ [CORS DEBUG] Origin not in allowed list - returning 200 without CORS headers", flush=True)
-    print("=" * 80, flush=True)
+    video_logger.info(f"[CORS] OPTIONS {filename}: origin {origin!r} not allowed, no CORS headers")
     return Response(status_code=200)
 
 @app.get("/static/videos/{filename}")
@@ -292,36 +412,14 @@ async def serve_video(filename: str, request: Request):
     Serve video files directly from disk with CORS headers.
     """
     # Remove query parameters if present
-    original_filename = filename
     filename = filename.split('?')[0]
     file_path = os.path.join(videos_dir, filename)
     
-    # Get all request headers for debugging
     origin = request.headers.get("origin", "")
     referer = request.headers.get("referer", "")
-    host = request.headers.get("host", "")
-    user_agent = request.headers.get("user-agent", "")[:100]  # Truncate for logging
-    all_headers = dict(request.headers)
-    
-    print("=" * 80, flush=True)
-    print(f"🎬 [CORS DEBUG] GET request for video: {original_filename}", flush=True)
-    print(f"   Cleaned filename: {filename}", flush=True)
-    print(f"   File path: {file_path}", flush=True)
-    print(f"   File exists: {os.path.exists(file_path)}", flush=True)
-    print(f"   Origin header: '{origin}'", flush=True)
-    print(f"   Referer header: '{referer}'", flush=True)
-    print(f"   Host header: '{host}'", flush=True)
-    print(f"   User-Agent: {user_agent}", flush=True)
-    print(f"   Allowed origins: {cors_origins}", flush=True)
-    print(f"   Origin in allowed list: {origin in cors_origins}", flush=True)
-    print(f"   All request headers:", flush=True)
-    for key, value in all_headers.items():
-        print(f"      {key}: {value}", flush=True)
+    video_logger.debug(f"[VIDEO] GET {filename} origin={origin!r} referer={referer!r}")
     
     if os.path.exists(file_path) and os.path.isfile(file_path):
-        file_size = os.path.getsize(file_path)
-        print(f"✅ File found - size: {file_size} bytes", flush=True)
-        
         # Build headers with CORS support
         headers = {
             "Accept-Ranges": "bytes",
@@ -335,32 +433,22 @@ async def serve_video(filename: str, request: Request):
             headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
             headers["Access-Control-Allow-Headers"] = "*"
             headers["Access-Control-Expose-Headers"] = "*"
-            print(f"✅ [CORS DEBUG] Adding CORS headers:", flush=True)
-            for key, value in headers.items():
-                print(f"   {key}: {value}", flush=True)
         else:
             # Try to extract origin from referer if origin header is missing or doesn't match
-            origin_to_check = origin
             if not origin and referer:
-                print(f"⚠️ [CORS DEBUG] No origin header, trying to extract from referer: {referer}", flush=True)
                 try:
                     from urllib.parse import urlparse
                     parsed = urlparse(referer)
                     extracted_origin = f"{parsed.scheme}://{parsed.netloc}"
-                    print(f"   Extracted origin: {extracted_origin}", flush=True)
                     if extracted_origin in cors_origins:
-                        origin_to_check = extracted_origin
                         headers["Access-Control-Allow-Origin"] = extracted_origin
                         headers["Access-Control-Allow-Credentials"] = "true"
                         headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
                         headers["Access-Control-Allow-Headers"] = "*"
                         headers["Access-Control-Expose-Headers"] = "*"
-                        print(f"✅ [CORS DEBUG] Added CORS headers using extracted origin:", flush=True)
-                        for key, value in headers.items():
-                            if key.startswith("Access-Control"):
-                                print(f"   {key}: {value}", flush=True)
+                        video_logger.debug(f"[CORS] Using origin {extracted_origin} from referer")
                 except Exception as e:
-                    print(f"❌ [CORS DEBUG] Failed to extract origin from referer: {e}", flush=True)
+                    video_logger.warning(f"[CORS] Failed to extract origin from referer {referer!r}: {e}")
             
             # If still no CORS headers and we have an origin, try one more time with referer
             if "Access-Control-Allow-Origin" not in headers and referer:
@@ -379,53 +467,27 @@ async def serve_video(filename: str, request: Request):
                                     headers["Access-Control-Allow-Methods"] = "GET, OPTIONS"
                                     headers["Access-Control-Allow-Headers"] = "*"
                                     headers["Access-Control-Expose-Headers"] = "*"
-                                    print(f"✅ [CORS DEBUG] Added CORS headers - domain match found", flush=True)
+                                    video_logger.debug(f"[CORS] Referer domain {parsed.netloc} matches an allowed origin")
                                     break
                             except Exception:
                                 continue
                 except Exception as e:
-                    print(f"❌ [CORS DEBUG] Failed to match domain: {e}", flush=True)
+                    video_logger.warning(f"[CORS] Failed to match referer domain {referer!r}: {e}")
             
             if "Access-Control-Allow-Origin" not in headers:
-                print(f"⚠️ [CORS DEBUG] Origin '{origin}' not in allowed list - NOT adding CORS headers", flush=True)
-                print(f"   Allowed origins: {cors_origins}", flush=True)
-                print(f"   This may cause CORS errors in the browser", flush=True)
+                video_logger.info(f"[CORS] GET {filename}: origin {origin!r} not allowed, no CORS headers (browser may block it)")
         
-        print("=" * 80, flush=True)
         return FileResponse(
             file_path,
             media_type="video/mp4",
             headers=headers
         )
     
-    # File not found - but still add CORS headers
-    print(f"❌ Video not found: {filename}", flush=True)
-    print(f"   Searched path: {file_path}", flush=True)
-    print(f"   Videos directory: {videos_dir}", flush=True)
-    print(f"   Videos directory absolute: {os.path.abspath(videos_dir)}", flush=True)
-    
-    # List files in directory for debugging
-    try:
-        if os.path.exists(videos_dir):
-            files_in_dir = os.listdir(videos_dir)
-            print(f"   Files in directory ({len(files_in_dir)} files):", flush=True)
-            for f in files_in_dir[:10]:  # List first 10 files
-                file_full_path = os.path.join(videos_dir, f)
-                file_size = os.path.getsize(file_full_path) if os.path.isfile(file_full_path) else 0
-                print(f"      - {f} ({file_size} bytes)", flush=True)
-        else:
-            print(f"   ❌ Videos directory does not exist!", flush=True)
-    except Exception as e:
-        print(f"   ⚠️ Could not list directory: {e}", flush=True)
-    
-    # Get origin for CORS headers
-    origin = request.headers.get("origin", "")
-    referer = request.headers.get("referer", "")
+    video_logger.warning(f"[VIDEO] Not found: {filename} (searched {os.path.abspath(file_path)})")
     
     # Build error response with CORS headers
     error_detail = f"Video file not found: {filename}"
     
-    # Create response with CORS headers (JSONResponse already imported above)
     headers = {}
     if origin in cors_origins:
         headers["Access-Control-Allow-Origin"] = origin
@@ -442,9 +504,6 @@ async def serve_video(filename: str, request: Request):
         except Exception:
             pass
     
-    print(f"   CORS headers for 404: {headers}", flush=True)
-    print("=" * 80, flush=True)
-    
     return JSONResponse(
         status_code=404,
         content={"detail": error_detail},
@@ -459,6 +518,20 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+from fastapi import Header
+from typing import Optional
+import secrets
+
+@app.get("/internal/upstreams")
+async def upstream_status(x_internal_token: Optional[str] = Header(None)):
+    """Circuit breaker state per upstream (requires the X-Internal-Token header; disabled while INTERNAL_STATUS_TOKEN is unset)"""
+    if not settings.INTERNAL_STATUS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_internal_token or "", settings.INTERNAL_STATUS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    from services.circuit_breaker import circuit_breakers
+    return {"upstreams": circuit_breakers.status()}
+
 # Print server startup info
 print("=" * 50)
 print("✅ FastAPI application initialized successfully!")
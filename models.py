@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -28,6 +28,8 @@ class User(Base):
     voice_history = relationship("VoiceHistory", back_populates="user")
     payments = relationship("Payment", back_populates="user")
     generated_videos = relationship("GeneratedVideo", back_populates="user")  # NEW
+    tts_jobs = relationship("TTSJob", back_populates="user")
+    video_jobs = relationship("VideoJob", back_populates="user")
 
 
 class VoiceHistory(Base):
@@ -42,6 +44,11 @@ class VoiceHistory(Base):
     # Relationships
     user = relationship("User", back_populates="voice_history")
 
+    # Keyset pagination of a user's history: WHERE user_id = ? ORDER BY created_at, id
+    __table_args__ = (
+        Index("ix_voice_history_user_created_id", "user_id", "created_at", "id"),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -71,6 +78,50 @@ class GeneratedVideo(Base):
     user = relationship("User", back_populates="generated_videos")
 
 
+class TTSJob(Base):
+    __tablename__ = "tts_jobs"
+
+    id = Column(String(32), primary_key=True, index=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    progress = Column(Float, nullable=False, default=0.0, server_default="0")  # 0.0 - 1.0
+    text = Column(Text, nullable=False)
+    voice = Column(String, nullable=False, default="sarah")
+    word_count = Column(Integer, nullable=False, default=0)
+    quota_charged = Column(Boolean, nullable=False, default=False, server_default="0")  # set once the reservation is taken
+    webhook_url = Column(String, nullable=True)
+    audio_path = Column(String, nullable=True)
+    audio_size = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationship
+    user = relationship("User", back_populates="tts_jobs")
+
+
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+
+    id = Column(String(32), primary_key=True, index=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    image_paths = Column(Text, nullable=False)  # JSON list of uploaded images, deleted once rendered
+    duration_seconds = Column(Integer, nullable=False, default=2)
+    crossfade = Column(Boolean, nullable=False, default=False)
+    transition = Column(String, nullable=False, default="slide")
+    video_url = Column(String, nullable=True)  # /static/videos/<filename> once rendered
+    video_size = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relationship
+    user = relationship("User", back_populates="video_jobs")
+
+
 # ✅ NEW MODEL: Admin
 class Admin(Base):
     __tablename__ = "admins"
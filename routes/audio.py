@@ -0,0 +1,107 @@
+import asyncio
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+
+from services.audio_store import audio_store
+from utils.audio_formats import MEDIA_TYPES
+
+router = APIRouter()
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Stored audio is content-addressed and never changes
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "Range: bytes=..." header into (start, end) inclusive.
+    Returns None when the header should be ignored (multi-range or malformed,
+    including last < first: RFC 9110 14.1.1), raises 416 when the range cannot
+    be satisfied (first byte past the end, or an empty suffix).
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise _unsatisfiable(size)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise _unsatisfiable(size)
+    return start, min(end, size - 1)
+
+
+def _unsatisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+@router.api_route("/static/audio/{audio_id}", methods=["GET", "HEAD"])
+async def serve_audio(audio_id: str, request: Request):
+    """
+    Serve stored voice audio by content id, with ETag/If-None-Match,
+    single-range requests (206) and immutable cache headers.
+    """
+    audio_id, _, extension = audio_id.lower().partition(".")  # /static/audio/<id> is MP3, <id>.<ext> other formats
+    extension = extension or "mp3"
+    if not audio_store.is_valid_id(audio_id) or extension not in MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio not found")
+    media_type = MEDIA_TYPES[extension]
+    size = audio_store.size(audio_id, extension)
+    if size is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio not found")
+
+    etag = f'"{audio_id}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": _IMMUTABLE,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and size > 0:
+        # If-Range with a different validator means "send the whole file"
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range.strip() == etag:
+            byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(length)
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    body = await asyncio.to_thread(audio_store.read_range, audio_id, start, length, extension) if length else b""
+    return Response(content=body, status_code=status_code, headers=headers, media_type=media_type)
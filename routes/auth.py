@@ -5,6 +5,7 @@ from typing import Optional
 from database import get_db
 from models import User, Payment, Admin
 from schemas import UserCreate, UserLogin, UserResponse, Token, AdminLogin, AdminLoginResponse, AdminUpdateCredentials
+from services.usage_counters import usage_counters
 from utils.jwt_handler import verify_password, get_password_hash, create_access_token, verify_token
 from datetime import timedelta, datetime
 
@@ -180,7 +181,8 @@ def get_current_user(token: Optional[str] = Depends(oauth2_scheme), db: Session
     if user is None:
         raise credentials_exception
 
-    return user
+    # Usage counters may be ahead of the row (write-behind)
+    return usage_counters.apply(user)
 
 
 @router.get("/me", response_model=UserResponse)
@@ -272,6 +274,7 @@ async def get_all_users(
         requested_users = [u for u in all_users if hasattr(u, 'requested') and u.requested == True]
         
         def format_user(user):
+            usage_counters.apply(user)
             return {
                 "id": user.id,
                 "name": user.name,
@@ -309,6 +312,7 @@ async def get_user_payments(
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    usage_counters.apply(user)
     
     payments = db.query(Payment).filter(Payment.user_id == user_id).all()
     
@@ -4,6 +4,7 @@ from database import get_db
 from models import User, Payment
 from schemas import PaymentCreateRequest, PaymentCreateResponse, PaymentCallback, SubscriptionRequest
 from services.easypaisa_service import EasypaisaService
+from services.usage_counters import usage_counters
 from routes.auth import get_current_user
 
 router = APIRouter()
@@ -45,7 +46,7 @@ async def create_payment(
     
     if not payment_result["success"]:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE if payment_result.get("error_type") == "CIRCUIT_OPEN" else status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=payment_result["error"]
         )
     
@@ -95,6 +96,8 @@ async def payment_callback(
             user.daily_video_count = 0
     
     db.commit()
+    if callback_data.status == "completed" and user:
+        usage_counters.reset_daily(user.id)
     
     return {"status": "success", "message": "Payment status updated"}
 
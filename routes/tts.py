@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User, VoiceHistory
-from schemas import VoiceGenerateRequest, VoiceGenerateResponse
+from database import get_db, SessionLocal
+from models import TTSJob, User, VoiceHistory
+from schemas import TTSJobCreateRequest, TTSJobResponse, VoiceBatchItemResult, VoiceBatchRequest, VoiceBatchResponse, VoiceGenerateRequest, VoiceGenerateResponse
 from services.lamonfox_service import LamonfoxService
-from utils.audio_utils import add_watermark_to_audio, audio_to_base64
+from services.tts_router import build_router
+from services.quota_reservation import QuotaReservation, release_voice_quota, reserve_voice_quota
+from services.voice_quota import check_voice_limits, max_total_tokens, record_batch_history, record_voice_history
+from services.audio_cache import sentence_audio_cache
+from services.audio_executor import audio_executor
+from services.audio_store import audio_store
+from services.audio_variants import audio_variants
+from services.daily_reset import daily_reset
+from services.history_search import history_search
+from services.usage_counters import usage_counters
+from services.voice_catalog import build_voice_catalog
+from services.tts_batch import build_batch_zip, synthesize_batch
+from services.tts_jobs import JOB_SUCCEEDED, JobQueueFullError, TTSJobManager, WebhookURLError, check_webhook_url, job_audio_url, new_job_id
+from services.chunked_synthesis import should_chunk, should_use_incremental, synthesize_chunked, synthesize_incremental
+from utils.audio_formats import extension_for, media_type_for, needs_transcode, validate_format
+from utils.logging_setup import logging_stats
+from utils.audio_utils import audio_to_base64, encode_watermark_frames, watermark_frames_for, WATERMARK_STATS
 from routes.auth import get_current_user
+import asyncio
 import os
 import logging
-from datetime import datetime, date
+from datetime import datetime
+from typing import List, Optional
+from config import settings
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -16,13 +38,111 @@ logger.setLevel(logging.INFO)
 
 router = APIRouter()
 lamonfox_service = LamonfoxService()
+tts_router = build_router(lamonfox_service)
+voice_catalog = build_voice_catalog(lamonfox_service)
+tts_job_manager = TTSJobManager(
+    tts_router,
+    workers=settings.TTS_JOB_WORKERS,
+    queue_size=settings.TTS_JOB_QUEUE_SIZE,
+)
+
+def _classify_generation_error(error_str: str) -> tuple:
+    """Map a voice generation exception message to (status_code, error_type, user message)"""
+    status_code = 500
+    error_type = "UNKNOWN_ERROR"
+    error_message = error_str
+    
+    # Map specific errors to appropriate types and messages
+    if "API key" in error_str or "api_key" in error_str.lower() or "not configured" in error_str.lower():
+        status_code = 500
+        error_type = "API_KEY_ERROR"
+        error_message = "Voice generation service configuration error. Please contact support."
+    elif "Payment required" in error_str or "free tier" in error_str.lower() or "unusual activity" in error_str.lower():
+        status_code = 402
+        error_type = "PAYMENT_REQUIRED"
+        error_message = error_str
+    elif "circuit open" in error_str.lower():
+        status_code = 503
+        error_type = "CIRCUIT_OPEN"
+        error_message = error_str
+    elif "busy" in error_str.lower():
+        status_code = 503
+        error_type = "SERVICE_BUSY"
+        error_message = error_str
+    elif "quota" in error_str.lower() or "limit" in error_str.lower():
+        status_code = 429
+        error_type = "QUOTA_EXCEEDED"
+        error_message = "Voice generation quota exceeded. Please try again later."
+    elif "rate limit" in error_str.lower():
+        status_code = 429
+        error_type = "RATE_LIMIT_EXCEEDED"
+        error_message = error_str
+    elif "network" in error_str.lower() or "connection" in error_str.lower() or "timeout" in error_str.lower():
+        status_code = 503
+        error_type = "NETWORK_ERROR"
+        error_message = "Network error. Please check your connection and try again."
+    elif "invalid" in error_str.lower() and "request" in error_str.lower():
+        status_code = 400
+        error_type = "INVALID_REQUEST"
+        error_message = error_str
+
+    return status_code, error_type, error_message
+
+
+def _wants_binary_audio(accept: Optional[str]) -> bool:
+    """
+    Content negotiation for /generate-voice: raw audio only when the client
+    prefers an audio/* type over JSON. JSON stays the default.
+    """
+    if not accept:
+        return False
+    audio_q = 0.0
+    json_q = 0.0
+    for part in accept.split(","):
+        params = [p.strip() for p in part.split(";")]
+        media_type = params[0].lower()
+        q = 1.0
+        for param in params[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type.startswith("audio/"):
+            audio_q = max(audio_q, q)
+        elif media_type in ("application/json", "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return audio_q > json_q
+
+
+def _audio_response(audio: bytes, current_user: User, tokens_remaining: int, max_total_tokens: int, audio_url: Optional[str] = None, media_type: str = "audio/mpeg") -> Response:
+    """Raw audio body with quota information in headers"""
+    headers = {
+        "X-Tokens-Used": str(current_user.total_tokens_used),
+        "X-Tokens-Remaining": str(tokens_remaining),
+        "X-Daily-Count": str(current_user.daily_voice_count),
+        "X-Limit-Reached": "true" if current_user.total_tokens_used >= max_total_tokens else "false",
+        "Cache-Control": "no-store",
+        "Vary": "Accept",
+    }
+    if audio_url:
+        headers["X-Audio-Url"] = audio_url
+    return Response(content=audio, media_type=media_type, headers=headers)
+
 
 @router.post("/generate-voice", response_model=VoiceGenerateResponse)
 async def generate_voice(
     request: VoiceGenerateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    accept: Optional[str] = Header(None)
 ):
+    """
+    Generate voice. Returns VoiceGenerateResponse JSON (base64 audio) by default;
+    with "Accept: audio/mpeg" returns the raw audio with quota info in X-* headers.
+    Errors are always JSON.
+    """
+    binary_response = _wants_binary_audio(accept)
     # ========== REQUEST START LOGGING ==========
     request_id = f"{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     logger.info("=" * 80)
@@ -31,144 +151,28 @@ async def generate_voice(
     logger.info(f"[TEXT] Length: {len(request.text)} chars, Words: {len(request.text.split())}")
     logger.info(f"[TEXT PREVIEW] {request.text[:100]}{'...' if len(request.text) > 100 else ''}")
     
+    reservation = None
     try:
-        # Reset daily counters if needed
-        today = date.today()
-        if current_user.last_reset_date != today:
-            logger.info(f"[COUNTER RESET] Resetting daily counters for user {current_user.id}")
-            current_user.daily_voice_count = 0
-            current_user.daily_video_count = 0
-            # Note: total_tokens_used is NOT reset daily - it's a lifetime limit
-            current_user.last_reset_date = today
-            db.commit()
-            logger.info(f"[COUNTER RESET] Daily counters reset successfully")
-
-        # Ensure daily_voice_count is initialized
-        if current_user.daily_voice_count is None:
-            current_user.daily_voice_count = 0
-
-        # Check daily voice generation limits
-        MAX_DAILY_VOICES = 2 if current_user.plan == "Free" else 5
-        logger.info(f"[DAILY VOICE LIMIT] Plan: {current_user.plan}, Max daily voices: {MAX_DAILY_VOICES}, Current count: {current_user.daily_voice_count}")
-        
-        if current_user.daily_voice_count >= MAX_DAILY_VOICES:
-            logger.warning(f"[LIMIT EXCEEDED] Daily voice limit reached: {current_user.daily_voice_count}/{MAX_DAILY_VOICES}")
-            error_detail = {
-                "message": f"Daily voice generation limit reached. You can generate up to {MAX_DAILY_VOICES} voices per day. You have already generated {current_user.daily_voice_count} voices today.",
-                "error_type": "DAILY_VOICE_LIMIT_EXCEEDED",
-                "status_code": 429,
-                "details": f"You have reached your daily limit of {MAX_DAILY_VOICES} voice generations. Please try again tomorrow.",
-                "timestamp": datetime.now().isoformat(),
-                "daily_count": current_user.daily_voice_count,
-                "max_daily_voices": MAX_DAILY_VOICES
-            }
-            return VoiceGenerateResponse(
-                success=False,
-                message=error_detail["message"],
-                error=error_detail,
-                daily_count=current_user.daily_voice_count,
-                limit_reached=True,
-                tokens_used=current_user.total_tokens_used or 0,
-                tokens_remaining=0
-            )
+        output_format = (request.format or "mp3").lower()
+        format_error = validate_format(output_format, request.bitrate)
+        if format_error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                "message": format_error,
+                "error_type": "INVALID_FORMAT",
+                "status_code": 400,
+                "details": f"format={request.format!r}, bitrate={request.bitrate!r}",
+                "timestamp": datetime.now().isoformat()
+            })
 
         # Count words in the text (treat each word as 1 token)
         word_count = len(request.text.split())
         logger.info(f"[TOKEN COUNT] Word count: {word_count}")
-        
-        # Enforce plan limits based on tokens/words
-        if current_user.plan == "Free":
-            # Free users: 150 words max per generation, 300 total tokens max
-            MAX_WORDS_PER_GENERATION = 150
-            MAX_TOTAL_TOKENS = 300
-            
-            logger.info(f"[LIMIT CHECK] Plan: Free, Max words/generation: {MAX_WORDS_PER_GENERATION}, Max total tokens: {MAX_TOTAL_TOKENS}")
-            
-            # Check word limit per generation
-            if word_count > MAX_WORDS_PER_GENERATION:
-                logger.warning(f"[LIMIT EXCEEDED] Word limit exceeded: {word_count} > {MAX_WORDS_PER_GENERATION}")
-                error_detail = {
-                    "message": f"Text exceeds maximum word limit. Maximum {MAX_WORDS_PER_GENERATION} words allowed for free plan. Your text has {word_count} words.",
-                    "error_type": "WORD_LIMIT_EXCEEDED",
-                    "status_code": 400,
-                    "details": f"Your text has {word_count} words, but the maximum allowed is {MAX_WORDS_PER_GENERATION} words per generation.",
-                    "timestamp": datetime.now().isoformat()
-                }
-                return VoiceGenerateResponse(
-                    success=False,
-                    message=error_detail["message"],
-                    error=error_detail,
-                    daily_count=current_user.daily_voice_count,
-                    limit_reached=False,
-                    tokens_used=current_user.total_tokens_used or 0,
-                    tokens_remaining=0
-                )
-            
-            # Check total tokens used
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            
-            logger.info(f"[TOKEN USAGE] Current: {current_user.total_tokens_used}, Requested: {word_count}, Total after: {current_user.total_tokens_used + word_count}")
-            
-            if current_user.total_tokens_used + word_count > MAX_TOTAL_TOKENS:
-                remaining = MAX_TOTAL_TOKENS - current_user.total_tokens_used
-                logger.warning(f"[LIMIT EXCEEDED] Token limit reached: {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS}, Remaining: {remaining}")
-                error_detail = {
-                    "message": f"Token limit reached. You have used {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words.",
-                    "error_type": "TOKEN_LIMIT_EXCEEDED",
-                    "status_code": 429,
-                    "details": f"You have used {current_user.total_tokens_used} out of {MAX_TOTAL_TOKENS} total tokens. Remaining: {remaining} words.",
-                    "timestamp": datetime.now().isoformat()
-                }
-                return VoiceGenerateResponse(
-                    success=False,
-                    message=error_detail["message"],
-                    error=error_detail,
-                    daily_count=current_user.daily_voice_count,
-                    limit_reached=True,
-                    tokens_used=current_user.total_tokens_used,
-                    tokens_remaining=remaining
-                )
-        else:
-            # Paid users: unlimited generations but max 800 tokens per person
-            MAX_TOTAL_TOKENS = 800
-            logger.info(f"[LIMIT CHECK] Plan: Paid, Max total tokens: {MAX_TOTAL_TOKENS}")
-            
-            # Check total tokens used
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            
-            logger.info(f"[TOKEN USAGE] Current: {current_user.total_tokens_used}, Requested: {word_count}, Total after: {current_user.total_tokens_used + word_count}")
-            
-            if current_user.total_tokens_used + word_count > MAX_TOTAL_TOKENS:
-                remaining = MAX_TOTAL_TOKENS - current_user.total_tokens_used
-                logger.warning(f"[LIMIT EXCEEDED] Token limit reached: {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS}, Remaining: {remaining}")
-                error_detail = {
-                    "message": f"Token limit reached. You have used {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words.",
-                    "error_type": "TOKEN_LIMIT_EXCEEDED",
-                    "status_code": 429,
-                    "details": f"You have used {current_user.total_tokens_used} out of {MAX_TOTAL_TOKENS} total tokens. Remaining: {remaining} words.",
-                    "timestamp": datetime.now().isoformat()
-                }
-                return VoiceGenerateResponse(
-                    success=False,
-                    message=error_detail["message"],
-                    error=error_detail,
-                    daily_count=current_user.daily_voice_count,
-                    limit_reached=True,
-                    tokens_used=current_user.total_tokens_used,
-                    tokens_remaining=remaining
-                )
-        
-        logger.info(f"[LIMIT CHECK] ✅ All limits passed")
-    
-        # Detailed API key validation and logging before attempting generation
-        logger.info("[API KEY CHECK] Validating Lamonfox API key configuration...")
-        logger.info(f"[API KEY CHECK] Service instance: {type(lamonfox_service).__name__}")
-        
-        if not lamonfox_service.api_key:
-            logger.error(f"[API KEY] ❌ Lamonfox API key is not configured")
-            logger.error(f"[API KEY] Source checked: Environment variable 'LAMONFOX_API_KEY'")
+
+        # At least one TTS provider must be configured; the router fails over between them
+        providers = tts_router.ranked()
+        if not providers:
+            logger.error(f"[API KEY] ❌ No TTS provider is configured")
+            logger.error(f"[API KEY] Source checked: Environment variables 'LAMONFOX_API_KEY', 'ELEVENLABS_API_KEY'")
             logger.error(f"[API KEY] Status: Missing or empty")
             error_detail = {
                 "message": "Voice generation service is not configured. Please contact support.",
@@ -186,50 +190,55 @@ async def generate_voice(
                 tokens_used=current_user.total_tokens_used or 0,
                 tokens_remaining=0
             )
+        logger.info(f"[VOICE GENERATION] Provider order: {', '.join(provider.name for provider in providers)}")
+
+        # Take the tokens and the daily generation atomically before calling upstream (refunded on failure)
+        reservation, limit_error = reserve_voice_quota(db, current_user, word_count)
+        if limit_error is not None:
+            return limit_error
         
-        # Log detailed API key information
-        api_key = lamonfox_service.api_key
-        key_length = len(api_key)
-        key_preview = f"{api_key[:10]}...{api_key[-5:]}" if key_length > 15 else f"{api_key[:5]}***"
-        logger.info(f"[API KEY] ✅ API key is configured")
-        logger.info(f"[API KEY] API Key Details:")
-        logger.info(f"  - Source: Environment variable 'LAMONFOX_API_KEY'")
-        logger.info(f"  - Length: {key_length} characters")
-        logger.info(f"  - Preview: {key_preview}")
-        logger.info(f"  - First 6 chars: {api_key[:6]}")
-        logger.info(f"  - Last 6 chars: {api_key[-6:]}")
-        logger.info(f"  - Service: Lamonfox (Lemonfox.ai)")
-        logger.info(f"  - Base URL: {lamonfox_service.base_url}")
-        logger.info(f"[VOICE GENERATION] Starting voice generation with Lamonfox API using above API key")
+        logger.info(f"[LIMIT CHECK] ✅ All limits passed, quota reserved")
         
-        # Generate voice using Lamonfox
-        audio_data = await lamonfox_service.generate_voice(request.text)
+        # Generate voice
+        chunk_timings = None
+        sentence_stats = {}
+        # Ask the provider for the format directly when nothing needs the MP3 (watermark, joining chunks)
+        native_format = (
+            output_format != "mp3"
+            and request.bitrate is None
+            and current_user.plan != "Free"
+            and not should_use_incremental(request.incremental)
+            and not should_chunk(request.text, request.chunked)
+            and tts_router.supports_format(output_format)
+        )
+        if native_format:
+            logger.info(f"[VOICE GENERATION] Requesting {output_format} natively")
+            audio_data = await tts_router.generate_voice(request.text, response_format=output_format)
+        # The sentence store holds Lemonfox audio, so incremental synthesis stays on Lemonfox
+        elif should_use_incremental(request.incremental) and lamonfox_service.api_key:
+            logger.info(f"[VOICE GENERATION] Using incremental (sentence-level) synthesis")
+            audio_data, sentence_stats = await synthesize_incremental(lamonfox_service, request.text)
+        elif should_chunk(request.text, request.chunked):
+            logger.info(f"[VOICE GENERATION] Using chunked synthesis")
+            # All chunks from one provider so the joined MP3 has a single encoding
+            audio_data, chunk_timings = await synthesize_chunked(tts_router.pinned(), request.text)
+            logger.info(f"[VOICE GENERATION] {len(chunk_timings)} chunks synthesized")
+        else:
+            audio_data = await tts_router.generate_voice(request.text)
         
         logger.info(f"[AUDIO RECEIVED] Audio data size: {len(audio_data)} bytes")
         
         # Handle trial vs paid users
         if current_user.plan == "Free":
             logger.info(f"[WATERMARK] Adding watermark for Free user")
-            watermarked_audio = add_watermark_to_audio(audio_data)
-            logger.info(f"[WATERMARK] ✅ Watermark added, Base64 length: {len(watermarked_audio)}")
+            watermarked_audio = await audio_executor.watermark(audio_data)
+            logger.info(f"[WATERMARK] ✅ Watermark added, Audio size: {len(watermarked_audio)} bytes")
+            if needs_transcode(output_format, request.bitrate):
+                watermarked_audio = await audio_variants.get(watermarked_audio, output_format, request.bitrate)
             
             # Save to voice history (no permanent URL for trial)
             logger.info(f"[DATABASE] Saving voice history entry")
-            voice_entry = VoiceHistory(
-                user_id=current_user.id,
-                text=request.text,
-                audio_url=None
-            )
-            db.add(voice_entry)
-            
-            # Update token usage
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            current_user.total_tokens_used += word_count
-            
-            # Increment daily count
-            current_user.daily_voice_count += 1
-            db.commit()
+            voice_entry = record_voice_history(db, current_user, request.text)
             logger.info(f"[DATABASE] ✅ Voice history saved, ID: {voice_entry.id}")
             logger.info(f"[TOKEN UPDATE] Total tokens: {current_user.total_tokens_used}, Daily count: {current_user.daily_voice_count}")
             
@@ -238,44 +247,33 @@ async def generate_voice(
             logger.info(f"[TOKEN STATUS] Used: {current_user.total_tokens_used}, Remaining: {remaining_tokens}, Limit reached: {current_user.total_tokens_used >= 300}")
             logger.info("=" * 80)
             
+            if binary_response:
+                return _audio_response(watermarked_audio, current_user, remaining_tokens, 300, media_type=media_type_for(output_format))
+            
             return VoiceGenerateResponse(
                 success=True,
                 message="Voice generated successfully (Trial version with watermark)",
-                audio_data=watermarked_audio,
+                audio_data=audio_to_base64(watermarked_audio),
                 audio_url=None,
+                audio_format=media_type_for(output_format),
                 daily_count=current_user.daily_voice_count,
                 limit_reached=current_user.total_tokens_used >= 300,
                 tokens_used=current_user.total_tokens_used,
-                tokens_remaining=remaining_tokens
+                tokens_remaining=remaining_tokens,
+                chunk_timings=chunk_timings,
+                **sentence_stats
             )
         else:
-            logger.info(f"[AUDIO PROCESSING] Converting audio to base64 for Paid user")
-            audio_base64 = audio_to_base64(audio_data)
-            logger.info(f"[AUDIO PROCESSING] ✅ Base64 conversion complete, Length: {len(audio_base64)}")
+            if not native_format and needs_transcode(output_format, request.bitrate):
+                audio_data = await audio_variants.get(audio_data, output_format, request.bitrate)
+
+            # Persist the audio so history replay is served from the store, not regenerated
+            extension = extension_for(output_format)
+            audio_id = await audio_store.put(audio_data, extension)
             
             # Save to voice history with URL
             logger.info(f"[DATABASE] Saving voice history entry")
-            voice_entry = VoiceHistory(
-                user_id=current_user.id,
-                text=request.text,
-                audio_url=None
-            )
-            db.add(voice_entry)
-            
-            # Update token usage
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            current_user.total_tokens_used += word_count
-            
-            # Increment daily voice count
-            current_user.daily_voice_count += 1
-            
-            db.commit()
-            db.refresh(voice_entry)
-            
-            # Update with actual URL
-            voice_entry.audio_url = f"generated_audio_{voice_entry.id}.mp3"
-            db.commit()
+            voice_entry = record_voice_history(db, current_user, request.text, audio_url=audio_store.url(audio_id, extension))
             logger.info(f"[DATABASE] ✅ Voice history saved, ID: {voice_entry.id}, URL: {voice_entry.audio_url}")
             logger.info(f"[TOKEN UPDATE] Total tokens: {current_user.total_tokens_used}, Daily voice count: {current_user.daily_voice_count}")
             
@@ -284,18 +282,29 @@ async def generate_voice(
             logger.info(f"[TOKEN STATUS] Used: {current_user.total_tokens_used}, Remaining: {remaining_tokens}, Limit reached: {current_user.total_tokens_used >= 800}")
             logger.info("=" * 80)
             
+            if binary_response:
+                return _audio_response(audio_data, current_user, remaining_tokens, 800, audio_url=voice_entry.audio_url, media_type=media_type_for(output_format))
+            
+            logger.info(f"[AUDIO PROCESSING] Converting audio to base64 for Paid user")
+            audio_base64 = audio_to_base64(audio_data)
+            logger.info(f"[AUDIO PROCESSING] ✅ Base64 conversion complete, Length: {len(audio_base64)}")
+            
             return VoiceGenerateResponse(
                 success=True,
                 message="Voice generated successfully",
                 audio_data=audio_base64,
                 audio_url=voice_entry.audio_url,
+                audio_format=media_type_for(output_format),
                 daily_count=current_user.daily_voice_count,
                 limit_reached=current_user.total_tokens_used >= 800,
                 tokens_used=current_user.total_tokens_used,
-                tokens_remaining=remaining_tokens
+                tokens_remaining=remaining_tokens,
+                chunk_timings=chunk_timings,
+                **sentence_stats
             )
             
     except HTTPException as e:
+        release_voice_quota(db, reservation)
         # Re-raise HTTP exceptions but add error details
         logger.error(f"[HTTP EXCEPTION] Status: {e.status_code}, Detail: {e.detail}")
         
@@ -323,6 +332,8 @@ async def generate_voice(
         )
         
     except Exception as e:
+        db.rollback()
+        release_voice_quota(db, reservation)
         # Log detailed error information for debugging
         import traceback
         error_detail_str = str(e)
@@ -337,35 +348,7 @@ async def generate_voice(
         logger.error("=" * 80)
         
         # Determine appropriate status code and error message
-        status_code = 500
-        error_type = "UNKNOWN_ERROR"
-        error_message = error_detail_str
-        
-        # Map specific errors to appropriate types and messages
-        if "API key" in error_detail_str or "api_key" in error_detail_str.lower() or "not configured" in error_detail_str.lower():
-            status_code = 500
-            error_type = "API_KEY_ERROR"
-            error_message = "Voice generation service configuration error. Please contact support."
-        elif "Payment required" in error_detail_str or "free tier" in error_detail_str.lower() or "unusual activity" in error_detail_str.lower():
-            status_code = 402
-            error_type = "PAYMENT_REQUIRED"
-            error_message = error_detail_str
-        elif "quota" in error_detail_str.lower() or "limit" in error_detail_str.lower():
-            status_code = 429
-            error_type = "QUOTA_EXCEEDED"
-            error_message = "Voice generation quota exceeded. Please try again later."
-        elif "rate limit" in error_detail_str.lower():
-            status_code = 429
-            error_type = "RATE_LIMIT_EXCEEDED"
-            error_message = error_detail_str
-        elif "network" in error_detail_str.lower() or "connection" in error_detail_str.lower() or "timeout" in error_detail_str.lower():
-            status_code = 503
-            error_type = "NETWORK_ERROR"
-            error_message = "Network error. Please check your connection and try again."
-        elif "invalid" in error_detail_str.lower() and "request" in error_detail_str.lower():
-            status_code = 400
-            error_type = "INVALID_REQUEST"
-            error_message = error_detail_str
+        status_code, error_type, error_message = _classify_generation_error(error_detail_str)
         
         error_detail = {
             "message": error_message,
@@ -387,22 +370,472 @@ async def generate_voice(
             tokens_remaining=0
         )
 
+def _finish_stream(reservation: QuotaReservation, text: str, completed: bool, audio_data: Optional[bytes] = None, extension: str = "mp3") -> None:
+    """
+    Settle a stream's reserved quota (runs after the request session is gone):
+    a completed stream gets its history entry, an aborted one is refunded.
+    For paid users the streamed audio is stored so history replay never regenerates it.
+    """
+    db = SessionLocal()
+    try:
+        if not completed:
+            release_voice_quota(db, reservation)
+            return
+        user = db.query(User).filter(User.id == reservation.user_id).first()
+        if user is not None:
+            audio_url = audio_store.url(audio_store.put_sync(audio_data, extension), extension) if audio_data else None
+            voice_entry = record_voice_history(db, user, text, audio_url=audio_url)
+            logger.info(f"[STREAM] ✅ Usage recorded for user {user.id}, history ID: {voice_entry.id}, tokens: {user.total_tokens_used}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[STREAM] ❌ Failed to record usage for user {reservation.user_id}: {e}")
+    finally:
+        db.close()
+
+
+def _json_error(current_user: User, status_code: int, error_type: str, message: str, details: str) -> JSONResponse:
+    error_detail = {
+        "message": message,
+        "error_type": error_type,
+        "status_code": status_code,
+        "details": details,
+        "timestamp": datetime.now().isoformat()
+    }
+    response = VoiceGenerateResponse(
+        success=False,
+        message=message,
+        error=error_detail,
+        daily_count=current_user.daily_voice_count or 0,
+        limit_reached=False,
+        tokens_used=current_user.total_tokens_used or 0,
+        tokens_remaining=0
+    )
+    return JSONResponse(status_code=status_code, content=jsonable_encoder(response))
+
+
+@router.post("/generate-voice/stream")
+async def generate_voice_stream(
+    request: VoiceGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream generated audio to the client as it arrives from Lemonfox, in the requested
+    format at the upstream bitrate (a bitrate needs a transcode: use /generate-voice).
+    If the Lemonfox stream fails before its first byte, the router's providers are
+    tried instead and their audio is sent in one piece.
+    Trial streams are MP3 only and always end with the watermark; if no watermark
+    matching the stream can be made, the stream is refused.
+    Quota is reserved up front and refunded if the stream does not complete.
+    Errors before the first audio byte are returned as JSON VoiceGenerateResponse bodies.
+    """
+    logger.info(f"[STREAM START] User: {current_user.id}, Plan: {current_user.plan}, Length: {len(request.text)} chars")
+
+    add_watermark = current_user.plan == "Free"
+    output_format = (request.format or "mp3").lower()
+    format_error = validate_format(output_format, request.bitrate)
+    if format_error is None and request.bitrate is not None:
+        format_error = "Streams use the upstream bitrate; request a bitrate from /generate-voice"
+    if format_error is None and add_watermark and output_format != "mp3":
+        format_error = "Trial streams are MP3 only (the watermark is appended as MP3 frames)"
+    if format_error:
+        return _json_error(current_user, 400, "INVALID_FORMAT", format_error, f"format={request.format!r}, bitrate={request.bitrate!r}")
+
+    word_count = len(request.text.split())
+    reservation, limit_error = reserve_voice_quota(db, current_user, word_count)
+    if limit_error is not None:
+        return JSONResponse(status_code=limit_error.error["status_code"], content=jsonable_encoder(limit_error))
+
+    audio_stream = lamonfox_service.stream_voice(request.text, response_format=output_format)
+    try:
+        # Pull the first chunk before committing to a 200 so upstream errors surface as JSON
+        first_chunk = await audio_stream.__anext__()
+    except StopAsyncIteration:
+        first_chunk = b""
+    except Exception as e:
+        logger.warning(f"[STREAM] Lemonfox stream failed before the first byte, using the router: {type(e).__name__}: {e}")
+        audio_stream = None
+        try:
+            first_chunk = await tts_router.generate_voice(request.text, response_format=output_format)
+        except Exception as e:
+            logger.error(f"[STREAM ERROR] {type(e).__name__}: {e}")
+            release_voice_quota(db, reservation)
+            status_code, error_type, error_message = _classify_generation_error(str(e))
+            return _json_error(current_user, status_code, error_type, error_message, str(e))
+
+    watermark = b""
+    if add_watermark:
+        # The watermark must have the stream's sample rate and channels: a pre-encoded
+        # variant, else one encoded for this stream
+        watermark = watermark_frames_for(first_chunk) or await asyncio.to_thread(encode_watermark_frames, first_chunk)
+        if not watermark:
+            logger.warning(f"[WATERMARK] No watermark matches the stream for user {current_user.id}, stream refused")
+            if audio_stream is not None:
+                await audio_stream.aclose()
+            release_voice_quota(db, reservation)
+            return _json_error(
+                current_user, 503, "WATERMARK_UNAVAILABLE",
+                "Streaming is not available for trial accounts right now. Please generate the voice without streaming.",
+                "No watermark could be encoded for the stream's sample rate and channels"
+            )
+
+    user_id = current_user.id
+    text = request.text
+    extension = extension_for(output_format)
+    # Paid history keeps the audio, so collect what is streamed
+    collected: Optional[List[bytes]] = None if add_watermark else [first_chunk]
+
+    async def relay():
+        completed = False
+        try:
+            if first_chunk:
+                yield first_chunk
+            if audio_stream is not None:
+                async for chunk in audio_stream:
+                    if collected is not None:
+                        collected.append(chunk)
+                    yield chunk
+            if watermark:
+                yield watermark
+            completed = True
+        except Exception as e:
+            logger.error(f"[STREAM ERROR] Stream aborted for user {user_id}: {type(e).__name__}: {e}")
+        finally:
+            if audio_stream is not None:
+                await audio_stream.aclose()
+            audio_data = b"".join(collected) if completed and collected is not None else None
+            await asyncio.to_thread(_finish_stream, reservation, text, completed, audio_data, extension)
+
+    return StreamingResponse(
+        relay(),
+        media_type=media_type_for(output_format),
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+def _batch_error(current_user: User, status_code: int, error_type: str, message: str, details: str, limit_reached: bool = False) -> JSONResponse:
+    error_detail = {
+        "message": message,
+        "error_type": error_type,
+        "status_code": status_code,
+        "details": details,
+        "timestamp": datetime.now().isoformat()
+    }
+    response = VoiceBatchResponse(
+        success=False,
+        message=message,
+        error=error_detail,
+        daily_count=current_user.daily_voice_count or 0,
+        limit_reached=limit_reached,
+        tokens_used=current_user.total_tokens_used or 0,
+        tokens_remaining=max(0, max_total_tokens(current_user) - (current_user.total_tokens_used or 0))
+    )
+    return JSONResponse(status_code=status_code, content=jsonable_encoder(response))
+
+
+@router.post("/generate-voice/batch")
+async def generate_voice_batch(
+    request: VoiceBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Generate many short texts in one call. Quota is reserved once for the whole
+    batch (its total word count, one generation); items are synthesized with
+    bounded concurrency and words of failed items are refunded.
+    Returns VoiceBatchResponse JSON, or with output="zip" an application/zip of
+    NNN.mp3 files (request order) plus results.json.
+    """
+    logger.info(f"[BATCH START] User: {current_user.id}, Plan: {current_user.plan}, Items: {len(request.items)}")
+
+    if request.output not in ("json", "zip"):
+        return _batch_error(current_user, 400, "INVALID_REQUEST", "output must be \"json\" or \"zip\"", f"Got output={request.output!r}")
+    if not request.items:
+        return _batch_error(current_user, 400, "INVALID_REQUEST", "At least one item is required", "items is empty")
+    if len(request.items) > settings.TTS_BATCH_MAX_ITEMS:
+        return _batch_error(
+            current_user, 400, "BATCH_TOO_LARGE",
+            f"A batch can contain at most {settings.TTS_BATCH_MAX_ITEMS} items.",
+            f"Your batch has {len(request.items)} items."
+        )
+    empty = [i for i, item in enumerate(request.items) if not item.text.strip()]
+    if empty:
+        return _batch_error(current_user, 400, "INVALID_REQUEST", "Every item needs text", f"Empty items: {empty}")
+    if not tts_router.ranked():
+        return _batch_error(current_user, 500, "API_KEY_ERROR", "Voice generation service configuration error. Please contact support.", "No TTS provider is configured")
+
+    word_count = sum(len(item.text.split()) for item in request.items)
+    # The whole batch is one generation; its total word count is reserved up front
+    reservation, limit_error = reserve_voice_quota(db, current_user, word_count)
+    if limit_error is not None:
+        return JSONResponse(status_code=limit_error.error["status_code"], content=jsonable_encoder(limit_error))
+
+    is_free = current_user.plan == "Free"
+    succeeded = []
+    try:
+        results = await synthesize_batch(
+            tts_router,
+            [(item.text, item.voice) for item in request.items],
+            watermark=is_free,
+        )
+        succeeded = [result for result in results if result.ok]
+
+        # Paid history links to stored audio; trial history has no download
+        audio_urls = {}
+        if not is_free:
+            for result in succeeded:
+                audio_urls[result.index] = audio_store.url(await audio_store.put(result.audio))
+        record_batch_history(db, current_user, [(result.text, audio_urls.get(result.index)) for result in succeeded])
+    except BaseException:
+        db.rollback()
+        release_voice_quota(db, reservation)
+        raise
+    if succeeded:
+        # Words of failed items go back; the generation stays charged
+        release_voice_quota(db, reservation, tokens=sum(result.word_count for result in results if not result.ok))
+    else:
+        release_voice_quota(db, reservation)
+
+    cap = max_total_tokens(current_user)
+    item_results = [
+        VoiceBatchItemResult(
+            index=result.index,
+            success=result.ok,
+            word_count=result.word_count,
+            audio_data=audio_to_base64(result.audio) if result.ok and request.output == "json" else None,
+            audio_url=audio_urls.get(result.index),
+            error=result.error,
+        )
+        for result in results
+    ]
+    response = VoiceBatchResponse(
+        success=bool(succeeded),
+        message=f"Generated {len(succeeded)} of {len(results)} voices" + (" (Trial version with watermark)" if is_free else ""),
+        results=item_results,
+        daily_count=current_user.daily_voice_count,
+        limit_reached=current_user.total_tokens_used >= cap,
+        tokens_used=current_user.total_tokens_used,
+        tokens_remaining=cap - current_user.total_tokens_used
+    )
+    logger.info(f"[BATCH DONE] User: {current_user.id}, {len(succeeded)}/{len(results)} succeeded, tokens used: {current_user.total_tokens_used}")
+
+    if not succeeded:
+        status_code, error_type, error_message = _classify_generation_error(results[0].error or "")
+        response.error = {
+            "message": error_message,
+            "error_type": error_type,
+            "status_code": status_code,
+            "details": results[0].error,
+            "timestamp": datetime.now().isoformat()
+        }
+        return JSONResponse(status_code=status_code, content=jsonable_encoder(response))
+
+    if request.output == "zip":
+        archive = await asyncio.to_thread(build_batch_zip, results, jsonable_encoder(response))
+        return Response(
+            content=archive,
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": 'attachment; filename="voices.zip"',
+                "X-Tokens-Used": str(current_user.total_tokens_used),
+                "X-Tokens-Remaining": str(response.tokens_remaining),
+                "X-Daily-Count": str(current_user.daily_voice_count),
+                "Cache-Control": "no-store",
+            }
+        )
+    return response
+
+def _job_response(job: TTSJob) -> TTSJobResponse:
+    return TTSJobResponse(
+        job_id=job.id,
+        status=job.status,
+        progress=tts_job_manager.progress(job),
+        audio_url=job_audio_url(job.id) if job.status == JOB_SUCCEEDED else None,
+        audio_size=job.audio_size,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at
+    )
+
+
+def _get_user_job(job_id: str, current_user: User, db: Session) -> TTSJob:
+    job = db.query(TTSJob).filter(TTSJob.id == job_id, TTSJob.user_id == current_user.id).first()
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.post("/tts/jobs", response_model=TTSJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_tts_job(
+    request: TTSJobCreateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Queue a voice generation job and return its id immediately.
+    Poll GET /tts/jobs/{id} for status, or pass webhook_url to be notified.
+    Limits are checked now; usage is charged when the job succeeds.
+    """
+    word_count = len(request.text.split())
+    limit_error = check_voice_limits(current_user, word_count)
+    if limit_error is not None:
+        return JSONResponse(status_code=limit_error.error["status_code"], content=jsonable_encoder(limit_error))
+    if request.webhook_url:
+        try:
+            await check_webhook_url(str(request.webhook_url))
+        except WebhookURLError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    job = TTSJob(
+        id=new_job_id(),
+        user_id=current_user.id,
+        status="queued",
+        progress=0.0,
+        text=request.text,
+        voice=request.voice,
+        word_count=word_count,
+        webhook_url=str(request.webhook_url) if request.webhook_url else None
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    try:
+        tts_job_manager.enqueue(job.id)
+    except JobQueueFullError as e:
+        job.status = "failed"
+        job.error = str(e)
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    logger.info(f"[TTS JOBS] Job {job.id} queued for user {current_user.id} ({word_count} words)")
+    return _job_response(job)
+
+@router.get("/tts/jobs/{job_id}", response_model=TTSJobResponse)
+async def get_tts_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status and progress of one of the current user's jobs"""
+    return _job_response(_get_user_job(job_id, current_user, db))
+
+@router.get("/tts/jobs/{job_id}/audio")
+async def get_tts_job_audio(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Audio of a finished job (409 while the job is still queued/running or if it failed)"""
+    job = _get_user_job(job_id, current_user, db)
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    if not job.audio_path or not os.path.exists(job.audio_path):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Job audio is no longer available")
+    return FileResponse(job.audio_path, media_type="audio/mpeg", filename=f"{job.id}.mp3")
+
+HISTORY_FIELDS = ("id", "text", "audio_url", "created_at")
+
+
+def _history_page_size(limit: Optional[int]) -> int:
+    return min(max(1, limit or settings.HISTORY_PAGE_SIZE), settings.HISTORY_MAX_PAGE_SIZE)
+
+
+def _history_fields(fields: Optional[str]) -> List[str]:
+    """?fields= -> the history fields to return (400 for unknown names)"""
+    if not fields:
+        return list(HISTORY_FIELDS)
+    wanted = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in wanted if name not in HISTORY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown history field(s): {', '.join(unknown)}. Available: {', '.join(HISTORY_FIELDS)}",
+        )
+    return wanted
+
+
 @router.get("/history")
 async def get_voice_history(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get user's voice generation history"""
-    history = db.query(VoiceHistory).filter(VoiceHistory.user_id == current_user.id).all()
-    
+    """
+    Get user's voice generation history, newest first, one page at a time.
+
+    The id of the last entry of a page is returned in the X-Next-Cursor header
+    (absent on the last page); pass it as ?cursor= for the next page (a cursor
+    that is not one of the user's entries is a 400). ?fields=
+    (comma-separated, e.g. "id,audio_url,created_at") skips the other columns,
+    notably the text. Pages are read from the (user_id, created_at, id) index.
+    """
+    page_size = _history_page_size(limit)
+    wanted = _history_fields(fields)
+
+    # id and created_at are always loaded: they make up the cursor position
+    columns = [VoiceHistory.id, VoiceHistory.created_at]
+    columns += [getattr(VoiceHistory, name) for name in ("text", "audio_url") if name in wanted]
+    query = db.query(*columns).filter(VoiceHistory.user_id == current_user.id)
+    if cursor is not None:
+        # Position of the cursor entry, looked up by the database so created_at
+        # compares in its own storage format
+        anchor = db.query(VoiceHistory.created_at).filter(
+            VoiceHistory.id == cursor, VoiceHistory.user_id == current_user.id
+        )
+        # A missing or another user's entry has no position: without this the page would be silently empty
+        if not db.query(anchor.exists()).scalar():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.filter(tuple_(VoiceHistory.created_at, VoiceHistory.id) < tuple_(anchor.scalar_subquery(), cursor))
+    rows = query.order_by(VoiceHistory.created_at.desc(), VoiceHistory.id.desc()).limit(page_size + 1).all()
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+
     return [
-        {
-            "id": entry.id,
-            "text": entry.text,
-            "audio_url": entry.audio_url,
-            "created_at": entry.created_at
-        }
-        for entry in history
+        {name: getattr(row, name) for name in wanted}
+        for row in rows
+    ]
+
+@router.get("/history/search")
+async def search_voice_history(
+    q: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search of the user's voice history, best match first. Every word
+    of q must appear in the text (the last one may be a prefix). Paginated like
+    /history: pass the X-Next-Cursor response header (opaque) as ?cursor= for
+    the next page.
+    """
+    if not history_search.is_supported(db.get_bind().dialect.name):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="History search is not available on this database")
+    page_size = _history_page_size(limit)
+    wanted = _history_fields(fields)
+    after = None
+    if cursor:
+        try:
+            after = history_search.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    entries = history_search.search(db, current_user.id, q, page_size + 1, after)
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        response.headers["X-Next-Cursor"] = history_search.encode_cursor(entries[-1])
+
+    return [
+        {name: entry[name] for name in wanted}
+        for entry in entries
     ]
 
 @router.get("/debug")
@@ -416,9 +849,62 @@ async def debug_tts_service(current_user: User = Depends(get_current_user)):
         "api_key_configured": api_key_set,
         "api_key_preview": api_key_preview,
         "base_url": lamonfox_service.base_url,
-        "status": "ready" if api_key_set else "missing_api_key"
+        "status": "ready" if api_key_set else "missing_api_key",
+        "cache": lamonfox_service.cache.stats() if lamonfox_service.cache else None
+    }
+
+@router.get("/tts/stats")
+async def get_tts_stats(current_user: User = Depends(get_current_user)):
+    """Counters for the TTS hot path (cache hits/misses/evictions, coalesced requests)"""
+    return {
+        "cache": lamonfox_service.cache.stats() if lamonfox_service.cache else None,
+        "single_flight": lamonfox_service.single_flight.stats(),
+        "governor": lamonfox_service.governor.stats(),
+        "router": tts_router.stats(),
+        "sentence_cache": sentence_audio_cache.stats(),
+        "watermark": dict(WATERMARK_STATS),
+        "audio_executor": audio_executor.stats(),
+        "jobs": tts_job_manager.stats(),
+        "audio_store": audio_store.stats(),
+        "voice_catalog": voice_catalog.stats(),
+        "variants": audio_variants.stats(),
+        "usage": usage_counters.stats(),
+        "daily_reset": daily_reset.stats(),
+        "history_search": history_search.stats(),
+        "logging": logging_stats()
     }
 
+@router.get("/voices")
+async def list_voices():
+    """Voice catalog with preview URLs for voices whose sample is ready"""
+    voices = await voice_catalog.voices()
+    return {"voices": [voice_catalog.describe(voice) for voice in voices]}
+
+@router.get("/voices/{voice_id}/preview")
+async def voice_preview(voice_id: str):
+    """
+    Pre-rendered sample for a voice. Only reads the rendered file (never synthesizes);
+    503 with Retry-After while the sample is still being rendered.
+    """
+    if voice_catalog.get(voice_id) is None:
+        await voice_catalog.voices()
+        if voice_catalog.get(voice_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Voice not found")
+    if not voice_catalog.preview_ready(voice_id):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Voice preview is not ready yet",
+            headers={"Retry-After": "30"}
+        )
+    return FileResponse(
+        voice_catalog.preview_path(voice_id),
+        media_type="audio/mpeg",
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{voice_catalog.preview_version(voice_id)}"',
+        }
+    )
+
 @router.get("/plan")
 async def get_plan_info(current_user: User = Depends(get_current_user)):
     """Get user's current plan information"""
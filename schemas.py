@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import AnyHttpUrl, BaseModel, EmailStr
 from datetime import datetime
 from typing import Optional, List
 
@@ -69,17 +69,77 @@ class AdminUpdateCredentials(BaseModel):
 # =======================
 class VoiceGenerateRequest(BaseModel):
     text: str
+    chunked: Optional[bool] = None  # Split at sentences and synthesize in parallel (default: auto for long texts)
+    incremental: Optional[bool] = None  # Reuse previously synthesized sentences, synthesize only changed ones
+    format: str = "mp3"  # "mp3", "opus" or "aac"
+    bitrate: Optional[int] = None  # kbps; e.g. 24-32 for Opus on slow mobile connections
 
 class VoiceGenerateResponse(BaseModel):
     success: bool
     message: str
     audio_data: Optional[str] = None  # Base64 encoded audio for trial users
     audio_url: Optional[str] = None   # URL for paid users
+    audio_format: Optional[str] = None  # Media type of audio_data / audio_url
     daily_count: int
     limit_reached: bool = False
     tokens_used: Optional[int] = None
     tokens_remaining: Optional[int] = None
     error: Optional[dict] = None  # Error details for failed requests
+    chunk_timings: Optional[List[dict]] = None  # Per-chunk timings when chunked synthesis was used
+    sentences_reused: Optional[int] = None  # Incremental synthesis: sentences served from the sentence store
+    sentences_synthesized: Optional[int] = None  # Incremental synthesis: sentences sent upstream
+
+class VoiceBatchItem(BaseModel):
+    text: str
+    voice: str = "sarah"
+
+class VoiceBatchRequest(BaseModel):
+    items: List[VoiceBatchItem]
+    output: str = "json"  # "json" (per-item results) or "zip" (NNN.mp3 files plus results.json)
+
+class VoiceBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    word_count: int
+    audio_data: Optional[str] = None  # Base64 encoded audio for trial users
+    audio_url: Optional[str] = None   # URL for paid users
+    error: Optional[str] = None
+
+class VoiceBatchResponse(BaseModel):
+    success: bool
+    message: str
+    results: List[VoiceBatchItemResult] = []
+    daily_count: int
+    limit_reached: bool = False
+    tokens_used: Optional[int] = None
+    tokens_remaining: Optional[int] = None
+    error: Optional[dict] = None
+
+class TTSJobCreateRequest(BaseModel):
+    text: str
+    voice: str = "sarah"
+    webhook_url: Optional[AnyHttpUrl] = None  # https, public host; POSTed the job status when the job finishes
+
+class TTSJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    progress: float = 0.0  # 0.0 - 1.0
+    audio_url: Optional[str] = None  # Set once the job has succeeded
+    audio_size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+class VideoJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    video_url: Optional[str] = None  # Set once the job has succeeded
+    video_size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
 
 # =======================
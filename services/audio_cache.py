@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text so trivially different inputs map to the same audio
+    (Unicode form, surrounding and repeated whitespace).
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def make_audio_key(text: str, voice: str, response_format: str) -> str:
+    """
+    Content-addressed cache key for a synthesis request
+    """
+    payload = "\x1f".join([normalize_text(text), voice or "", response_format or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Two-tier cache for synthesized audio:
+    an in-memory LRU bounded by total bytes, backed by an on-disk store
+    bounded by total size (least recently used files are evicted first).
+    """
+
+    def __init__(self, memory_bytes: int, disk_dir: Optional[str], disk_bytes: int):
+        self.memory_budget = max(0, memory_bytes)
+        self.disk_budget = max(0, disk_bytes) if disk_dir else 0
+        self.disk_dir = disk_dir
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_budget:
+            self._load_disk_index()
+
+    # ---------- public API ----------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up audio by key, promoting disk hits into memory
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return data
+            on_disk = key in self._disk_index
+
+        if on_disk:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                    self._store_memory(key, data)
+                return data
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        """
+        Store audio in both tiers
+        """
+        if not data:
+            return
+        with self._lock:
+            self.counters["stores"] += 1
+            self._store_memory(key, data)
+        if self.disk_budget and len(data) <= self.disk_budget:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "memory_budget_bytes": self.memory_budget,
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_size,
+                "disk_budget_bytes": self.disk_budget,
+            }
+
+    # ---------- memory tier (caller holds the lock) ----------
+
+    def _store_memory(self, key: str, data: bytes) -> None:
+        if not self.memory_budget or len(data) > self.memory_budget:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.counters["memory_evictions"] += 1
+
+    # ---------- disk tier ----------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.bin")
+
+    def _load_disk_index(self) -> None:
+        """
+        Rebuild the LRU index from files left by a previous process
+        """
+        entries = []
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            for root, _, files in os.walk(self.disk_dir):
+                for name in files:
+                    if not name.endswith(".bin"):
+                        continue
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        except OSError as e:
+            logger.warning(f"[AUDIO CACHE] Could not scan cache directory {self.disk_dir}: {e}")
+            return
+
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_size += size
+        for evicted_key in self._evict_disk():
+            try:
+                os.remove(self._path(evicted_key))
+            except OSError:
+                pass
+        logger.info(f"[AUDIO CACHE] Disk tier ready: {len(self._disk_index)} entries, {self._disk_size} bytes in {self.disk_dir}")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                size = self._disk_index.pop(key, None)
+                if size is not None:
+                    self._disk_size -= size
+            return None
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[AUDIO CACHE] Could not write cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            previous = self._disk_index.pop(key, None)
+            if previous is not None:
+                self._disk_size -= previous
+            self._disk_index[key] = len(data)
+            self._disk_size += len(data)
+            evicted = self._evict_disk()
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except OSError:
+                pass
+
+    def _evict_disk(self) -> list:
+        """
+        Drop least recently used entries until the disk tier fits its budget.
+        Caller holds the lock (or is still in __init__); returns evicted keys
+        so files can be removed outside the lock.
+        """
+        evicted = []
+        while self._disk_size > self.disk_budget and self._disk_index:
+            key, size = self._disk_index.popitem(last=False)
+            self._disk_size -= size
+            self.counters["disk_evictions"] += 1
+            evicted.append(key)
+        return evicted
+
+
+# Shared cache instance for Lemonfox TTS output
+tts_audio_cache = AudioCache(
+    memory_bytes=settings.TTS_CACHE_MEMORY_BYTES,
+    disk_dir=settings.TTS_CACHE_DIR if settings.TTS_CACHE_DISK_BYTES > 0 else None,
+    disk_bytes=settings.TTS_CACHE_DISK_BYTES,
+)
+
+# Per-sentence audio, reused when an edited text is regenerated
+sentence_audio_cache = AudioCache(
+    memory_bytes=settings.TTS_SENTENCE_CACHE_MEMORY_BYTES,
+    disk_dir=settings.TTS_SENTENCE_CACHE_DIR if settings.TTS_SENTENCE_CACHE_DISK_BYTES > 0 else None,
+    disk_bytes=settings.TTS_SENTENCE_CACHE_DISK_BYTES,
+)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Number of worker processes for audio post-processing (0 = run in a thread instead)
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+
+
+def _init_worker() -> None:
+    """Runs once in each worker: log directly (the parent's log queue listener is not forked), pre-encode watermarks"""
+    from utils.logging_setup import configure_worker_logging
+    from utils.audio_utils import prepare_watermarks
+    configure_worker_logging()
+    prepare_watermarks()
+
+
+def _noop() -> int:
+    return os.getpid()
+
+
+def _timed_call(fn: Callable, args: tuple):
+    """Executed in the worker; reports how long the task itself ran"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class AudioExecutor:
+    """
+    Process pool for CPU-bound audio work (watermarking, transcoding) so it
+    never blocks the event loop. Created and warmed at startup; tracks queue
+    depth and task durations.
+    """
+
+    def __init__(self, workers: int = AUDIO_WORKERS):
+        self.workers = max(0, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=512)
+        self._waits = deque(maxlen=512)
+        self.counters = {
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    def start(self) -> None:
+        if self.workers == 0 or self._pool is not None:
+            return
+        # fork where available: the app is started with "python main.py", and spawned
+        # workers would re-import main.py (tables, routes, MoviePy) in every process.
+        # Workers only run pure functions, and they are forked here at startup.
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+        )
+        # Warm up: make every worker start (and run its initializer) now, not on the first request
+        for _ in range(self.workers):
+            self._pool.submit(_noop)
+        logger.info(f"[AUDIO EXECUTOR] Started process pool with {self.workers} workers")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("[AUDIO EXECUTOR] Process pool shut down")
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) off the event loop. fn must be a picklable module-level function.
+        Falls back to a thread when the pool is disabled or not started.
+        """
+        with self._lock:
+            self.counters["in_flight"] += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+        submitted = time.perf_counter()
+        try:
+            if self._pool is not None:
+                loop = asyncio.get_running_loop()
+                result, duration = await loop.run_in_executor(self._pool, _timed_call, fn, args)
+            else:
+                result, duration = await asyncio.to_thread(_timed_call, fn, args)
+        except Exception:
+            with self._lock:
+                self.counters["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self.counters["in_flight"] -= 1
+        with self._lock:
+            self.counters["completed"] += 1
+            self._durations.append(duration)
+            self._waits.append(max(0.0, time.perf_counter() - submitted - duration))
+        return result
+
+    async def watermark(self, audio_data: bytes) -> bytes:
+        """
+        watermark_audio off the event loop. The path taken is counted in
+        WATERMARK_STATS here: counters updated in a worker process stay there.
+        """
+        from utils.audio_utils import WATERMARK_STATS, watermark_audio_with_path
+        audio_data, path = await self.run(watermark_audio_with_path, audio_data)
+        if path is not None:
+            WATERMARK_STATS[path] += 1
+        return audio_data
+
+    def stats(self) -> dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            waits = sorted(self._waits)
+            in_flight = self.counters["in_flight"]
+            return {
+                **self.counters,
+                "workers": self.workers,
+                "mode": "process" if self._pool is not None else "thread",
+                "queue_depth": max(0, in_flight - self.workers) if self._pool is not None else 0,
+                "task_ms_p50": round(_percentile(durations, 0.50) * 1000, 1),
+                "task_ms_p95": round(_percentile(durations, 0.95) * 1000, 1),
+                "queue_wait_ms_p95": round(_percentile(waits, 0.95) * 1000, 1),
+            }
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Shared executor for audio post-processing
+audio_executor = AudioExecutor()
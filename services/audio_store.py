@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+from config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_AUDIO_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class AudioStore:
+    """
+    Content-addressed store for generated audio. A file's id is the SHA-256 of
+    its bytes, so identical audio is stored once and a stored file never changes
+    (safe to cache forever). Files live at <root>/<id[:2]>/<id>.<extension>;
+    MP3 is the default, other formats come from format variants.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.counters = {"stored": 0, "deduplicated": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_id(audio_id: str) -> bool:
+        return bool(_AUDIO_ID.match(audio_id or ""))
+
+    @staticmethod
+    def url(audio_id: str, extension: str = "mp3") -> str:
+        if extension == "mp3":
+            return f"/static/audio/{audio_id}"
+        return f"/static/audio/{audio_id}.{extension}"
+
+    def path(self, audio_id: str, extension: str = "mp3") -> str:
+        return os.path.join(self.root, audio_id[:2], f"{audio_id}.{extension}")
+
+    def exists(self, audio_id: str, extension: str = "mp3") -> bool:
+        return self.is_valid_id(audio_id) and os.path.isfile(self.path(audio_id, extension))
+
+    async def put(self, data: bytes, extension: str = "mp3") -> str:
+        """Store audio (if not already stored) and return its id"""
+        return await asyncio.to_thread(self.put_sync, data, extension)
+
+    def put_sync(self, data: bytes, extension: str = "mp3") -> str:
+        audio_id = hashlib.sha256(data).hexdigest()
+        path = self.path(audio_id, extension)
+        if os.path.isfile(path):
+            with self._lock:
+                self.counters["deduplicated"] += 1
+            return audio_id
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.counters["stored"] += 1
+        logger.info(f"[AUDIO STORE] Stored {audio_id[:12]}.{extension} ({len(data)} bytes)")
+        return audio_id
+
+    def read_range(self, audio_id: str, start: int, length: int, extension: str = "mp3") -> bytes:
+        with open(self.path(audio_id, extension), "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def size(self, audio_id: str, extension: str = "mp3") -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(audio_id, extension))
+        except OSError:
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+# Shared store for generated voice audio
+audio_store = AudioStore(settings.AUDIO_STORE_DIR)
@@ -0,0 +1,59 @@
+import hashlib
+import logging
+from typing import Optional
+
+from services.audio_cache import AudioCache, tts_audio_cache
+from services.audio_executor import audio_executor
+from services.single_flight import SingleFlight
+from utils.audio_formats import AUDIO_FORMATS, transcode_audio
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def variant_key(audio_data: bytes, fmt: str, bitrate: Optional[int]) -> str:
+    """Cache key for a transcode: the source audio's hash plus the target format and bitrate"""
+    kbps = bitrate or AUDIO_FORMATS[fmt]["default_kbps"]
+    payload = f"variant\x1f{hashlib.sha256(audio_data).hexdigest()}\x1f{fmt}\x1f{kbps}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioVariants:
+    """
+    Transcoded variants (Opus, AAC, low-bitrate MP3) of synthesized audio.
+    Each (source audio, format, bitrate) is transcoded once in the audio
+    executor and then served from the audio cache; concurrent requests for
+    the same variant share one transcode.
+    """
+
+    def __init__(self, cache: AudioCache = tts_audio_cache):
+        self.cache = cache
+        self.single_flight = SingleFlight("transcode")
+        self.counters = {
+            "hits": 0,
+            "transcodes": 0,
+        }
+
+    async def get(self, audio_data: bytes, fmt: str, bitrate: Optional[int] = None) -> bytes:
+        key = variant_key(audio_data, fmt, bitrate)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            self.counters["hits"] += 1
+            return cached
+
+        async def _transcode() -> bytes:
+            variant = await audio_executor.run(transcode_audio, audio_data, fmt, bitrate)
+            await self.cache.put(key, variant)
+            self.counters["transcodes"] += 1
+            logger.info(f"[TRANSCODE] {len(audio_data)} bytes -> {fmt}@{bitrate or AUDIO_FORMATS[fmt]['default_kbps']}k, {len(variant)} bytes")
+            return variant
+
+        return await self.single_flight.do(key, _transcode)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+# Shared instance: variants live in the TTS audio cache next to their sources
+audio_variants = AudioVariants()
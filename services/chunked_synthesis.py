@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+from config import settings
+from services.audio_cache import AudioCache, make_audio_key, sentence_audio_cache
+from utils.mp3_utils import concat_mp3
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Sentence ends: Latin . ! ? followed by whitespace, or Urdu full stop / question mark
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|(?<=[۔؟])\s*")
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences at . ! ? and the Urdu full stop (۔) / question mark (؟)
+    """
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text or "") if sentence.strip()]
+
+
+def build_chunks(sentences: List[str], max_chars: int) -> List[str]:
+    """
+    Pack consecutive sentences into chunks of at most max_chars.
+    A single sentence longer than max_chars becomes its own chunk.
+    """
+    chunks: List[str] = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def should_chunk(text: str, requested: Optional[bool] = None) -> bool:
+    """Explicit request wins; otherwise chunk texts longer than the configured threshold"""
+    if requested is not None:
+        return requested
+    return len(text) > settings.TTS_CHUNK_THRESHOLD_CHARS
+
+
+async def synthesize_chunked(
+    tts_service,
+    text: str,
+    voice: str = "sarah",
+    response_format: str = "mp3",
+    max_chars: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[bytes, List[dict]]:
+    """
+    Synthesize text as sentence-aligned chunks in parallel (bounded by a semaphore)
+    and join the MP3 results at frame level, preserving sentence order.
+    progress_callback(done, total) is called as each chunk finishes.
+    Returns (audio bytes, per-chunk timings).
+    """
+    if response_format != "mp3":
+        raise ValueError("Chunked synthesis only supports mp3 output")
+
+    chunks = build_chunks(split_sentences(text), max_chars or settings.TTS_CHUNK_MAX_CHARS)
+    if not chunks:
+        raise Exception("Text input is required for voice generation")
+
+    concurrency = max(1, max_concurrency or settings.TTS_CHUNK_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    started_at = time.perf_counter()
+    done = 0
+
+    async def _synthesize(index: int, chunk: str) -> Tuple[bytes, dict]:
+        async with semaphore:
+            chunk_start = time.perf_counter()
+            audio = await tts_service.generate_voice(chunk, voice=voice, response_format=response_format)
+            timing = {
+                "index": index,
+                "chars": len(chunk),
+                "bytes": len(audio),
+                "started_ms": round((chunk_start - started_at) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - chunk_start) * 1000, 1),
+            }
+        nonlocal done
+        done += 1
+        if progress_callback is not None:
+            progress_callback(done, len(chunks))
+        return audio, timing
+
+    results = await asyncio.gather(*(_synthesize(i, chunk) for i, chunk in enumerate(chunks)))
+    audio_parts = [audio for audio, _ in results]
+    timings = [timing for _, timing in results]
+
+    audio_data = concat_mp3(audio_parts)
+    logger.info(f"[CHUNKED] {len(chunks)} chunks, {len(audio_data)} bytes in {(time.perf_counter() - started_at) * 1000:.0f} ms (concurrency {concurrency})")
+    return audio_data, timings
+
+
+def should_use_incremental(requested: Optional[bool] = None) -> bool:
+    if requested is not None:
+        return requested
+    return settings.TTS_INCREMENTAL_DEFAULT
+
+
+async def synthesize_incremental(
+    tts_service,
+    text: str,
+    voice: str = "sarah",
+    response_format: str = "mp3",
+    store: AudioCache = sentence_audio_cache,
+    max_concurrency: Optional[int] = None,
+) -> Tuple[bytes, dict]:
+    """
+    Synthesize text sentence by sentence, reusing stored audio for sentences
+    that were already synthesized (e.g. the unchanged parts of an edited script).
+    Only new or changed sentences are sent upstream.
+    Returns (audio bytes, {"sentences_reused": n, "sentences_synthesized": m}).
+    """
+    if response_format != "mp3":
+        raise ValueError("Incremental synthesis only supports mp3 output")
+
+    sentences = split_sentences(text)
+    if not sentences:
+        raise Exception("Text input is required for voice generation")
+
+    keys = [make_audio_key(sentence, voice, response_format) for sentence in sentences]
+    audio_by_key = {}
+    missing = {}
+    for key, sentence in zip(keys, sentences):
+        if key in audio_by_key or key in missing:
+            continue
+        audio = await store.get(key)
+        if audio is not None:
+            audio_by_key[key] = audio
+        else:
+            missing[key] = sentence
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or settings.TTS_CHUNK_CONCURRENCY))
+
+    async def _synthesize(key: str, sentence: str) -> None:
+        async with semaphore:
+            # The sentence store is the cache here, so skip the whole-text cache
+            audio = await tts_service.generate_voice(sentence, voice=voice, response_format=response_format, use_cache=False)
+        await store.put(key, audio)
+        audio_by_key[key] = audio
+
+    await asyncio.gather(*(_synthesize(key, sentence) for key, sentence in missing.items()))
+
+    audio_data = concat_mp3([audio_by_key[key] for key in keys])
+    stats = {
+        "sentences_reused": len(sentences) - sum(1 for key in keys if key in missing),
+        "sentences_synthesized": len(missing),
+    }
+    logger.info(f"[INCREMENTAL] {len(sentences)} sentences: {stats['sentences_reused']} reused, {stats['sentences_synthesized']} synthesized")
+    return audio_data, stats
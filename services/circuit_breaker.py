@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from config import settings
+from services.http_client import http_clients
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit is open"""
+
+    error_type = "CIRCUIT_OPEN"
+
+    def __init__(self, name: str, retry_in: float):
+        self.upstream = name
+        self.retry_in = retry_in
+        super().__init__(f"{name} is temporarily unavailable (circuit open). Please try again in {max(1, round(retry_in))} seconds.")
+
+
+def is_outage(error: BaseException) -> bool:
+    """
+    True for failures that say the upstream itself is unhealthy: timeouts,
+    connection errors and 5xx. Client errors and 429s do not trip the breaker.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    if getattr(error, "error_type", None) in ("TIMEOUT", "NETWORK"):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+    closed:    calls go through; failure_threshold consecutive outages open the circuit
+    open:      calls fail immediately with CircuitOpenError; a background probe checks
+               the upstream every probe_interval and moves to half-open when it answers
+               (or reset_timeout passes without a probe)
+    half_open: a single trial call is let through; success closes the circuit,
+               failure opens it again
+
+    Settings can be overridden with CIRCUIT_<NAME>_<SETTING> environment variables
+    (config.Settings.upstream), e.g. CIRCUIT_LEMONFOX_FAILURE_THRESHOLD=3.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        probe_interval: float = 10.0,
+        probe: Optional[Callable[[], Awaitable[object]]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, int(settings.upstream("CIRCUIT", name, "FAILURE_THRESHOLD", failure_threshold)))
+        self.reset_timeout = float(settings.upstream("CIRCUIT", name, "RESET_TIMEOUT", reset_timeout))
+        self.probe_interval = float(settings.upstream("CIRCUIT", name, "PROBE_INTERVAL", probe_interval))
+        self.probe = probe
+
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._probe_task: Optional[asyncio.Task] = None
+        self.last_error: Optional[str] = None
+        self.counters = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+            "probes": 0,
+        }
+
+    # ---------- call protocol ----------
+
+    def raise_if_open(self) -> None:
+        """Raise CircuitOpenError if a call would be rejected now (does not take the half-open trial)"""
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN:
+            self.counters["rejected"] += 1
+            raise CircuitOpenError(self.name, self.reset_timeout - (time.monotonic() - self._opened_at))
+        if self.state == HALF_OPEN and self._trial_in_flight:
+            self.counters["rejected"] += 1
+            raise CircuitOpenError(self.name, self.probe_interval)
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not go upstream now; in half-open, take the trial slot"""
+        self.raise_if_open()
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = True
+
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self) -> None:
+        self.counters["successes"] += 1
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_failure(self, error: BaseException) -> None:
+        """Count the failure if it is an outage; other errors mean the upstream is up"""
+        if isinstance(error, CircuitOpenError):
+            return
+        self._trial_in_flight = False
+        if not is_outage(error):
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+            self._consecutive_failures = 0
+            return
+        self.counters["failures"] += 1
+        self._consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:300]
+        if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.before_call()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def release(self) -> None:
+        """The call ended without an outcome (cancelled): free the half-open trial slot"""
+        self._trial_in_flight = False
+
+    # ---------- state changes ----------
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        if self.state != OPEN:
+            self.counters["opened"] += 1
+            self._transition(OPEN)
+        if self.probe is not None and (self._probe_task is None or self._probe_task.done()):
+            try:
+                self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+            except RuntimeError:
+                pass  # no running loop (sync caller): rely on reset_timeout
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"[CIRCUIT] {self.name}: {self.state} -> {state}" + (f" ({self.last_error})" if state == OPEN else ""))
+        self.state = state
+        if state == CLOSED:
+            self._consecutive_failures = 0
+
+    async def _probe_loop(self) -> None:
+        """While open, check the upstream in the background and half-open as soon as it answers"""
+        while self.state == OPEN:
+            await asyncio.sleep(self.probe_interval)
+            if self.state != OPEN:
+                return
+            self.counters["probes"] += 1
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.info(f"[CIRCUIT] {self.name}: probe failed ({type(e).__name__})")
+                continue
+            logger.info(f"[CIRCUIT] {self.name}: probe succeeded")
+            if self.state == OPEN:
+                self._transition(HALF_OPEN)
+            return
+
+    def stop(self) -> None:
+        if self._probe_task and not self._probe_task.done():
+            self._probe_task.cancel()
+
+    def snapshot(self) -> dict:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return {
+            **self.counters,
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_in_seconds": round(retry_in, 1),
+            "last_error": self.last_error,
+        }
+
+
+class CircuitBreakerRegistry:
+    """One breaker per upstream, registered by the service that calls it"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def register(self, name: str, **options) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **options)
+        return breaker
+
+    def get(self, name: str) -> CircuitBreaker:
+        return self._breakers[name]
+
+    def status(self) -> dict:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+    def shutdown(self) -> None:
+        for breaker in self._breakers.values():
+            breaker.stop()
+
+
+def http_probe(upstream: str, path: str = "/") -> Callable[[], Awaitable[object]]:
+    """Probe that succeeds when the upstream answers HTTP at all (any status code)"""
+    async def _probe():
+        config = http_clients.config(upstream)
+        return await http_clients.get(upstream).head(f"{config.base_url}{path}", timeout=config.connect_timeout)
+    return _probe
+
+
+# Shared registry used by all outbound services
+circuit_breakers = CircuitBreakerRegistry()
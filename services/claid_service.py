@@ -1,13 +1,15 @@
-import httpx
 import os
 from dotenv import load_dotenv
 from config import settings
+from services.http_client import http_clients
 
 load_dotenv()
 
 CLAID_API_KEY = settings.CLAID_API_KEY
 CLAID_BASE_URL = "https://api.claid.ai/v1"
 
+http_clients.register("claid", CLAID_BASE_URL, timeout=30.0, max_connections=5, max_keepalive_connections=2)
+
 class ClaidService:
     def __init__(self):
         self.api_key = CLAID_API_KEY
@@ -91,13 +93,13 @@ class ClaidService:
         """
         url = f"{self.base_url}/image/{image_id}/status"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error getting image status: {e}")
-                return {"status": "failed"}
+        client = http_clients.get("claid")
+        try:
+            response = await client.get(url, headers=self.headers)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error getting image status: {e}")
+            return {"status": "failed"}
 
 
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from datetime import date, datetime, time as dt_time, timedelta, timezone, tzinfo
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import or_, update
+
+from config import settings
+from database import SessionLocal
+from models import User
+from services.usage_counters import UsageCounters, usage_counters
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _zone(name: str) -> tzinfo:
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        logger.warning(f"[DAILY RESET] Unknown time zone {name!r} (is tzdata installed?), using UTC")
+        return timezone.utc
+
+
+# Every per-day counter column on users; all of them restart at zero together
+DAILY_COUNTER_COLUMNS = tuple(column.name for column in User.__table__.columns if column.name.startswith("daily_"))
+
+
+class DailyReset:
+    """
+    Resets every user's daily counters at local midnight with one
+    set-based UPDATE, so the request path never writes a reset.
+
+    The UPDATE only matches rows whose last_reset_date is before today (or
+    NULL): running it again - after a restart, or from each of several worker
+    processes - changes nothing. It also runs once at startup to catch up on a
+    midnight the server was down for.
+    """
+
+    def __init__(self, zone: tzinfo, usage: UsageCounters = usage_counters):
+        self.zone = zone
+        self.usage = usage
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.counters = {
+            "runs": 0,
+            "users_reset": 0,
+            "failures": 0,
+        }
+
+    def today(self) -> date:
+        return datetime.now(self.zone).date()
+
+    def seconds_until_midnight(self) -> float:
+        now = datetime.now(self.zone)
+        midnight = datetime.combine(now.date() + timedelta(days=1), dt_time.min, tzinfo=self.zone)
+        return max(0.0, (midnight - now).total_seconds())
+
+    def reset_now(self) -> int:
+        """Reset daily counts not yet reset today; returns the number of users reset"""
+        today = self.today()
+
+        def _reset() -> int:
+            db = SessionLocal()
+            try:
+                result = db.execute(
+                    update(User)
+                    .where(or_(User.last_reset_date.is_(None), User.last_reset_date < today))
+                    .values(last_reset_date=today, **{name: 0 for name in DAILY_COUNTER_COLUMNS})
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                return result.rowcount
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+        # Pending daily deltas belong to the day being reset; flushing is paused meanwhile
+        rows = self.usage.reset_all_daily(_reset)
+        self.last_run = datetime.now(self.zone)
+        self.counters["runs"] += 1
+        self.counters["users_reset"] += rows
+        logger.info(f"[DAILY RESET] Daily counters reset for {rows} users ({today})")
+        return rows
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        """Catch up now, then reset at every local midnight"""
+        delay = 0.0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await asyncio.to_thread(self.reset_now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["failures"] += 1
+                logger.error(f"[DAILY RESET] ❌ Reset failed: {type(e).__name__}: {e}")
+                # Retry soon rather than waiting for the next midnight
+                delay = 60.0
+                continue
+            # A second past midnight so the new local date is in effect
+            delay = self.seconds_until_midnight() + 1.0
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "time_zone": str(self.zone),
+            "today": self.today().isoformat(),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+
+daily_reset = DailyReset(_zone(settings.DAILY_RESET_TIMEZONE))
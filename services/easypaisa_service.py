@@ -3,6 +3,8 @@ import uuid
 import os
 from dotenv import load_dotenv
 from config import settings
+from services.circuit_breaker import CircuitOpenError, circuit_breakers, http_probe
+from services.http_client import http_clients
 
 load_dotenv()
 
@@ -11,6 +13,9 @@ EASYPAY_MERCHANT_ID = os.getenv("EASYPAY_MERCHANT_ID")
 EASYPAY_STORE_ID = os.getenv("EASYPAY_STORE_ID")
 EASYPAY_BASE_URL = "https://api.easypay.com.pk"  # Replace with actual Easypaisa API URL
 
+http_clients.register("easypaisa", EASYPAY_BASE_URL, timeout=30.0, max_connections=5, max_keepalive_connections=2)
+easypaisa_breaker = circuit_breakers.register("easypaisa", failure_threshold=3, probe=http_probe("easypaisa"))
+
 class EasypaisaService:
     def __init__(self):
         self.api_key = EASYPAY_API_KEY
@@ -21,6 +26,7 @@ class EasypaisaService:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+        self.breaker = easypaisa_breaker
     
     async def create_payment(self, amount: float, user_id: int, plan: str) -> dict:
         """
@@ -47,49 +53,70 @@ class EasypaisaService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/payments",
-                    json=data,
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                return {
-                    "success": True,
-                    "payment_url": result.get("payment_url"),
-                    "transaction_id": transaction_id
-                }
-            except httpx.HTTPStatusError as e:
-                print(f"Easypaisa API error: {e.response.status_code} - {e.response.text}")
-                return {
-                    "success": False,
-                    "error": f"Payment creation failed: {e.response.text}"
-                }
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                return {
-                    "success": False,
-                    "error": "Payment creation failed"
-                }
+        client = http_clients.get("easypaisa")
+
+        async def _post():
+            response = await client.post(
+                f"{self.base_url}/api/v1/payments",
+                json=data,
+                headers=self.headers
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await self.breaker.call(_post)
+            result = response.json()
+            
+            return {
+                "success": True,
+                "payment_url": result.get("payment_url"),
+                "transaction_id": transaction_id
+            }
+        except CircuitOpenError as e:
+            print(f"Easypaisa unavailable: {e}")
+            return {
+                "success": False,
+                "error": "Payment service is temporarily unavailable. Please try again in a few minutes.",
+                "error_type": e.error_type
+            }
+        except httpx.HTTPStatusError as e:
+            print(f"Easypaisa API error: {e.response.status_code} - {e.response.text}")
+            return {
+                "success": False,
+                "error": f"Payment creation failed: {e.response.text}"
+            }
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return {
+                "success": False,
+                "error": "Payment creation failed"
+            }
     
     async def verify_payment(self, transaction_id: str) -> dict:
         """
         Verify payment status with Easypaisa
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/payments/{transaction_id}/status",
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error verifying payment: {e}")
-                return {"status": "failed"}
+        client = http_clients.get("easypaisa")
+
+        async def _get():
+            response = await client.get(
+                f"{self.base_url}/api/v1/payments/{transaction_id}/status",
+                headers=self.headers
+            )
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await self.breaker.call(_get)
+            return response.json()
+        except CircuitOpenError as e:
+            # Unknown rather than failed: the payment may well have gone through
+            print(f"Easypaisa unavailable: {e}")
+            return {"status": "unavailable", "error_type": e.error_type}
+        except Exception as e:
+            print(f"Error verifying payment: {e}")
+            return {"status": "failed"}
 
 
 
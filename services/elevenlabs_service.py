@@ -1,11 +1,25 @@
 import httpx
 import os
+from typing import Optional, Tuple
 from dotenv import load_dotenv
+from services.circuit_breaker import circuit_breakers, http_probe
+from services.http_client import http_clients
 
 load_dotenv()
 
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
+ELEVENLABS_DEFAULT_VOICE_ID = os.getenv("ELEVENLABS_DEFAULT_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
+
+# Free tier compatible models, in order of preference
+ELEVENLABS_MODELS = [
+    "eleven_turbo_v2_5",  # Latest free tier model
+    "eleven_turbo_v2",    # Fallback option
+    "eleven_multilingual_v2",  # Multilingual option
+]
+
+http_clients.register("elevenlabs", ELEVENLABS_BASE_URL, timeout=60.0, max_connections=10)
+elevenlabs_breaker = circuit_breakers.register("elevenlabs", probe=http_probe("elevenlabs"))
 
 class ElevenLabsService:
     def __init__(self):
@@ -21,12 +35,26 @@ class ElevenLabsService:
             "Content-Type": "application/json",
             "xi-api-key": self.api_key or ""  # Use empty string if not set
         }
+        # Model that last worked; tried first so calls stop walking the model list
+        self.working_model: Optional[str] = None
+        self.breaker = elevenlabs_breaker
     
-    async def generate_voice(self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM") -> bytes:
+    async def generate_voice(self, text: str, voice_id: str = ELEVENLABS_DEFAULT_VOICE_ID) -> bytes:
         """
         Generate voice using ElevenLabs API
         Uses free tier compatible models
         """
+        audio, _ = await self.generate_voice_with_model(text, voice_id)
+        return audio
+
+    async def generate_voice_with_model(self, text: str, voice_id: str = ELEVENLABS_DEFAULT_VOICE_ID) -> Tuple[bytes, str]:
+        """
+        Generate voice and return (audio, model_id). The last model that worked
+        is tried first; deprecated models are skipped. Fails fast while the circuit is open.
+        """
+        return await self.breaker.call(lambda: self._generate_with_models(text, voice_id))
+
+    async def _generate_with_models(self, text: str, voice_id: str) -> Tuple[bytes, str]:
         # Validate API key before making request
         if not self.api_key:
             raise Exception("ElevenLabs API key is not configured. Please set ELEVENLABS_API_KEY environment variable.")
@@ -37,60 +65,71 @@ class ElevenLabsService:
         
         url = f"{self.base_url}/text-to-speech/{voice_id}"
         
-        # Try free tier compatible models in order
-        models_to_try = [
-            "eleven_turbo_v2_5",  # Latest free tier model
-            "eleven_turbo_v2",    # Fallback option
-            "eleven_multilingual_v2",  # Multilingual option
-        ]
+        # Try free tier compatible models in order, starting with the one that worked last
+        models_to_try = list(ELEVENLABS_MODELS)
+        if self.working_model in models_to_try:
+            models_to_try.remove(self.working_model)
+            models_to_try.insert(0, self.working_model)
         
-        async with httpx.AsyncClient() as client:
-            last_error = None
-            for model_id in models_to_try:
-                try:
-                    data = {
-                        "text": text,
-                        "model_id": model_id,
-                        "voice_settings": {
-                            "stability": 0.5,
-                            "similarity_boost": 0.5
-                        }
+        client = http_clients.get("elevenlabs")
+        last_error = None
+        for model_id in models_to_try:
+            try:
+                data = {
+                    "text": text,
+                    "model_id": model_id,
+                    "voice_settings": {
+                        "stability": 0.5,
+                        "similarity_boost": 0.5
                     }
-                    
-                    print(f"🎤 Trying model: {model_id}", flush=True)
-                    response = await client.post(url, json=data, headers=self.headers)
-                    response.raise_for_status()
-                    print(f"✅ Voice generated successfully with model: {model_id}", flush=True)
-                    return response.content
-                    
-                except httpx.HTTPStatusError as e:
-                    error_text = e.response.text if e.response else "Unknown error"
-                    status_code = e.response.status_code if e.response else 0
-                    print(f"⚠️ Model {model_id} failed: {status_code} - {error_text}", flush=True)
-                    last_error = e
-                    
-                    # Handle specific error cases
-                    if status_code == 401:
-                        raise Exception("ElevenLabs API key is invalid or expired. Please check your API key configuration.")
-                    elif status_code == 429:
-                        raise Exception("ElevenLabs API rate limit exceeded. Please try again later.")
-                    elif status_code == 400:
-                        # If it's a model deprecation error, try next model
-                        if "model_deprecated" in error_text or "model_deprecated_free_tier" in error_text:
-                            continue
-                        # Otherwise, raise the error
-                        raise Exception(f"Invalid request: {error_text}")
+                }
+                
+                print(f"🎤 Trying model: {model_id}", flush=True)
+                response = await client.post(url, json=data, headers=self.headers)
+                response.raise_for_status()
+                print(f"✅ Voice generated successfully with model: {model_id}", flush=True)
+                self.working_model = model_id
+                return response.content, model_id
+                
+            except httpx.HTTPStatusError as e:
+                error_text = e.response.text if e.response else "Unknown error"
+                status_code = e.response.status_code if e.response else 0
+                print(f"⚠️ Model {model_id} failed: {status_code} - {error_text}", flush=True)
+                last_error = e
+                
+                # Handle specific error cases
+                if status_code == 401:
+                    exception = Exception("ElevenLabs API key is invalid or expired. Please check your API key configuration.")
+                elif status_code == 429:
+                    exception = Exception("ElevenLabs API rate limit exceeded. Please try again later.")
+                elif status_code == 400:
+                    # If it's a model deprecation error, try next model
+                    if "model_deprecated" in error_text or "model_deprecated_free_tier" in error_text:
+                        if self.working_model == model_id:
+                            self.working_model = None
+                        continue
+                    # Otherwise, raise the error
+                    exception = Exception(f"Invalid request: {error_text}")
+                else:
                     # If it's a different error, raise it
-                    raise Exception(f"Voice generation failed (HTTP {status_code}): {error_text}")
-                except Exception as e:
-                    print(f"⚠️ Unexpected error with model {model_id}: {e}", flush=True)
-                    last_error = e
-                    continue
+                    exception = Exception(f"Voice generation failed (HTTP {status_code}): {error_text}")
+                exception.status_code = status_code
+                raise exception
+            except httpx.TransportError as e:
+                # The host is unreachable or timing out; other models would fail the same way
+                print(f"⚠️ Network error with model {model_id}: {type(e).__name__}: {e}", flush=True)
+                exception = Exception(f"Voice generation failed: network error ({type(e).__name__})")
+                exception.error_type = "TIMEOUT" if isinstance(e, httpx.TimeoutException) else "NETWORK"
+                raise exception
+            except Exception as e:
+                print(f"⚠️ Unexpected error with model {model_id}: {e}", flush=True)
+                last_error = e
+                continue
             
-            # If all models failed, raise the last error
-            if last_error:
-                raise Exception(f"Voice generation failed: All models failed. Last error: {last_error.response.text if hasattr(last_error, 'response') else str(last_error)}")
-            raise Exception("Voice generation failed: No models available")
+        # If all models failed, raise the last error
+        if last_error:
+            raise Exception(f"Voice generation failed: All models failed. Last error: {last_error.response.text if hasattr(last_error, 'response') else str(last_error)}")
+        raise Exception("Voice generation failed: No models available")
     
     async def get_voices(self):
         """
@@ -98,14 +137,14 @@ class ElevenLabsService:
         """
         url = f"{self.base_url}/voices"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error fetching voices: {e}")
-                return []
+        client = http_clients.get("elevenlabs")
+        try:
+            response = await client.get(url, headers=self.headers)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error fetching voices: {e}")
+            return []
 
 
 
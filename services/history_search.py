@@ -0,0 +1,184 @@
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# SQLite: external-content FTS5 table over voice_history.text (rowid = voice_history.id),
+# kept current by triggers. Same statements as migration 009.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS voice_history_fts USING fts5(
+        text, content='voice_history', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS voice_history_fts_ai AFTER INSERT ON voice_history BEGIN
+        INSERT INTO voice_history_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS voice_history_fts_ad AFTER DELETE ON voice_history BEGIN
+        INSERT INTO voice_history_fts(voice_history_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS voice_history_fts_au AFTER UPDATE OF text ON voice_history BEGIN
+        INSERT INTO voice_history_fts(voice_history_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO voice_history_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+# PostgreSQL: a generated tsvector column (computed on write) with a GIN index.
+# 'simple' configuration: no stemming or stop words, as scripts come in many languages.
+POSTGRES_DDL = [
+    """
+    ALTER TABLE voice_history ADD COLUMN IF NOT EXISTS text_search tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_voice_history_text_search ON voice_history USING GIN (text_search)",
+]
+
+# Best match first, then newest. Pages are keyset-paginated on (rank, id): the
+# {after} clause continues after the last entry of the previous page.
+# bm25 is lower for better matches, ts_rank higher.
+_SQLITE_SEARCH = """
+    SELECT h.id, h.text, h.audio_url, h.created_at, bm25(voice_history_fts) AS rank
+    FROM voice_history_fts JOIN voice_history h ON h.id = voice_history_fts.rowid
+    WHERE voice_history_fts MATCH :query AND h.user_id = :user_id {after}
+    ORDER BY rank, h.id DESC
+    LIMIT :limit
+"""
+_SQLITE_AFTER = """
+    AND (bm25(voice_history_fts) > :after_rank OR (bm25(voice_history_fts) = :after_rank AND h.id < :after_id))
+"""
+
+_POSTGRES_SEARCH = """
+    SELECT h.id, h.text, h.audio_url, h.created_at, ts_rank(h.text_search, q) AS rank
+    FROM voice_history h, to_tsquery('simple', :query) q
+    WHERE h.user_id = :user_id AND h.text_search @@ q {after}
+    ORDER BY rank DESC, h.id DESC
+    LIMIT :limit
+"""
+_POSTGRES_AFTER = """
+    AND (ts_rank(h.text_search, q), h.id) < (CAST(:after_rank AS real), :after_id)
+"""
+
+
+def _statement(sql: str, after: str):
+    return text(sql.format(after=after)).columns(created_at=DateTime(timezone=True), rank=Float)
+
+
+_STATEMENTS = {
+    ("sqlite", False): _statement(_SQLITE_SEARCH, ""),
+    ("sqlite", True): _statement(_SQLITE_SEARCH, _SQLITE_AFTER),
+    ("postgresql", False): _statement(_POSTGRES_SEARCH, ""),
+    ("postgresql", True): _statement(_POSTGRES_SEARCH, _POSTGRES_AFTER),
+}
+
+
+class HistorySearch:
+    """
+    Full-text search over a user's voice history (VoiceHistory.text), ranked by
+    relevance: FTS5 with bm25 on SQLite, a tsvector GIN index with ts_rank on
+    PostgreSQL. Every word of the query must match; the last one also matches
+    as a prefix, so results show up while the user is still typing it.
+    """
+
+    def __init__(self):
+        self.counters = {
+            "searches": 0,
+            "empty_queries": 0,
+        }
+
+    @staticmethod
+    def is_supported(dialect: str) -> bool:
+        return dialect in ("sqlite", "postgresql")
+
+    def ensure_index(self, engine: Engine) -> None:
+        """
+        Create the search index if it is missing (databases built by create_all
+        rather than migrations). Idempotent; a newly created SQLite index is
+        filled from the existing history.
+        """
+        dialect = engine.dialect.name
+        if not self.is_supported(dialect):
+            logger.warning(f"[HISTORY SEARCH] No full-text index for {dialect}, history search is unavailable")
+            return
+        with engine.begin() as connection:
+            if dialect == "sqlite":
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'voice_history_fts'")
+                ).first() is not None
+                for statement in SQLITE_DDL:
+                    connection.execute(text(statement))
+                if not exists:
+                    connection.execute(text("INSERT INTO voice_history_fts(voice_history_fts) VALUES ('rebuild')"))
+                    logger.info("[HISTORY SEARCH] Built the full-text index of voice history")
+            else:
+                for statement in POSTGRES_DDL:
+                    connection.execute(text(statement))
+
+    @staticmethod
+    def build_query(query: str, dialect: str) -> Optional[str]:
+        """
+        User input -> FTS5 / tsquery expression. Only the words are kept (each one
+        quoted for FTS5), so operators and quotes typed by the user cannot make the
+        expression invalid. None when the input has no words.
+        """
+        words = _WORD.findall(query.lower())[:32]
+        if not words:
+            return None
+        if dialect == "sqlite":
+            return " ".join(f'"{word}"' for word in words) + "*"
+        return " & ".join(words) + ":*"
+
+    @staticmethod
+    def encode_cursor(entry: dict) -> str:
+        """Position of an entry in the results: '<rank>:<id>' (repr keeps the float exact)"""
+        return f"{entry['rank']!r}:{entry['id']}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[float, int]:
+        """'<rank>:<id>' -> (rank, id); ValueError when malformed"""
+        rank, _, entry_id = cursor.rpartition(":")
+        return float(rank), int(entry_id)
+
+    def search(
+        self,
+        db: Session,
+        user_id: int,
+        query: str,
+        limit: int,
+        after: Optional[Tuple[float, int]] = None,
+    ) -> List[dict]:
+        """
+        Up to `limit` of the user's history entries matching query, best match
+        first; with after=(rank, id), the entries that follow that position
+        """
+        dialect = db.get_bind().dialect.name
+        expression = self.build_query(query, dialect)
+        if expression is None:
+            self.counters["empty_queries"] += 1
+            return []
+        params = {"query": expression, "user_id": user_id, "limit": limit}
+        if after is not None:
+            params["after_rank"], params["after_id"] = after
+        rows = db.execute(_STATEMENTS[(dialect, after is not None)], params).mappings().all()
+        self.counters["searches"] += 1
+        return [dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+history_search = HistorySearch()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+
+class UpstreamConfig:
+    """
+    Connection settings for one upstream host.
+    Every value can be overridden with HTTP_<NAME>_<SETTING> environment
+    variables (config.Settings.upstream), e.g. HTTP_LEMONFOX_TIMEOUT=90.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        warmup_path: Optional[str] = "/",
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = float(settings.upstream("HTTP", name, "TIMEOUT", timeout))
+        self.connect_timeout = float(settings.upstream("HTTP", name, "CONNECT_TIMEOUT", connect_timeout))
+        self.max_connections = int(settings.upstream("HTTP", name, "MAX_CONNECTIONS", max_connections))
+        self.max_keepalive_connections = int(settings.upstream("HTTP", name, "MAX_KEEPALIVE", max_keepalive_connections))
+        self.keepalive_expiry = float(settings.upstream("HTTP", name, "KEEPALIVE_EXPIRY", keepalive_expiry))
+        self.warmup_path = warmup_path
+
+    def build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            http2=settings.HTTP2_ENABLED and H2_AVAILABLE,
+        )
+
+
+class HttpClientRegistry:
+    """
+    Application-lifetime registry of pooled httpx clients, one per upstream host.
+    Services register their upstream at import time and call get(name) per request;
+    FastAPI startup opens (and pre-connects) the clients, shutdown closes them.
+    """
+
+    def __init__(self):
+        self._configs: Dict[str, UpstreamConfig] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, base_url: str, **options) -> UpstreamConfig:
+        config = UpstreamConfig(name, base_url, **options)
+        self._configs[name] = config
+        return config
+
+    def config(self, name: str) -> UpstreamConfig:
+        return self._configs[name]
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Return the shared client for an upstream, creating it on first use
+        (covers scripts and tests that never run the startup hook).
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._configs[name].build_client()
+            self._clients[name] = client
+        return client
+
+    async def startup(self) -> None:
+        for name in self._configs:
+            self.get(name)
+        if settings.HTTP2_ENABLED and not H2_AVAILABLE:
+            logger.warning("[HTTP] HTTP2_ENABLED is set but the 'h2' package is not installed - using HTTP/1.1")
+        logger.info(f"[HTTP] Opened pooled clients for: {', '.join(self._clients) or 'none'}")
+        if settings.HTTP_WARMUP_ENABLED:
+            # Warm up in the background so a slow upstream never delays startup
+            self._warmup_task = asyncio.create_task(self.warmup())
+
+    async def warmup(self) -> None:
+        """
+        Pre-connect to every upstream so the first user request skips DNS/TCP/TLS setup
+        """
+        async def _warm(name: str):
+            config = self._configs[name]
+            try:
+                await self.get(name).head(config.warmup_path, timeout=config.connect_timeout)
+                logger.info(f"[HTTP] Pre-connected to {name} ({config.base_url})")
+            except Exception as e:
+                logger.warning(f"[HTTP] Warm-up for {name} failed: {type(e).__name__}: {e}")
+
+        await asyncio.gather(*(_warm(name) for name, config in self._configs.items() if config.warmup_path is not None))
+
+    async def shutdown(self) -> None:
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"[HTTP] Error closing client: {e}")
+        logger.info("[HTTP] Closed pooled clients")
+
+
+# Shared registry used by all outbound services
+http_clients = HttpClientRegistry()
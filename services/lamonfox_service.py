@@ -1,7 +1,15 @@
+import asyncio
 import httpx
 import os
 import logging
+import time
+from typing import AsyncIterator, Tuple
 from dotenv import load_dotenv
+from services.audio_cache import AudioCache, make_audio_key, tts_audio_cache
+from services.circuit_breaker import circuit_breakers, http_probe
+from services.http_client import http_clients
+from services.single_flight import SingleFlight
+from services.upstream_governor import UpstreamBusyError, UpstreamGovernor, parse_retry_after
 
 load_dotenv()
 
@@ -12,6 +20,25 @@ logger.setLevel(logging.INFO)
 LAMONFOX_API_KEY = os.getenv("LAMONFOX_API_KEY")
 LAMONFOX_BASE_URL = "https://api.lemonfox.ai/v1"
 
+LAMONFOX_VOICES_PATH = "/voices"
+
+# Used when the voices endpoint is unavailable
+DEFAULT_VOICES = [
+    {"id": "sarah", "name": "Sarah"},
+    {"id": "james", "name": "James"},
+    {"id": "emma", "name": "Emma"},
+    {"id": "william", "name": "William"},
+]
+
+# Pooled connection to Lemonfox, shared by all requests
+http_clients.register("lemonfox", LAMONFOX_BASE_URL, timeout=60.0, max_connections=20)
+
+# Rate limits, adaptive concurrency and retries for Lemonfox (shared: the limits are per API key)
+lemonfox_governor = UpstreamGovernor("lemonfox", requests_per_second=5.0, chars_per_second=5000.0, max_concurrency=8)
+
+# Fail fast while Lemonfox is down instead of waiting out the 60s timeout on every request
+lemonfox_breaker = circuit_breakers.register("lemonfox", probe=http_probe("lemonfox"))
+
 # Log API key source and status at module level
 logger.info("=" * 80)
 logger.info("[LAMONFOX] Loading API key from environment...")
@@ -33,11 +60,16 @@ else:
 logger.info("=" * 80)
 
 class LamonfoxService:
-    def __init__(self):
+    def __init__(self, cache: AudioCache = tts_audio_cache):
         logger.info("[LAMONFOX INIT] Initializing LamonfoxService")
         logger.info("[LAMONFOX INIT] Checking API key configuration...")
         self.api_key = LAMONFOX_API_KEY
         self.base_url = LAMONFOX_BASE_URL
+        self.cache = cache
+        # Identical requests that overlap in time share one upstream call
+        self.single_flight = SingleFlight("lemonfox")
+        self.governor = lemonfox_governor
+        self.breaker = lemonfox_breaker
         
         # Validate API key on initialization with detailed logging
         if not self.api_key:
@@ -67,44 +99,66 @@ class LamonfoxService:
             auth_preview = f"Bearer {self.api_key[:10]}...{self.api_key[-5:]}" if len(self.api_key) > 15 else "Bearer ***"
             logger.info(f"[LAMONFOX INIT] Authorization header preview: {auth_preview}")
     
-    async def generate_voice(self, text: str, voice: str = "sarah", response_format: str = "mp3") -> bytes:
+    async def generate_voice(self, text: str, voice: str = "sarah", response_format: str = "mp3", use_cache: bool = True) -> bytes:
         """
-        Generate voice using Lamonfox (Lemonfox.ai) API
+        Generate voice using Lamonfox (Lemonfox.ai) API.
+        Identical (text, voice, format) requests are served from the audio cache;
+        concurrent identical requests are coalesced into a single upstream call.
         """
-        logger.info("-" * 80)
-        logger.info("[LAMONFOX] Starting voice generation")
-        logger.info(f"[LAMONFOX] Text length: {len(text)} chars, Voice: {voice}, Format: {response_format}")
-        
-        # Detailed API key logging before validation
-        logger.info("[LAMONFOX] Checking API key before generation...")
-        if self.api_key:
-            key_length = len(self.api_key)
-            key_preview = f"{self.api_key[:10]}...{self.api_key[-5:]}" if key_length > 15 else f"{self.api_key[:5]}***"
-            logger.info(f"[LAMONFOX] API Key Status: ✅ PRESENT")
-            logger.info(f"[LAMONFOX] API Key Being Used:")
-            logger.info(f"  - Length: {key_length} characters")
-            logger.info(f"  - Preview: {key_preview}")
-            logger.info(f"  - First 6 chars: {self.api_key[:6]}")
-            logger.info(f"  - Last 6 chars: {self.api_key[-6:]}")
-            logger.info(f"  - Source: Environment variable 'LAMONFOX_API_KEY'")
-        else:
-            logger.error("[LAMONFOX] API Key Status: ❌ MISSING")
-            logger.error("[LAMONFOX] API Key Source: Environment variable 'LAMONFOX_API_KEY' is not set")
+        audio_data, _ = await self.generate_voice_with_origin(text, voice, response_format, use_cache)
+        return audio_data
+
+    async def generate_voice_with_origin(self, text: str, voice: str = "sarah", response_format: str = "mp3", use_cache: bool = True) -> Tuple[bytes, bool]:
+        """
+        generate_voice(), also returning whether this call went to the upstream
+        (False for cache hits and for callers that joined an in-flight request)
+        """
+        key = make_audio_key(text, voice, response_format)
+        if not use_cache or self.cache is None:
+            audio_data, joined = await self.single_flight.do_shared(key, lambda: self._governed_request(text, voice, response_format))
+            return audio_data, not joined
+
+        cached_audio = await self.cache.get(key)
+        if cached_audio is not None:
+            logger.info(f"[LAMONFOX CACHE] Hit for key {key[:12]}, {len(cached_audio)} bytes")
+            return cached_audio, False
+
+        async def _request_and_store() -> bytes:
+            audio_data = await self._governed_request(text, voice, response_format)
+            await self.cache.put(key, audio_data)
+            return audio_data
+
+        audio_data, joined = await self.single_flight.do_shared(key, _request_and_store)
+        return audio_data, not joined
+
+    async def _governed_request(self, text: str, voice: str, response_format: str) -> bytes:
+        """
+        Send the request through the Lemonfox governor: waits briefly for rate/concurrency
+        capacity and retries 429s (honouring Retry-After), 5xx and network errors.
+        An open circuit fails immediately, before queueing.
+        """
+        self.breaker.raise_if_open()
+        return await self.governor.call(
+            lambda: self.breaker.call(lambda: self._request_voice(text, voice, response_format)),
+            chars=len(text),
+        )
+
+    async def _request_voice(self, text: str, voice: str, response_format: str) -> bytes:
+        """
+        Call the Lamonfox speech endpoint (no caching)
+        """
+        logger.debug(f"[LAMONFOX] Starting voice generation: {len(text)} chars, Voice: {voice}, Format: {response_format}")
         
         # Validate API key before making request
         if not self.api_key:
-            logger.error("[LAMONFOX] ❌ API key validation failed: API key is not configured")
+            logger.error("[LAMONFOX] ❌ API key validation failed: LAMONFOX_API_KEY is not set")
             raise Exception("Lamonfox API key is not configured. Please set LAMONFOX_API_KEY environment variable.")
         
-        logger.info("[LAMONFOX] ✅ API key validation passed - proceeding with API request")
-        
         # Validate text input
         if not text or not text.strip():
             logger.error("[LAMONFOX] ❌ Text validation failed: Text is empty or whitespace")
             raise Exception("Text input is required for voice generation")
         
-        logger.info(f"[LAMONFOX] ✅ Text validation passed: {len(text.strip())} characters")
-        
         url = f"{self.base_url}/audio/speech"
         
         data = {
@@ -113,147 +167,237 @@ class LamonfoxService:
             "response_format": response_format
         }
         
-        logger.info(f"[LAMONFOX] Request URL: {url}")
-        logger.info(f"[LAMONFOX] Request data keys: {list(data.keys())}")
-        logger.info(f"[LAMONFOX] Voice: {voice}, Format: {response_format}")
-        
-        # Log API key info (safely)
-        if self.api_key:
-            key_preview = f"{self.api_key[:10]}...{self.api_key[-5:]}" if len(self.api_key) > 15 else f"{self.api_key[:5]}***"
-            logger.info(f"[LAMONFOX] API key used in request:")
-            logger.info(f"  - Preview: {key_preview}")
-            logger.info(f"  - First 6 chars: {self.api_key[:6]}")
-            logger.info(f"  - Last 6 chars: {self.api_key[-6:]}")
-        else:
-            logger.error("[LAMONFOX] API key: NOT SET")
-        
-        # Make request directly (no proxy)
-        logger.info("[LAMONFOX] Creating HTTP client with 60s timeout")
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        client = http_clients.get("lemonfox")
+        try:
+            started = time.perf_counter()
+            response = await client.post(url, json=data, headers=self.headers)
+            
+            logger.debug(
+                f"[LAMONFOX] Response: Status {response.status_code}, {len(response.content)} bytes "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms (key {self.api_key[:4]}…{self.api_key[-4:]})"
+            )
+            
+            response.raise_for_status()
+            
+            return response.content
+            
+        except httpx.HTTPStatusError as e:
+            # Handle HTTP errors from the API
+            raise self._http_error(e.response)
+
+        except httpx.TimeoutException as e:
+            logger.error("-" * 80)
+            logger.error(f"[LAMONFOX ERROR] TimeoutException: Request timed out after {http_clients.config('lemonfox').timeout:.0f} seconds")
+            logger.error(f"[LAMONFOX ERROR] Exception details: {str(e)}")
+            logger.error("-" * 80)
+            exception = Exception("Voice generation request timed out. Please try again.")
+            exception.error_type = "TIMEOUT"
+            raise exception
+        except httpx.TransportError as e:
+            logger.error(f"[LAMONFOX ERROR] Network error: {type(e).__name__}: {e}")
+            exception = Exception(f"Voice generation failed: network error ({type(e).__name__})")
+            exception.error_type = "NETWORK"
+            raise exception
+        except Exception as e:
+            logger.error("-" * 80)
+            logger.error(f"[LAMONFOX ERROR] Unexpected error type: {type(e).__name__}")
+            logger.error(f"[LAMONFOX ERROR] Error message: {str(e)}")
+            import traceback
+            logger.error(f"[LAMONFOX ERROR] Traceback:\n{traceback.format_exc()}")
+            logger.error("-" * 80)
+            raise Exception(f"Voice generation failed: {str(e)}")
+    
+    async def stream_voice(self, text: str, voice: str = "sarah", response_format: str = "mp3", chunk_size: int = 16384) -> AsyncIterator[bytes]:
+        """
+        Stream voice audio from Lamonfox chunk by chunk as it arrives.
+        Cache hits are replayed from the cache; a stream that completes is
+        stored in the cache so later non-streaming requests can reuse it.
+        """
+        if not self.api_key:
+            raise Exception("Lamonfox API key is not configured. Please set LAMONFOX_API_KEY environment variable.")
+        if not text or not text.strip():
+            raise Exception("Text input is required for voice generation")
+
+        cache_key = make_audio_key(text, voice, response_format)
+        if self.cache is not None:
+            cached_audio = await self.cache.get(cache_key)
+            if cached_audio is not None:
+                logger.info(f"[LAMONFOX STREAM] Cache hit for key {cache_key[:12]}, {len(cached_audio)} bytes")
+                for offset in range(0, len(cached_audio), chunk_size):
+                    yield cached_audio[offset:offset + chunk_size]
+                return
+
+        data = {
+            "input": text,
+            "voice": voice,
+            "response_format": response_format
+        }
+        # Keep a copy for the cache only while it still fits the memory tier
+        cache_limit = self.cache.memory_budget if self.cache is not None else 0
+        collected = bytearray()
+        total_bytes = 0
+
+        self.breaker.raise_if_open()
+        client = http_clients.get("lemonfox")
+        deadline = time.monotonic() + self.governor.deadline
+        attempt = 1
+        while True:
             try:
-                logger.info("[LAMONFOX] Sending POST request to Lamonfox API...")
-                
-                response = await client.post(url, json=data, headers=self.headers)
-                
-                logger.info(f"[LAMONFOX] Response received: Status {response.status_code}")
-                logger.info(f"[LAMONFOX] Response headers: {dict(response.headers)}")
-                logger.info(f"[LAMONFOX] Response content length: {len(response.content)} bytes")
-                
-                response.raise_for_status()
-                
-                logger.info(f"[LAMONFOX] ✅ Voice generated successfully")
-                logger.info(f"[LAMONFOX] Audio data size: {len(response.content)} bytes")
-                logger.info("-" * 80)
-                
-                return response.content
-                
-            except httpx.HTTPStatusError as e:
-                # Handle HTTP errors from the API
-                error_text = e.response.text if e.response else "Unknown error"
-                status_code = e.response.status_code if e.response else 0
-                
-                logger.error("-" * 80)
-                logger.error(f"[LAMONFOX ERROR] HTTP Status Error: {status_code}")
-                logger.error(f"[LAMONFOX ERROR] Response text: {error_text[:500]}")
-                
-                # Try to parse JSON error response
-                parsed_error = None
-                try:
-                    if e.response:
-                        error_json = e.response.json()
-                        logger.error(f"[LAMONFOX ERROR] Parsed JSON: {error_json}")
-                        parsed_error = error_json
-                        if isinstance(error_json, dict):
-                            if "detail" in error_json:
-                                detail = error_json["detail"]
-                                if isinstance(detail, dict):
-                                    message = detail.get("message", error_text)
-                                    status_msg = detail.get("status", "")
-                                    error_text = f"{status_msg}: {message}" if status_msg else message
-                                else:
-                                    error_text = str(detail)
-                except Exception as parse_error:
-                    logger.warning(f"[LAMONFOX ERROR] Could not parse error JSON: {parse_error}")
-                
-                logger.error(f"[LAMONFOX ERROR] Final error text: {error_text}")
-                
-                if self.api_key:
-                    key_preview = f"{self.api_key[:10]}...{self.api_key[-5:]}" if len(self.api_key) > 15 else f"{self.api_key[:5]}***"
-                    logger.error(f"[LAMONFOX ERROR] API Key used: {key_preview}")
-                else:
-                    logger.error("[LAMONFOX ERROR] API Key: NOT SET")
-                
-                # Create detailed error message
-                error_message = error_text
-                
-                # Handle specific error cases
-                if status_code == 401:
-                    logger.error("[LAMONFOX ERROR] 401 Unauthorized - API key invalid or expired")
-                    error_message = "Lamonfox API key is invalid or expired. Please check your API key configuration."
-                elif status_code == 402:
-                    logger.error("[LAMONFOX ERROR] 402 Payment Required - Free tier disabled or payment needed")
-                    error_message = "Payment required. Your API key may be on a free tier that has been disabled. Please upgrade to a paid plan or contact Lamonfox support."
-                elif status_code == 429:
-                    logger.error("[LAMONFOX ERROR] 429 Rate Limit Exceeded")
-                    error_message = "Lamonfox API rate limit exceeded. Please try again later."
-                elif status_code == 400:
-                    logger.error("[LAMONFOX ERROR] 400 Bad Request")
-                    # Check for unusual activity error
-                    if "unusual_activity" in error_text.lower() or "free tier" in error_text.lower():
-                        logger.error("[LAMONFOX ERROR] Detected unusual activity or free tier flag")
-                        error_message = (
-                            "Lamonfox API Error: Your account is being treated as Free Tier and has been flagged for unusual activity. "
-                            "This can happen if:\n"
-                            "1. Your API key is from a free account (even if you purchased credits)\n"
-                            "2. Railway's IP address is flagged as a proxy/VPN\n"
-                            "3. Your paid account needs to be activated\n\n"
-                            "SOLUTION: Please contact Lamonfox support at https://lemonfox.ai with:\n"
-                            "- Your API key (they can verify if it's paid)\n"
-                            "- Request to whitelist Railway's IP addresses\n"
-                            "- Ask them to activate your paid subscription\n\n"
-                            f"Original error: {error_text}"
-                        )
-                    else:
-                        error_message = f"Invalid request: {error_text}"
-                else:
-                    logger.error(f"[LAMONFOX ERROR] Unhandled HTTP status: {status_code}")
-                    error_message = f"Voice generation failed (HTTP {status_code}): {error_text}"
-                
-                # Raise exception with detailed error
-                exception = Exception(error_message)
-                exception.status_code = status_code
-                exception.parsed_error = parsed_error
-                exception.raw_error = error_text
-                raise exception
-                    
-            except httpx.TimeoutException as e:
-                logger.error("-" * 80)
-                logger.error(f"[LAMONFOX ERROR] TimeoutException: Request timed out after 60 seconds")
-                logger.error(f"[LAMONFOX ERROR] Exception details: {str(e)}")
-                logger.error("-" * 80)
-                exception = Exception("Voice generation request timed out. Please try again.")
-                exception.error_type = "TIMEOUT"
-                raise exception
+                async with self.governor.permit(len(text), deadline) as permit:
+                    self.breaker.before_call()
+                    try:
+                        async with client.stream("POST", f"{self.base_url}/audio/speech", json=data, headers=self.headers) as response:
+                            if response.status_code >= 400:
+                                await response.aread()
+                                raise self._http_error(response)
+                            async for chunk in response.aiter_bytes(chunk_size):
+                                total_bytes += len(chunk)
+                                if cache_limit and total_bytes <= cache_limit:
+                                    collected.extend(chunk)
+                                yield chunk
+                    except httpx.TimeoutException as e:
+                        logger.error(f"[LAMONFOX STREAM] Request timed out: {e}")
+                        exception = Exception("Voice generation request timed out. Please try again.")
+                        exception.error_type = "TIMEOUT"
+                        raise exception
+                    except httpx.TransportError as e:
+                        logger.error(f"[LAMONFOX STREAM] Network error: {type(e).__name__}: {e}")
+                        exception = Exception(f"Voice generation failed: network error ({type(e).__name__})")
+                        exception.error_type = "NETWORK"
+                        raise exception
+                    permit.success()
+                    self.breaker.record_success()
+                break
+            except UpstreamBusyError:
+                raise
             except Exception as e:
-                logger.error("-" * 80)
-                logger.error(f"[LAMONFOX ERROR] Unexpected error type: {type(e).__name__}")
-                logger.error(f"[LAMONFOX ERROR] Error message: {str(e)}")
-                import traceback
-                logger.error(f"[LAMONFOX ERROR] Traceback:\n{traceback.format_exc()}")
-                logger.error("-" * 80)
-                raise Exception(f"Voice generation failed: {str(e)}")
-    
-    async def get_voices(self):
+                self.breaker.record_failure(e)
+                error = e
+            except BaseException:
+                # Client went away mid-stream: no verdict on upstream health
+                self.breaker.release()
+                raise
+            # Retry only before the first byte has reached the client
+            delay = self.governor.retry_delay(error, attempt) if total_bytes == 0 else None
+            if delay is None or time.monotonic() + delay > deadline:
+                raise error
+            logger.warning(f"[LAMONFOX STREAM] Attempt {attempt} failed, retrying in {delay:.2f}s")
+            self.governor.counters["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        logger.info(f"[LAMONFOX STREAM] ✅ Stream complete, {total_bytes} bytes")
+        if cache_limit and total_bytes and total_bytes <= cache_limit:
+            await self.cache.put(cache_key, bytes(collected))
+
+    def _http_error(self, response: httpx.Response) -> Exception:
+        """
+        Build a descriptive exception for a failed Lamonfox response
+        (response body must already be read)
         """
-        Get available voices from Lamonfox API
-        Note: This endpoint may vary - check Lamonfox documentation
+        error_text = response.text if response is not None else "Unknown error"
+        status_code = response.status_code if response is not None else 0
+        
+        logger.debug(f"[LAMONFOX ERROR] Response text: {error_text[:500]}")
+        
+        # Try to parse JSON error response
+        parsed_error = None
+        try:
+            if response is not None:
+                error_json = response.json()
+                parsed_error = error_json
+                if isinstance(error_json, dict):
+                    if "detail" in error_json:
+                        detail = error_json["detail"]
+                        if isinstance(detail, dict):
+                            message = detail.get("message", error_text)
+                            status_msg = detail.get("status", "")
+                            error_text = f"{status_msg}: {message}" if status_msg else message
+                        else:
+                            error_text = str(detail)
+        except Exception as parse_error:
+            logger.warning(f"[LAMONFOX ERROR] Could not parse error JSON: {parse_error}")
+            
+        logger.error(f"[LAMONFOX ERROR] HTTP {status_code}: {error_text[:300]}")
+            
+        # Create detailed error message
+        error_message = error_text
+        
+        # Handle specific error cases
+        if status_code == 401:
+            logger.error("[LAMONFOX ERROR] 401 Unauthorized - API key invalid or expired")
+            error_message = "Lamonfox API key is invalid or expired. Please check your API key configuration."
+        elif status_code == 402:
+            logger.error("[LAMONFOX ERROR] 402 Payment Required - Free tier disabled or payment needed")
+            error_message = "Payment required. Your API key may be on a free tier that has been disabled. Please upgrade to a paid plan or contact Lamonfox support."
+        elif status_code == 429:
+            logger.error("[LAMONFOX ERROR] 429 Rate Limit Exceeded")
+            error_message = "Lamonfox API rate limit exceeded. Please try again later."
+        elif status_code == 400:
+            logger.error("[LAMONFOX ERROR] 400 Bad Request")
+            # Check for unusual activity error
+            if "unusual_activity" in error_text.lower() or "free tier" in error_text.lower():
+                logger.error("[LAMONFOX ERROR] Detected unusual activity or free tier flag")
+                error_message = (
+                    "Lamonfox API Error: Your account is being treated as Free Tier and has been flagged for unusual activity. "
+                    "This can happen if:\n"
+                    "1. Your API key is from a free account (even if you purchased credits)\n"
+                    "2. Railway's IP address is flagged as a proxy/VPN\n"
+                    "3. Your paid account needs to be activated\n\n"
+                    "SOLUTION: Please contact Lamonfox support at https://lemonfox.ai with:\n"
+                    "- Your API key (they can verify if it's paid)\n"
+                    "- Request to whitelist Railway's IP addresses\n"
+                    "- Ask them to activate your paid subscription\n\n"
+                    f"Original error: {error_text}"
+                )
+            else:
+                error_message = f"Invalid request: {error_text}"
+        else:
+            logger.error(f"[LAMONFOX ERROR] Unhandled HTTP status: {status_code}")
+            error_message = f"Voice generation failed (HTTP {status_code}): {error_text}"
+            
+        # Build exception with detailed error
+        exception = Exception(error_message)
+        exception.status_code = status_code
+        exception.parsed_error = parsed_error
+        exception.raw_error = error_text
+        exception.retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        return exception
+
+    async def get_voices(self) -> list:
+        """
+        Get available voices from the Lemonfox voices endpoint as [{"id", "name"}].
+        Falls back to the built-in list when the endpoint is unavailable or returns
+        something unexpected, so callers always get a usable catalog.
         """
-        # If Lamonfox provides a voices endpoint, implement it here
-        # For now, return common voices
-        return [
-            {"id": "sarah", "name": "Sarah"},
-            {"id": "james", "name": "James"},
-            {"id": "emma", "name": "Emma"},
-            {"id": "william", "name": "William"},
-        ]
+        if not self.api_key or self.breaker.is_open():
+            return list(DEFAULT_VOICES)
+        try:
+            response = await http_clients.get("lemonfox").get(
+                f"{self.base_url}{LAMONFOX_VOICES_PATH}",
+                headers={**self.headers, "Accept": "application/json"},
+            )
+            response.raise_for_status()
+            voices = _parse_voices(response.json())
+        except Exception as e:
+            logger.info(f"[LAMONFOX VOICES] Using built-in voice list ({type(e).__name__}: {e})")
+            return list(DEFAULT_VOICES)
+        if not voices:
+            logger.info("[LAMONFOX VOICES] Upstream returned no voices, using built-in voice list")
+            return list(DEFAULT_VOICES)
+        return voices
+
 
+def _parse_voices(payload) -> list:
+    """Accept ["sarah", ...], [{"id"|"voice_id"|"name": ...}, ...] or {"voices"|"data": [...]}"""
+    if isinstance(payload, dict):
+        payload = payload.get("voices") or payload.get("data") or []
+    voices = []
+    for entry in payload if isinstance(payload, list) else []:
+        if isinstance(entry, str):
+            voices.append({"id": entry, "name": entry.title()})
+        elif isinstance(entry, dict):
+            voice_id = entry.get("id") or entry.get("voice_id") or entry.get("name")
+            if voice_id:
+                voices.append({"id": str(voice_id), "name": str(entry.get("name") or str(voice_id).title())})
+    return voices
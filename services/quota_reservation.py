@@ -0,0 +1,133 @@
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+
+from models import User
+from schemas import VoiceGenerateResponse
+from services.usage_counters import usage_counters
+from services.voice_quota import check_voice_limits, max_daily_voices, max_total_tokens
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class QuotaReservation:
+    """Tokens and daily generations taken from a user's quota ahead of the upstream call"""
+
+    __slots__ = ("user", "user_id", "tokens", "generations", "released")
+
+    def __init__(self, user: User, tokens: int, generations: int):
+        self.user = user  # the request's User, refreshed with the counters after a write-behind refund
+        self.user_id = user.id
+        self.tokens = tokens
+        self.generations = generations
+        self.released = False
+
+
+def reserve_voice_quota(
+    db: Session,
+    current_user: User,
+    word_count: int,
+    generations: int = 1,
+) -> Tuple[Optional[QuotaReservation], Optional[VoiceGenerateResponse]]:
+    """
+    Charge word_count tokens and `generations` daily generations before synthesis.
+    With write-behind usage counters the check and increment happen together under
+    the counters' lock; otherwise one conditional UPDATE only matches while the user
+    stays within the lifetime token cap and the daily limit. Either way concurrent
+    requests cannot overshoot.
+    Returns (reservation, None) on success, (None, error response) when a limit is hit.
+    """
+    # Limits that do not depend on concurrent usage (per-generation words) and a fast reject
+    usage_counters.apply(current_user)
+    limit_error = check_voice_limits(current_user, word_count)
+    if limit_error is not None:
+        return None, limit_error
+
+    if usage_counters.enabled:
+        if not usage_counters.reserve(current_user, word_count, generations, max_total_tokens(current_user), max_daily_voices(current_user)):
+            logger.warning(f"[QUOTA] Reservation of {word_count} tokens refused for user {current_user.id}")
+            return None, check_voice_limits(current_user, word_count) or _limit_reached(current_user)
+        logger.info(f"[QUOTA] Reserved {word_count} tokens / {generations} generation(s) for user {current_user.id}")
+        return QuotaReservation(current_user, word_count, generations), None
+
+    tokens = func.coalesce(User.total_tokens_used, 0)
+    daily = func.coalesce(User.daily_voice_count, 0)
+    result = db.execute(
+        update(User)
+        .where(
+            User.id == current_user.id,
+            tokens + word_count <= max_total_tokens(current_user),
+            daily + generations <= max_daily_voices(current_user),
+        )
+        .values(total_tokens_used=tokens + word_count, daily_voice_count=daily + generations)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()  # also expires current_user, so it reloads the committed counters
+
+    if result.rowcount != 1:
+        # Another request used the quota since current_user was loaded: report the limit it hit
+        logger.warning(f"[QUOTA] Reservation of {word_count} tokens refused for user {current_user.id}")
+        return None, check_voice_limits(current_user, word_count) or _limit_reached(current_user)
+
+    logger.info(f"[QUOTA] Reserved {word_count} tokens / {generations} generation(s) for user {current_user.id}")
+    return QuotaReservation(current_user, word_count, generations), None
+
+
+def release_voice_quota(db: Session, reservation: Optional[QuotaReservation], tokens: Optional[int] = None) -> None:
+    """
+    Give back a reservation (the request failed). With tokens, only that many tokens
+    are refunded and the generation stays charged (a batch where some items failed).
+    Safe to call more than once.
+    """
+    if reservation is None or reservation.released:
+        return
+    refund_tokens = reservation.tokens if tokens is None else min(tokens, reservation.tokens)
+    refund_generations = reservation.generations if tokens is None else 0
+    reservation.released = True
+    if refund_tokens <= 0 and refund_generations <= 0:
+        return
+    if usage_counters.enabled and usage_counters.refund(reservation.user_id, refund_tokens, refund_generations):
+        usage_counters.apply(reservation.user)
+        logger.info(f"[QUOTA] Refunded {refund_tokens} tokens / {refund_generations} generation(s) to user {reservation.user_id}")
+        return
+    try:
+        db.execute(
+            update(User)
+            .where(User.id == reservation.user_id)
+            .values(
+                total_tokens_used=case(
+                    (User.total_tokens_used >= refund_tokens, User.total_tokens_used - refund_tokens), else_=0
+                ),
+                daily_voice_count=case(
+                    (User.daily_voice_count >= refund_generations, User.daily_voice_count - refund_generations), else_=0
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        logger.info(f"[QUOTA] Refunded {refund_tokens} tokens / {refund_generations} generation(s) to user {reservation.user_id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[QUOTA] ❌ Refund for user {reservation.user_id} failed: {e}")
+
+
+def _limit_reached(current_user: User) -> VoiceGenerateResponse:
+    """Fallback error when the refused reservation no longer shows up as a limit (e.g. refunded meanwhile)"""
+    return VoiceGenerateResponse(
+        success=False,
+        message="Voice generation limit reached. Please try again.",
+        error={
+            "message": "Voice generation limit reached. Please try again.",
+            "error_type": "TOKEN_LIMIT_EXCEEDED",
+            "status_code": 429,
+            "details": "Another request used the remaining quota.",
+        },
+        daily_count=current_user.daily_voice_count or 0,
+        limit_reached=True,
+        tokens_used=current_user.total_tokens_used or 0,
+        tokens_remaining=max(0, max_total_tokens(current_user) - (current_user.total_tokens_used or 0)),
+    )
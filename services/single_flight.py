@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work, later callers with the same key wait for that result instead of
+    starting their own. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "failures": 0,
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Return the result of fn(), sharing it with every concurrent caller using key.
+        The work runs in its own task, so a caller that disconnects does not
+        cancel it for the others.
+        """
+        result, _ = await self.do_shared(key, fn)
+        return result
+
+    async def do_shared(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Like do(), also returning whether this caller joined a call started by another"""
+        self.counters["calls"] += 1
+        task = self._in_flight.get(key)
+        joined = task is not None
+        if joined:
+            self.counters["coalesced"] += 1
+            logger.info(f"[SINGLE FLIGHT] {self.name}: joined in-flight call for key {key[:12]}")
+        else:
+            self.counters["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task), joined
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the exception so it is not reported as unhandled when every caller has gone
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["failures"] += 1
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._in_flight)}
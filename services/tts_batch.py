@@ -0,0 +1,89 @@
+import asyncio
+import io
+import json
+import logging
+import time
+import zipfile
+from typing import List, Optional, Tuple
+
+from config import settings
+from services.audio_executor import audio_executor
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BatchItemResult:
+    """Outcome of one batch item: audio bytes on success, an error message otherwise"""
+
+    __slots__ = ("index", "text", "voice", "word_count", "audio", "error", "seconds")
+
+    def __init__(self, index: int, text: str, voice: str, word_count: int):
+        self.index = index
+        self.text = text
+        self.voice = voice
+        self.word_count = word_count
+        self.audio: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def filename(self) -> str:
+        return f"{self.index + 1:03d}.mp3"
+
+
+async def synthesize_batch(
+    tts_service,
+    items: List[Tuple[str, str]],
+    watermark: bool = False,
+    max_concurrency: Optional[int] = None,
+) -> List[BatchItemResult]:
+    """
+    Synthesize (text, voice) items with bounded concurrency, preserving order.
+    One failed item does not fail the batch; its result carries the error instead.
+    Identical items are coalesced by the provider's cache/single-flight layer.
+    """
+    concurrency = max(1, max_concurrency or settings.TTS_BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [BatchItemResult(i, text, voice, len(text.split())) for i, (text, voice) in enumerate(items)]
+    started_at = time.perf_counter()
+
+    async def _synthesize(result: BatchItemResult) -> None:
+        async with semaphore:
+            item_start = time.perf_counter()
+            try:
+                audio = await tts_service.generate_voice(result.text, voice=result.voice)
+                if watermark:
+                    audio = await audio_executor.watermark(audio)
+                result.audio = audio
+            except Exception as e:
+                result.error = str(e)
+                logger.warning(f"[TTS BATCH] Item {result.index} failed: {type(e).__name__}: {e}")
+            result.seconds = time.perf_counter() - item_start
+
+    await asyncio.gather(*(_synthesize(result) for result in results))
+    succeeded = sum(1 for result in results if result.ok)
+    logger.info(
+        f"[TTS BATCH] {succeeded}/{len(results)} items in {(time.perf_counter() - started_at) * 1000:.0f} ms "
+        f"(concurrency {concurrency})"
+    )
+    return results
+
+
+def build_batch_zip(results: List[BatchItemResult], manifest: dict) -> bytes:
+    """
+    ZIP of the successful items (001.mp3, 002.mp3, ... in request order) plus
+    results.json with the per-item outcome. MP3 is already compressed, so entries are stored.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for result in results:
+            if result.ok:
+                archive.writestr(result.filename, result.audio)
+        archive.writestr("results.json", json.dumps(manifest, indent=2, default=str))
+    return buffer.getvalue()
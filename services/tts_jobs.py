@@ -0,0 +1,310 @@
+import asyncio
+import ipaddress
+import logging
+import random
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+from urllib.parse import SplitResult, urlsplit, urlunsplit
+
+from config import settings
+from database import SessionLocal
+from models import TTSJob, User
+from services.audio_executor import audio_executor
+from services.audio_store import AudioStore, audio_store
+from services.chunked_synthesis import should_chunk, synthesize_chunked
+from services.http_client import http_clients
+from services.quota_reservation import QuotaReservation, release_voice_quota, reserve_voice_quota
+from services.voice_quota import record_voice_history
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Webhook callbacks go to arbitrary user URLs, so there is no base URL and nothing to pre-connect to
+http_clients.register("webhooks", "", timeout=10.0, connect_timeout=5.0, max_connections=10, warmup_path=None)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job cannot be queued because the queue is at capacity"""
+
+
+class WebhookURLError(ValueError):
+    """Raised for a webhook URL the server must not call (not https, or not a public address)"""
+
+
+async def _resolve(host: str, port: int) -> List[str]:
+    addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [sockaddr[0] for *_, sockaddr in addresses]
+
+
+async def check_webhook_url(url: str) -> str:
+    """
+    Webhooks are POSTed from inside our network, so only https URLs whose host
+    resolves exclusively to public addresses are accepted: no loopback, private,
+    link-local (cloud metadata), shared or reserved ranges. Checked when the job
+    is created and again before each delivery, as DNS may have changed since.
+    Returns a vetted address: delivery connects to it rather than resolving the
+    host again, so a DNS change after the check (rebinding) cannot redirect it.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "https":
+        raise WebhookURLError("Webhook URL must use https")
+    host = parts.hostname
+    if not host:
+        raise WebhookURLError("Webhook URL has no host")
+    try:
+        addresses = await _resolve(host, parts.port or 443)
+    except socket.gaierror:
+        raise WebhookURLError(f"Webhook host {host} could not be resolved")
+    vetted = []
+    for resolved in addresses:
+        address = ipaddress.ip_address(resolved.split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise WebhookURLError("Webhook URL must point to a public address")
+        vetted.append(str(address))
+    if not vetted:
+        raise WebhookURLError(f"Webhook host {host} could not be resolved")
+    return vetted[0]
+
+
+def _pinned_url(parts: SplitResult, address: str) -> str:
+    """The webhook URL with its host replaced by the vetted address"""
+    host = f"[{address}]" if ":" in address else address
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    userinfo = parts.netloc.rpartition("@")[0]
+    return urlunsplit(parts._replace(netloc=f"{userinfo}@{netloc}" if userinfo else netloc))
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def job_audio_url(job_id: str) -> str:
+    return f"/api/tts/jobs/{job_id}/audio"
+
+
+class TTSJobManager:
+    """
+    Runs queued TTS jobs on a fixed number of worker tasks.
+    Jobs are persisted in the tts_jobs table; the in-memory queue only holds ids,
+    so jobs left queued or running by a previous process are picked up on start().
+    Quota is charged when a job succeeds, then the optional webhook is called.
+    Finished audio goes to the content-addressed audio store.
+    """
+
+    def __init__(self, tts_router, workers: int, queue_size: int, store: AudioStore = audio_store):
+        self.tts_router = tts_router
+        self.workers = max(1, workers)
+        self.store = store
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max(1, queue_size))
+        self._tasks: List[asyncio.Task] = []
+        self._progress: Dict[str, float] = {}
+        self.counters = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "webhooks_sent": 0,
+            "webhooks_failed": 0,
+        }
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        requeued = await asyncio.to_thread(self._pending_job_ids)
+        for job_id in requeued:
+            try:
+                self._queue.put_nowait(job_id)
+            except asyncio.QueueFull:
+                logger.warning(f"[TTS JOBS] Queue full, job {job_id} stays queued until restart")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"[TTS JOBS] Started {self.workers} workers, requeued {len(requeued)} pending jobs")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("[TTS JOBS] Workers stopped")
+
+    # ---------- public API ----------
+
+    def enqueue(self, job_id: str) -> None:
+        """Queue a persisted job; raises JobQueueFullError when the queue is at capacity"""
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Too many voice jobs are waiting. Please try again later.")
+        self.counters["submitted"] += 1
+
+    def progress(self, job: TTSJob) -> float:
+        """Live progress for running jobs (only milestones are written to the database)"""
+        return self._progress.get(job.id, job.progress or 0.0)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": len(self._progress),
+        }
+
+    # ---------- workers ----------
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[TTS JOBS] Worker {index} crashed on job {job_id}: {type(e).__name__}: {e}")
+            finally:
+                self._progress.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(TTSJob).filter(TTSJob.id == job_id).first()
+            if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                return
+
+            job.status = JOB_RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            job.progress = 0.0
+            db.commit()
+            self._progress[job_id] = 0.0
+            logger.info(f"[TTS JOBS] Job {job_id} started for user {job.user_id} ({len(job.text)} chars)")
+
+            reservation = None
+            try:
+                user = db.query(User).filter(User.id == job.user_id).first()
+                if user is None:
+                    raise Exception("User no longer exists")
+
+                if job.quota_charged:
+                    # Charged by a run that did not finish (the process stopped mid-job): do not
+                    # charge again, but refund as usual if this run fails
+                    reservation = QuotaReservation(user, job.word_count, 1)
+                else:
+                    # Limits were checked at submission; reserve now in case other requests used the quota since
+                    reservation, limit_error = reserve_voice_quota(db, user, job.word_count)
+                    if limit_error is not None:
+                        raise Exception(limit_error.message)
+                    job.quota_charged = True
+                    db.commit()
+
+                audio_data = await self._synthesize(job)
+                if user.plan == "Free":
+                    audio_data = await audio_executor.watermark(audio_data)
+
+                audio_id = await self.store.put(audio_data)
+                path = self.store.path(audio_id)
+
+                # Paid history links to the stored audio; trial history has no download
+                audio_url = self.store.url(audio_id) if user.plan != "Free" else None
+                record_voice_history(db, user, job.text, audio_url=audio_url)
+
+                job.status = JOB_SUCCEEDED
+                job.progress = 1.0
+                job.audio_path = path
+                job.audio_size = len(audio_data)
+                job.completed_at = datetime.now(timezone.utc)
+                db.commit()
+                self.counters["succeeded"] += 1
+                logger.info(f"[TTS JOBS] ✅ Job {job_id} succeeded, {len(audio_data)} bytes, tokens used: {user.total_tokens_used}")
+            except Exception as e:
+                db.rollback()
+                release_voice_quota(db, reservation)
+                job = db.query(TTSJob).filter(TTSJob.id == job_id).first()
+                job.status = JOB_FAILED
+                job.error = str(e)
+                job.completed_at = datetime.now(timezone.utc)
+                db.commit()
+                self.counters["failed"] += 1
+                logger.error(f"[TTS JOBS] ❌ Job {job_id} failed: {type(e).__name__}: {e}")
+
+            if job.webhook_url:
+                await self._send_webhook(job.webhook_url, _webhook_payload(job))
+        finally:
+            db.close()
+
+    async def _synthesize(self, job: TTSJob) -> bytes:
+        if should_chunk(job.text):
+            def _on_progress(done: int, total: int) -> None:
+                self._progress[job.id] = round(done / total, 3)
+
+            audio_data, _ = await synthesize_chunked(self.tts_router.pinned(), job.text, voice=job.voice, progress_callback=_on_progress)
+            return audio_data
+        return await self.tts_router.generate_voice(job.text, voice=job.voice)
+
+    async def _send_webhook(self, url: str, payload: dict) -> None:
+        """POST the job result to the caller's webhook, retrying with backoff on errors and 5xx"""
+        try:
+            address = await check_webhook_url(url)
+        except WebhookURLError as e:
+            self.counters["webhooks_failed"] += 1
+            logger.warning(f"[TTS JOBS] Webhook for job {payload['job_id']} not sent: {e}")
+            return
+        # Connect to the checked address; Host and TLS SNI (so the certificate check) keep the URL's host
+        parts = urlsplit(url)
+        pinned_url = _pinned_url(parts, address)
+        headers = {"Host": parts.netloc.rpartition("@")[2]}
+        extensions = {"sni_hostname": parts.hostname}
+        attempts = max(1, settings.TTS_JOB_WEBHOOK_ATTEMPTS)
+        for attempt in range(1, attempts + 1):
+            try:
+                # A redirect could lead anywhere, so it is never followed
+                response = await http_clients.get("webhooks").post(
+                    pinned_url, json=payload, headers=headers, extensions=extensions, follow_redirects=False
+                )
+                if response.status_code < 500:
+                    self.counters["webhooks_sent"] += 1
+                    logger.info(f"[TTS JOBS] Webhook for job {payload['job_id']} delivered: HTTP {response.status_code}")
+                    return
+                reason = f"HTTP {response.status_code}"
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+            logger.warning(f"[TTS JOBS] Webhook attempt {attempt}/{attempts} for job {payload['job_id']} failed: {reason}")
+            if attempt < attempts:
+                await asyncio.sleep(2 ** (attempt - 1) + random.random())
+        self.counters["webhooks_failed"] += 1
+
+    def _pending_job_ids(self) -> List[str]:
+        db = SessionLocal()
+        try:
+            jobs = (
+                db.query(TTSJob.id)
+                .filter(TTSJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+                .order_by(TTSJob.created_at)
+                .all()
+            )
+            return [job_id for (job_id,) in jobs]
+        except Exception as e:
+            logger.warning(f"[TTS JOBS] Could not load pending jobs: {e}")
+            return []
+        finally:
+            db.close()
+
+
+def _webhook_payload(job: TTSJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "audio_url": job_audio_url(job.id) if job.status == JOB_SUCCEEDED else None,
+        "audio_size": job.audio_size,
+        "error": job.error,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
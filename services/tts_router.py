@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from services.elevenlabs_service import ElevenLabsService, ELEVENLABS_DEFAULT_VOICE_ID
+from services.lamonfox_service import LamonfoxService
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# A provider/model whose recent error rate reaches this is skipped until it cools down
+UNHEALTHY_ERROR_RATE = 0.5
+UNHEALTHY_MIN_SAMPLES = 3
+UNHEALTHY_COOLDOWN_SECONDS = 30.0
+# Samples older than this no longer count towards latency/error rate
+STATS_WINDOW_SECONDS = 300.0
+
+
+class LatencyStats:
+    """Rolling latency and error rate for one provider/model"""
+
+    def __init__(self, size: int = 100):
+        self._samples = deque(maxlen=size)  # (timestamp, seconds, ok)
+        self.last_error_at = 0.0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        now = time.monotonic()
+        self._samples.append((now, seconds, ok))
+        if not ok:
+            self.last_error_at = now
+
+    def _recent(self) -> list:
+        cutoff = time.monotonic() - STATS_WINDOW_SECONDS
+        return [sample for sample in self._samples if sample[0] >= cutoff]
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        latencies = sorted(seconds for _, seconds, ok in self._recent() if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def healthy(self) -> bool:
+        recent = self._recent()
+        if len(recent) < UNHEALTHY_MIN_SAMPLES or self.error_rate() < UNHEALTHY_ERROR_RATE:
+            return True
+        return time.monotonic() - self.last_error_at > UNHEALTHY_COOLDOWN_SECONDS
+
+    def snapshot(self) -> dict:
+        p50 = self.percentile(0.50)
+        p95 = self.percentile(0.95)
+        return {
+            "samples": len(self._recent()),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "healthy": self.healthy(),
+        }
+
+
+class LemonfoxProvider:
+    name = "lemonfox"
+    # response_format values the API encodes itself (no transcode needed)
+    native_formats = ("mp3", "opus", "aac")
+
+    def __init__(self, service: LamonfoxService):
+        self.service = service
+
+    def enabled(self) -> bool:
+        return bool(self.service.api_key)
+
+    def available(self) -> bool:
+        return not self.service.breaker.is_open()
+
+    def current_model(self) -> str:
+        return "default"
+
+    async def synthesize(self, text: str, voice: str, response_format: str, use_cache: bool) -> Tuple[bytes, str, bool]:
+        audio, from_upstream = await self.service.generate_voice_with_origin(text, voice, response_format, use_cache)
+        return audio, "default", from_upstream
+
+
+class ElevenLabsProvider:
+    name = "elevenlabs"
+    native_formats = ("mp3",)
+
+    def __init__(self, service: ElevenLabsService, voice_id: str = ELEVENLABS_DEFAULT_VOICE_ID):
+        self.service = service
+        # Lemonfox voice names do not exist on ElevenLabs; failover uses one configured voice
+        self.voice_id = voice_id
+
+    def enabled(self) -> bool:
+        return bool(self.service.api_key)
+
+    def available(self) -> bool:
+        return not self.service.breaker.is_open()
+
+    def current_model(self) -> str:
+        return self.service.working_model or "auto"
+
+    async def synthesize(self, text: str, voice: str, response_format: str, use_cache: bool) -> Tuple[bytes, str, bool]:
+        if response_format != "mp3":
+            raise ValueError("ElevenLabs provider only supports mp3 output")
+        audio, model = await self.service.generate_voice_with_model(text, self.voice_id)
+        return audio, model, True
+
+
+class TTSRouter:
+    """
+    Routes synthesis to the fastest healthy provider, with failover.
+    Tracks rolling p50/p95 latency and error rate per provider/model, prefers
+    the lowest p50 among healthy providers (untried providers keep their
+    configured order), and falls through to the next provider on failure.
+    With hedging enabled, a second request is sent to the next provider when
+    the first has not answered within its own p95; the first result wins.
+    Exposes generate_voice() like the single-provider services.
+    """
+
+    def __init__(self, providers: list, hedge_enabled: bool = False, hedge_min_samples: int = 20):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self._stats: Dict[str, LatencyStats] = {}
+        self.counters = {
+            "requests": 0,
+            "failovers": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    # ---------- selection ----------
+
+    def _stats_for(self, provider, model: Optional[str] = None) -> LatencyStats:
+        key = f"{provider.name}/{model or provider.current_model()}"
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = LatencyStats()
+        return stats
+
+    def ranked(self) -> list:
+        """
+        Enabled providers: open circuits last, then unhealthy ones, then by p50 latency
+        (untried ones in configured order)
+        """
+        def sort_key(indexed):
+            order, provider = indexed
+            stats = self._stats_for(provider)
+            p50 = stats.percentile(0.50)
+            return (not provider.available(), not stats.healthy(), p50 if p50 is not None else float("inf"), order)
+
+        enabled = [(i, p) for i, p in enumerate(self.providers) if p.enabled()]
+        return [provider for _, provider in sorted(enabled, key=sort_key)]
+
+    def supports_format(self, response_format: str) -> bool:
+        """True when an available provider can return response_format natively"""
+        return any(response_format in provider.native_formats for provider in self.ranked() if provider.available())
+
+    def pinned(self) -> "PinnedProvider":
+        """
+        A generate_voice() bound to the currently best provider, for callers that join
+        several results into one stream (chunked synthesis) and must not mix encoders
+        """
+        ranked = self.ranked()
+        if not ranked:
+            raise Exception("No TTS provider is configured. Please contact support.")
+        return PinnedProvider(self, ranked[0])
+
+    # ---------- synthesis ----------
+
+    async def generate_voice(self, text: str, voice: str = "sarah", response_format: str = "mp3", use_cache: bool = True) -> bytes:
+        if not text or not text.strip():
+            raise Exception("Text input is required for voice generation")
+        ranked = [provider for provider in self.ranked() if response_format in provider.native_formats]
+        if not ranked:
+            raise Exception("No TTS provider is configured. Please contact support.")
+
+        self.counters["requests"] += 1
+        last_error: Optional[Exception] = None
+        if self.hedge_enabled and len(ranked) > 1:
+            try:
+                return await self._hedged(ranked, text, voice, response_format, use_cache)
+            except Exception as e:
+                last_error = e
+            ranked = ranked[2:]
+
+        for index, provider in enumerate(ranked):
+            if index > 0 or last_error is not None:
+                self.counters["failovers"] += 1
+                logger.warning(f"[TTS ROUTER] Failing over to {provider.name} after: {last_error}")
+            try:
+                return await self.call(provider, text, voice, response_format, use_cache)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def call(self, provider, text: str, voice: str, response_format: str, use_cache: bool) -> bytes:
+        """
+        Synthesize with one provider and record latency/outcome. Results that did not
+        come from the upstream (cache hits, joined in-flight calls) are not latency samples.
+        """
+        started = time.perf_counter()
+        try:
+            audio, model, from_upstream = await provider.synthesize(text, voice, response_format, use_cache)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._stats_for(provider).record(time.perf_counter() - started, ok=False)
+            raise
+        if from_upstream:
+            self._stats_for(provider, model).record(time.perf_counter() - started, ok=True)
+        return audio
+
+    async def _hedged(self, ranked: list, text: str, voice: str, response_format: str, use_cache: bool) -> bytes:
+        """
+        Race the best provider against the runner-up once the first exceeds its p95.
+        Raises the last error if both failed (the caller then tries the remaining providers).
+        """
+        primary, secondary = ranked[0], ranked[1]
+        stats = self._stats_for(primary)
+        p95 = stats.percentile(0.95)
+        first = asyncio.ensure_future(self.call(primary, text, voice, response_format, use_cache))
+        if p95 is None or stats.snapshot()["samples"] < self.hedge_min_samples:
+            # Not enough history to know what "slow" is: plain failover
+            try:
+                return await first
+            except Exception as e:
+                self.counters["failovers"] += 1
+                logger.warning(f"[TTS ROUTER] Failing over to {secondary.name} after: {e}")
+                return await self.call(secondary, text, voice, response_format, use_cache)
+
+        done, _ = await asyncio.wait({first}, timeout=p95)
+        tasks = {first: primary}
+        if not done or first.exception() is not None:
+            self.counters["hedges"] += 1
+            logger.info(f"[TTS ROUTER] Hedging {primary.name} with {secondary.name} (p95 {p95 * 1000:.0f} ms)")
+            second = asyncio.ensure_future(self.call(secondary, text, voice, response_format, use_cache))
+            tasks[second] = secondary
+
+        pending = set(tasks)
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] is not primary:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "hedge_enabled": self.hedge_enabled,
+            "order": [provider.name for provider in self.ranked()],
+            "providers": {key: snapshot for key, snapshot in ((key, stats.snapshot()) for key, stats in self._stats.items()) if snapshot["samples"]},
+        }
+
+
+class PinnedProvider:
+    """generate_voice() that always uses one provider (still recorded in the router's stats)"""
+
+    def __init__(self, router: TTSRouter, provider):
+        self.router = router
+        self.provider = provider
+
+    async def generate_voice(self, text: str, voice: str = "sarah", response_format: str = "mp3", use_cache: bool = True) -> bytes:
+        return await self.router.call(self.provider, text, voice, response_format, use_cache)
+
+
+def build_router(lamonfox_service: LamonfoxService, elevenlabs_service: Optional[ElevenLabsService] = None) -> TTSRouter:
+    """Router over the providers listed in TTS_PROVIDERS, in that order"""
+    available = {
+        "lemonfox": lambda: LemonfoxProvider(lamonfox_service),
+        "elevenlabs": lambda: ElevenLabsProvider(elevenlabs_service or ElevenLabsService()),
+    }
+    providers: List = []
+    for name in settings.TTS_PROVIDERS:
+        factory = available.get(name)
+        if factory is None:
+            logger.warning(f"[TTS ROUTER] Unknown provider '{name}' in TTS_PROVIDERS - ignored")
+            continue
+        providers.append(factory())
+    return TTSRouter(providers, hedge_enabled=settings.TTS_HEDGE_ENABLED, hedge_min_samples=settings.TTS_HEDGE_MIN_SAMPLES)
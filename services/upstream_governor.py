@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: throttling and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# error_type values set on exceptions by the services for transient failures
+RETRYABLE_ERROR_TYPES = {"TIMEOUT", "NETWORK"}
+
+
+class UpstreamBusyError(Exception):
+    """Raised when a request cannot be sent (or retried) before its deadline"""
+
+    error_type = "UPSTREAM_BUSY"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at rate tokens/second up to capacity.
+    acquire() waits until enough tokens are available (or the deadline passes).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float, deadline: float) -> None:
+        if self.rate <= 0:
+            return
+        # A single request larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise UpstreamBusyError("Voice generation is busy right now. Please try again in a moment.")
+                await asyncio.sleep(wait)
+
+
+class Permit:
+    """One admitted upstream call; the caller reports how it went"""
+
+    def __init__(self, governor: "UpstreamGovernor"):
+        self._governor = governor
+        self._started = time.monotonic()
+        self._reported = False
+
+    def success(self) -> None:
+        if not self._reported:
+            self._reported = True
+            self._governor._on_success(time.monotonic() - self._started)
+
+    def failure(self, error: Exception) -> None:
+        if not self._reported:
+            self._reported = True
+            self._governor._on_failure(error)
+
+
+class UpstreamGovernor:
+    """
+    Client-side flow control for one upstream API:
+    - token buckets for requests/second and characters/second
+    - an AIMD concurrency limit (additive increase on fast successes,
+      multiplicative decrease on 429s, 5xx, timeouts and slow responses)
+    - a shared pause honouring Retry-After
+    - retries with jittered exponential backoff inside a per-request deadline
+
+    Every value can be overridden with GOVERNOR_<NAME>_<SETTING> environment
+    variables (config.Settings.upstream), e.g. GOVERNOR_LEMONFOX_REQUESTS_PER_SECOND=3.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float = 5.0,
+        chars_per_second: float = 5000.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 8,
+        latency_target: float = 15.0,
+        max_attempts: int = 4,
+        deadline: float = 45.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        self.name = name
+        requests_per_second = float(settings.upstream("GOVERNOR", name, "REQUESTS_PER_SECOND", requests_per_second))
+        chars_per_second = float(settings.upstream("GOVERNOR", name, "CHARS_PER_SECOND", chars_per_second))
+        self.min_concurrency = max(1, int(settings.upstream("GOVERNOR", name, "MIN_CONCURRENCY", min_concurrency)))
+        self.max_concurrency = max(self.min_concurrency, int(settings.upstream("GOVERNOR", name, "MAX_CONCURRENCY", max_concurrency)))
+        self.latency_target = float(settings.upstream("GOVERNOR", name, "LATENCY_TARGET", latency_target))
+        self.max_attempts = max(1, int(settings.upstream("GOVERNOR", name, "MAX_ATTEMPTS", max_attempts)))
+        self.deadline = float(settings.upstream("GOVERNOR", name, "DEADLINE", deadline))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Buckets hold one second's worth of burst
+        self._requests = TokenBucket(requests_per_second, requests_per_second)
+        self._chars = TokenBucket(chars_per_second, chars_per_second)
+
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._changed = asyncio.Condition()
+        self._paused_until = 0.0
+
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "rejected": 0,
+            "max_in_flight": 0,
+        }
+
+    # ---------- admission ----------
+
+    @asynccontextmanager
+    async def permit(self, chars: int = 0, deadline: Optional[float] = None) -> AsyncIterator[Permit]:
+        """
+        Wait for a pause to end, rate tokens and a concurrency slot, then hold the
+        slot for the duration of the block. Raises UpstreamBusyError past the deadline.
+        """
+        deadline = deadline or time.monotonic() + self.deadline
+        try:
+            await self._wait_for_pause(deadline)
+            await self._requests.acquire(1, deadline)
+            await self._chars.acquire(chars, deadline)
+            await self._acquire_slot(deadline)
+        except UpstreamBusyError:
+            self.counters["rejected"] += 1
+            raise
+
+        permit = Permit(self)
+        self.counters["requests"] += 1
+        try:
+            yield permit
+        except Exception as e:
+            permit.failure(e)
+            raise
+        finally:
+            # Anything not reported (e.g. cancellation) counts as neither success nor failure
+            permit._reported = True
+            async with self._changed:
+                self._in_flight -= 1
+                self._changed.notify_all()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], chars: int = 0, deadline: Optional[float] = None) -> T:
+        """
+        Run fn() under the governor, retrying transient failures with jittered
+        exponential backoff (or the upstream's Retry-After) until the deadline.
+        """
+        deadline = deadline or time.monotonic() + self.deadline
+        attempt = 1
+        while True:
+            try:
+                async with self.permit(chars, deadline) as permit:
+                    result = await fn()
+                    permit.success()
+                    return result
+            except UpstreamBusyError:
+                raise
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None or time.monotonic() + delay > deadline:
+                    raise
+                logger.warning(f"[GOVERNOR] {self.name}: attempt {attempt} failed ({_describe(e)}), retrying in {delay:.2f}s")
+                self.counters["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the error should not be retried"""
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        return max(backoff, retry_after) if retry_after is not None else backoff
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "in_flight": self._in_flight,
+            "concurrency_limit": round(self._limit, 2),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 2),
+        }
+
+    # ---------- internals ----------
+
+    async def _wait_for_pause(self, deadline: float) -> None:
+        wait = self._paused_until - time.monotonic()
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise UpstreamBusyError("Voice generation is busy right now. Please try again in a moment.")
+        await asyncio.sleep(wait)
+
+    async def _acquire_slot(self, deadline: float) -> None:
+        async with self._changed:
+            while self._in_flight >= int(self._limit):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise UpstreamBusyError("Voice generation is busy right now. Please try again in a moment.")
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            self._in_flight += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self._in_flight)
+
+    def _on_success(self, latency: float) -> None:
+        if latency > self.latency_target:
+            # Upstream is struggling even though it answered: back off gently
+            self._decrease(0.9)
+        else:
+            # Additive increase: about +1 slot per window of successful calls
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+
+    def _on_failure(self, error: Exception) -> None:
+        status_code = getattr(error, "status_code", None)
+        if status_code == 429:
+            self.counters["throttled"] += 1
+            retry_after = getattr(error, "retry_after", None)
+            if retry_after:
+                # Everyone waits, not just this request: the limit is per API key
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._decrease(0.5)
+        elif is_retryable(error):
+            self.counters["server_errors"] += 1
+            self._decrease(0.7)
+
+    def _decrease(self, factor: float) -> None:
+        previous = self._limit
+        self._limit = max(float(self.min_concurrency), self._limit * factor)
+        if int(self._limit) < int(previous):
+            logger.warning(f"[GOVERNOR] {self.name}: concurrency limit lowered to {int(self._limit)}")
+
+
+def is_retryable(error: Exception) -> bool:
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    return getattr(error, "error_type", None) in RETRYABLE_ERROR_TYPES
+
+
+def _describe(error: Exception) -> str:
+    status_code = getattr(error, "status_code", None)
+    return f"HTTP {status_code}" if status_code else getattr(error, "error_type", None) or type(error).__name__
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func, inspect, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import settings
+from database import SessionLocal
+from models import User
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class _Usage:
+    """A user's counters as this process knows them, plus what is not yet in the database"""
+
+    __slots__ = ("tokens", "daily", "pending_tokens", "pending_daily", "touched")
+
+    def __init__(self, tokens: int, daily: int):
+        self.tokens = tokens
+        self.daily = daily
+        self.pending_tokens = 0
+        self.pending_daily = 0
+        self.touched = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return self.pending_tokens != 0 or self.pending_daily != 0
+
+
+class UsageCounters:
+    """
+    Write-behind voice usage counters (total_tokens_used, daily_voice_count).
+
+    Reservations and refunds change the in-memory counters under a lock, which
+    makes check-and-increment atomic within the process without touching the
+    database. The deltas are written to the users table in one transaction
+    every flush_interval_ms, as soon as flush_events changes are pending, and
+    on shutdown. Reads go through apply(), which puts the in-memory values on
+    a loaded User.
+
+    The in-memory counters are authoritative for this process only, so this is
+    opt-in (USAGE_WRITE_BEHIND=true) for single-process deployments; by default
+    every reservation is checked by the database (services.quota_reservation).
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_interval_ms: int = 500,
+        flush_events: int = 100,
+        idle_seconds: float = 600.0,
+        enabled: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_events = flush_events
+        self.idle_seconds = idle_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._usage: Dict[int, _Usage] = {}
+        self._events = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "reservations": 0,
+            "refused": 0,
+            "refunds": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "flush_failures": 0,
+        }
+
+    # ---------- hot path ----------
+
+    def reserve(self, user: User, tokens: int, generations: int, max_tokens: int, max_daily: int) -> bool:
+        """Take tokens and generations if the user stays within both limits; False otherwise"""
+        with self._lock:
+            usage = self._get(user)
+            if usage.tokens + tokens > max_tokens or usage.daily + generations > max_daily:
+                self.counters["refused"] += 1
+                self._apply(user, usage)
+                return False
+            self._add(usage, tokens, generations)
+            self.counters["reservations"] += 1
+            self._apply(user, usage)
+        self._maybe_wake()
+        return True
+
+    def refund(self, user_id: int, tokens: int, generations: int) -> bool:
+        """
+        Give back tokens and generations (never below zero). False when the user
+        is not tracked here (evicted after a long idle time), so the caller refunds
+        in the database instead.
+        """
+        with self._lock:
+            usage = self._usage.get(user_id)
+            if usage is None:
+                return False
+            self._add(usage, -min(tokens, usage.tokens), -min(generations, usage.daily))
+            self.counters["refunds"] += 1
+        self._maybe_wake()
+        return True
+
+    def reset_daily(self, user_id: int) -> None:
+        """The daily count was reset in the database: drop the in-memory count and its pending delta"""
+        with self._lock:
+            usage = self._usage.get(user_id)
+            if usage is not None:
+                usage.daily = 0
+                usage.pending_daily = 0
+
+    def reset_all_daily(self, reset: Callable[[], int]) -> int:
+        """
+        Restart every in-memory daily count at zero, then run a bulk daily reset in
+        the database (reset) with flushing paused, so generations counted after the
+        in-memory reset are flushed on top of the reset rows. Pending daily deltas
+        belong to the day being reset and are dropped; token deltas are kept.
+        """
+        with self._flush_lock:
+            with self._lock:
+                for usage in self._usage.values():
+                    usage.daily = 0
+                    usage.pending_daily = 0
+            return reset()
+
+    def apply(self, user: User) -> User:
+        """Put this process's counters on a loaded User (without marking it modified)"""
+        # Detached users (e.g. a finished request's) may be expired and cannot be reloaded
+        if isinstance(user, User) and not inspect(user).detached:
+            with self._lock:
+                usage = self._usage.get(user.id)
+                if usage is not None:
+                    self._apply(user, usage)
+        return user
+
+    def _get(self, user: User) -> _Usage:
+        usage = self._usage.get(user.id)
+        if usage is None:
+            usage = _Usage(user.total_tokens_used or 0, user.daily_voice_count or 0)
+            self._usage[user.id] = usage
+        usage.touched = time.monotonic()
+        return usage
+
+    def _add(self, usage: _Usage, tokens: int, generations: int) -> None:
+        usage.tokens += tokens
+        usage.daily += generations
+        usage.pending_tokens += tokens
+        usage.pending_daily += generations
+        self._events += 1
+
+    @staticmethod
+    def _apply(user: User, usage: _Usage) -> None:
+        set_committed_value(user, "total_tokens_used", usage.tokens)
+        set_committed_value(user, "daily_voice_count", usage.daily)
+
+    def _maybe_wake(self) -> None:
+        if self._events >= self.flush_events and self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---------- flushing ----------
+
+    def flush(self) -> int:
+        """Write all pending deltas in one transaction; returns the number of users written"""
+        with self._flush_lock:
+            with self._lock:
+                batch = {}
+                for user_id, usage in self._usage.items():
+                    if usage.dirty:
+                        batch[user_id] = (usage.pending_tokens, usage.pending_daily)
+                        usage.pending_tokens = 0
+                        usage.pending_daily = 0
+                self._events = 0
+            if batch:
+                db = self.session_factory()
+                try:
+                    for user_id, (tokens, generations) in batch.items():
+                        db.execute(
+                            update(User)
+                            .where(User.id == user_id)
+                            .values(
+                                total_tokens_used=func.coalesce(User.total_tokens_used, 0) + tokens,
+                                daily_voice_count=func.coalesce(User.daily_voice_count, 0) + generations,
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    # Put the deltas back so the next flush retries them
+                    with self._lock:
+                        for user_id, (tokens, generations) in batch.items():
+                            usage = self._usage.get(user_id)
+                            if usage is not None:
+                                usage.pending_tokens += tokens
+                                usage.pending_daily += generations
+                    self.counters["flush_failures"] += 1
+                    logger.error(f"[USAGE] ❌ Flush of {len(batch)} users failed: {type(e).__name__}: {e}")
+                    return 0
+                finally:
+                    db.close()
+                self.counters["flushes"] += 1
+                self.counters["rows_written"] += len(batch)
+                logger.info(f"[USAGE] Flushed usage of {len(batch)} users")
+            self._evict_idle()
+            return len(batch)
+
+    def _evict_idle(self) -> None:
+        """Forget users with nothing pending that were idle long enough for no request to hold an older row"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            for user_id in [user_id for user_id, usage in self._usage.items() if not usage.dirty and usage.touched < cutoff]:
+                del self._usage[user_id]
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+        # Final flush so no usage is lost
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[USAGE] Background flush failed: {type(e).__name__}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = sum(1 for usage in self._usage.values() if usage.dirty)
+            tracked = len(self._usage)
+        return {**self.counters, "enabled": self.enabled, "tracked_users": tracked, "pending_users": pending}
+
+
+usage_counters = UsageCounters(
+    flush_interval_ms=settings.USAGE_FLUSH_INTERVAL_MS,
+    flush_events=settings.USAGE_FLUSH_EVENTS,
+    enabled=settings.USAGE_WRITE_BEHIND,
+)
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from database import SessionLocal
+from models import GeneratedVideo, VideoJob
+from services.tts_jobs import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobQueueFullError
+from services.video_render import render_slideshow
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _init_worker() -> None:
+    """Runs once in each render process: log directly (the parent's log queue listener is not forked)"""
+    from utils.logging_setup import configure_worker_logging
+    configure_worker_logging()
+
+
+def _noop() -> int:
+    return os.getpid()
+
+
+def video_filename() -> str:
+    return f"slideshow_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.mp4"
+
+
+class VideoJobManager:
+    """
+    Renders slideshow jobs on a pool of worker processes, so a libx264 encode
+    never holds the event loop (or the GIL) of the API process.
+
+    Jobs are persisted in the video_jobs table and the in-memory queue only
+    holds ids, as with TTS jobs: jobs left queued or running by a previous
+    process are picked up on start(). One dispatcher task per worker process
+    takes a job from the queue, hands the encode to the pool and records the
+    result (a GeneratedVideo row, like the synchronous endpoint did). Uploaded
+    images are deleted once the job has finished either way.
+    """
+
+    def __init__(self, workers: int, queue_size: int, videos_dir: str):
+        self.workers = max(1, workers)
+        self.videos_dir = videos_dir
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max(1, queue_size))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._finished: Dict[str, asyncio.Event] = {}
+        self.counters = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "pool_restarts": 0,
+        }
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._start_pool()
+        requeued = await asyncio.to_thread(self._pending_job_ids)
+        for job_id in requeued:
+            try:
+                self._queue.put_nowait(job_id)
+                self._finished[job_id] = asyncio.Event()
+            except asyncio.QueueFull:
+                logger.warning(f"[VIDEO JOBS] Queue full, job {job_id} stays queued until restart")
+        self._tasks = [asyncio.create_task(self._dispatcher(i)) for i in range(self.workers)]
+        logger.info(f"[VIDEO JOBS] Started {self.workers} render processes, requeued {len(requeued)} pending jobs")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        logger.info("[VIDEO JOBS] Render processes stopped")
+
+    def _start_pool(self) -> None:
+        # fork where available, as for the audio executor: spawned workers would
+        # re-import main.py; MoviePy is already loaded here and shared with the workers
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+        )
+        # Warm up: start every worker now, not on the first render
+        for _ in range(self.workers):
+            self._pool.submit(_noop)
+
+    # ---------- public API ----------
+
+    def enqueue(self, job_id: str) -> None:
+        """Queue a persisted job; raises JobQueueFullError when the queue is at capacity"""
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Too many videos are being rendered. Please try again later.")
+        self._finished[job_id] = asyncio.Event()
+        self.counters["submitted"] += 1
+
+    async def wait(self, job_id: str, timeout: float) -> bool:
+        """Wait until a queued job has finished; False on timeout (the job keeps running)"""
+        finished = self._finished.get(job_id)
+        if finished is None:
+            return True
+        try:
+            await asyncio.wait_for(finished.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "unfinished": len(self._finished),
+        }
+
+    # ---------- dispatchers ----------
+
+    async def _dispatcher(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[VIDEO JOBS] Dispatcher {index} crashed on job {job_id}: {type(e).__name__}: {e}")
+            finally:
+                finished = self._finished.pop(job_id, None)
+                if finished is not None:
+                    finished.set()
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+            if job is None or job.status not in (JOB_QUEUED, JOB_RUNNING):
+                return
+
+            job.status = JOB_RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            db.commit()
+            image_paths = json.loads(job.image_paths)
+            logger.info(f"[VIDEO JOBS] Job {job_id} started for user {job.user_id} ({len(image_paths)} images)")
+
+            try:
+                filename = video_filename()
+                size = await self._render(
+                    image_paths, os.path.join(self.videos_dir, filename), job.duration_seconds, job.crossfade, job.transition
+                )
+                video_url = f"/static/videos/{filename}"
+                db.add(GeneratedVideo(user_id=job.user_id, video_url=video_url))
+                job.status = JOB_SUCCEEDED
+                job.video_url = video_url
+                job.video_size = size
+                job.completed_at = datetime.now(timezone.utc)
+                db.commit()
+                self.counters["succeeded"] += 1
+                logger.info(f"[VIDEO JOBS] ✅ Job {job_id} succeeded: {filename}, {size} bytes")
+            except Exception as e:
+                db.rollback()
+                job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+                job.status = JOB_FAILED
+                job.error = str(e)
+                job.completed_at = datetime.now(timezone.utc)
+                db.commit()
+                self.counters["failed"] += 1
+                logger.error(f"[VIDEO JOBS] ❌ Job {job_id} failed: {type(e).__name__}: {e}")
+
+            for path in image_paths:
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+        finally:
+            db.close()
+
+    async def _render(self, image_paths: List[str], output_path: str, duration_seconds: int, crossfade: bool, transition: str) -> int:
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            return await loop.run_in_executor(
+                pool, render_slideshow, image_paths, output_path, duration_seconds, crossfade, transition
+            )
+        except BrokenProcessPool:
+            # A render process died (e.g. killed for memory): replace the pool for the next
+            # jobs, once (the other jobs that were on the broken pool fail the same way)
+            if self._pool is pool:
+                self.counters["pool_restarts"] += 1
+                logger.error("[VIDEO JOBS] Render process died, restarting the pool")
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._start_pool()
+            raise RuntimeError("The video renderer crashed. Please try again.")
+
+    def _pending_job_ids(self) -> List[str]:
+        db = SessionLocal()
+        try:
+            jobs = (
+                db.query(VideoJob.id)
+                .filter(VideoJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+                .order_by(VideoJob.created_at)
+                .all()
+            )
+            return [job_id for (job_id,) in jobs]
+        except Exception as e:
+            logger.warning(f"[VIDEO JOBS] Could not load pending jobs: {e}")
+            return []
+        finally:
+            db.close()
@@ -0,0 +1,177 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import List
+
+# Fix for Pillow 10.0.0+ compatibility with MoviePy
+# Pillow removed Image.ANTIALIAS, but MoviePy still uses it
+try:
+    from PIL import Image
+    if not hasattr(Image, 'ANTIALIAS'):
+        # Map ANTIALIAS to LANCZOS (which was the actual implementation)
+        Image.ANTIALIAS = Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.LANCZOS
+except ImportError:
+    pass
+
+# Configure MoviePy to use imageio-ffmpeg's ffmpeg binary
+try:
+    import imageio_ffmpeg
+    ffmpeg_binary = imageio_ffmpeg.get_ffmpeg_exe()
+    os.environ["IMAGEIO_FFMPEG_EXE"] = ffmpeg_binary
+    # Set MoviePy's ffmpeg path
+    import moviepy.config
+    moviepy.config.FFMPEG_BINARY = ffmpeg_binary
+except Exception:
+    # If imageio-ffmpeg is not available, try to use system ffmpeg
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        import moviepy.config
+        moviepy.config.FFMPEG_BINARY = ffmpeg_path
+
+# MoviePy imports
+from moviepy.editor import ImageClip, concatenate_videoclips
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FPS = 24
+MIN_WIDTH, MIN_HEIGHT = 1280, 720
+# Cap at Full HD for faster processing while maintaining good quality
+MAX_WIDTH, MAX_HEIGHT = 1920, 1080
+
+
+def ensure_even_dimensions(width, height):
+    """
+    Ensure dimensions are even numbers (required for H.264 codec).
+    Rounds down to nearest even number to prevent upscaling.
+    """
+    width = int(width)
+    height = int(height)
+    # Round down to nearest even number
+    if width % 2 != 0:
+        width -= 1
+    if height % 2 != 0:
+        height -= 1
+    return width, height
+
+
+def canvas_size(image_paths: List[str]):
+    """Largest image dimensions, at least 720p and at most 1080p (proportionally scaled), even for H.264"""
+    max_w, max_h = 0, 0
+    for path in image_paths:
+        clip_temp = ImageClip(path)
+        iw, ih = clip_temp.size
+        max_w = max(max_w, iw)
+        max_h = max(max_h, ih)
+        clip_temp.close()
+
+    W = max(max_w, MIN_WIDTH)
+    H = max(max_h, MIN_HEIGHT)
+    if W > MAX_WIDTH or H > MAX_HEIGHT:
+        # Scale down proportionally if exceeding max dimensions
+        scale_w = MAX_WIDTH / W if W > MAX_WIDTH else 1
+        scale_h = MAX_HEIGHT / H if H > MAX_HEIGHT else 1
+        scale = min(scale_w, scale_h)
+        W = int(W * scale)
+        H = int(H * scale)
+    return ensure_even_dimensions(W, H)
+
+
+def render_slideshow(
+    image_paths: List[str],
+    output_path: str,
+    duration_seconds: int = 2,
+    crossfade: bool = False,
+    transition: str = "slide",
+) -> int:
+    """
+    Encode the images as an H.264 slideshow at output_path; returns the file size.
+    CPU-bound (a libx264 encode takes seconds): runs in a render worker process
+    (services.video_jobs), never on the event loop. Raises on failure.
+    """
+    W, H = canvas_size(image_paths)
+    dur = max(1, int(duration_seconds))
+    logger.debug(f"🎨 Canvas size: {W}x{H} (even dimensions for H.264), transition: {transition}")
+
+    clips = []
+    final = None
+    temp_path = None
+    try:
+        for idx, path in enumerate(image_paths):
+            try:
+                clip = ImageClip(path)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load image {idx + 1}: {e}")
+            # Resize image to EXACTLY match canvas size (fill canvas completely);
+            # duration and FPS are required for an ImageClip to work as video
+            clip = clip.resize((W, H)).set_duration(dur).set_fps(FPS)
+            clips.append(clip)
+
+        if len(clips) > 1 and (crossfade or transition in ["fade", "crossfade"]):
+            # Crossfade: 30% of clip duration or 0.5s max
+            cf_duration = min(0.5, dur * 0.3)
+            final = concatenate_videoclips(clips, method="compose", padding=-cf_duration)
+        elif len(clips) > 1:
+            # No transition: direct cut
+            final = concatenate_videoclips(clips, method="compose")
+        else:
+            final = clips[0]
+        if getattr(final, "fps", None) is None:
+            final = final.set_fps(FPS)
+
+        # MoviePy picks the container from the extension, so write to a temporary .mp4 first
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+        temp_path = temp_file.name
+        temp_file.close()
+
+        # H.264 baseline profile for maximum browser support
+        final.write_videofile(
+            temp_path,
+            fps=FPS,
+            codec="libx264",
+            preset="medium",
+            bitrate="3000k",
+            audio=False,
+            verbose=False,
+            logger=None,
+            threads=4,
+            write_logfile=False,
+            temp_audiofile=None,
+            remove_temp=True,
+            ffmpeg_params=[
+                "-pix_fmt", "yuv420p",  # Ensure YUV420P pixel format (required for browser compatibility)
+                "-profile:v", "baseline",  # Use baseline profile for maximum compatibility
+                "-level", "3.0",  # H.264 level 3.0 for broad compatibility
+                "-movflags", "+faststart",  # Enable fast start for web streaming
+            ],
+        )
+
+        file_size = os.path.getsize(temp_path)
+        if file_size < 1000:
+            raise RuntimeError(f"Video file is corrupted or empty ({file_size} bytes)")
+        with open(temp_path, "rb") as video_file:
+            # MP4 files start with 4-byte size, then 'ftyp'
+            if video_file.read(8)[4:8] != b"ftyp":
+                logger.warning("⚠️ Video file may not be valid MP4 (no ftyp box)")
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        shutil.move(temp_path, output_path)
+        temp_path = None
+        logger.info(f"✅ Video rendered - {output_path}, {file_size} bytes ({file_size / 1024 / 1024:.2f} MB)")
+        return file_size
+    finally:
+        # Clean up clips to free memory
+        try:
+            if final is not None:
+                final.close()
+            for c in clips:
+                c.close()
+        except Exception:
+            pass
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except Exception:
+                pass
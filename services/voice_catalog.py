@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Voice ids become file names, so only simple ids are accepted
+_VOICE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class VoiceCatalog:
+    """
+    Voice list refreshed from the provider every ttl seconds, plus a short
+    pre-rendered sample per voice. Samples are rendered in the background
+    (at start() and when new voices appear) and kept on disk, named by a
+    version hash of (voice, sample text), so a restart reuses them and a
+    changed sample text gets a new version. Serving a preview only reads
+    the file; it never synthesizes.
+    """
+
+    def __init__(self, source, preview_dir: str, ttl: float, preview_text: str, preview_concurrency: int = 2):
+        self.source = source
+        self.preview_dir = preview_dir
+        self.ttl = ttl
+        self.preview_text = preview_text
+        self.preview_concurrency = max(1, preview_concurrency)
+        self._voices: List[dict] = []
+        self._fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._failed: Dict[str, str] = {}
+        self.counters = {
+            "refreshes": 0,
+            "previews_rendered": 0,
+            "previews_failed": 0,
+        }
+
+    # ---------- voice list ----------
+
+    async def voices(self) -> List[dict]:
+        """Current voice list, refreshed first if older than the TTL"""
+        if not self._voices or time.monotonic() - self._fetched_at >= self.ttl:
+            await self.refresh()
+        return self._voices
+
+    async def refresh(self) -> List[dict]:
+        async with self._refresh_lock:
+            if self._voices and time.monotonic() - self._fetched_at < self.ttl:
+                return self._voices  # refreshed while we waited
+            try:
+                voices = await self.source.get_voices()
+            except Exception as e:
+                logger.warning(f"[VOICE CATALOG] Refresh failed, keeping {len(self._voices)} cached voices: {e}")
+                voices = None
+            if voices:
+                self._voices = [voice for voice in voices if _VOICE_ID.match(voice["id"])]
+            self._fetched_at = time.monotonic()
+            self.counters["refreshes"] += 1
+            return self._voices
+
+    def get(self, voice_id: str) -> Optional[dict]:
+        return next((voice for voice in self._voices if voice["id"] == voice_id), None)
+
+    # ---------- previews ----------
+
+    def preview_version(self, voice_id: str) -> str:
+        return hashlib.sha256(f"{voice_id}\n{self.preview_text}".encode("utf-8")).hexdigest()[:16]
+
+    def preview_path(self, voice_id: str) -> str:
+        return os.path.join(self.preview_dir, f"{voice_id}-{self.preview_version(voice_id)}.mp3")
+
+    def preview_ready(self, voice_id: str) -> bool:
+        return os.path.isfile(self.preview_path(voice_id))
+
+    def preview_url(self, voice_id: str) -> str:
+        # The version makes the URL change when the sample does, so it can be cached forever
+        return f"/api/voices/{voice_id}/preview?v={self.preview_version(voice_id)}"
+
+    def describe(self, voice: dict) -> dict:
+        ready = self.preview_ready(voice["id"])
+        return {
+            **voice,
+            "preview_url": self.preview_url(voice["id"]) if ready else None,
+            "preview_ready": ready,
+        }
+
+    async def render_missing(self) -> int:
+        """Render samples for voices that do not have one yet; returns how many were rendered"""
+        missing = [voice["id"] for voice in self._voices if not self.preview_ready(voice["id"])]
+        if not missing:
+            return 0
+        await asyncio.to_thread(os.makedirs, self.preview_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.preview_concurrency)
+
+        async def _render(voice_id: str) -> bool:
+            async with semaphore:
+                try:
+                    audio = await self.source.generate_voice(self.preview_text, voice=voice_id, use_cache=False)
+                    await asyncio.to_thread(_write_atomic, self.preview_path(voice_id), audio)
+                except Exception as e:
+                    self._failed[voice_id] = str(e)
+                    self.counters["previews_failed"] += 1
+                    logger.warning(f"[VOICE CATALOG] Preview for '{voice_id}' failed: {e}")
+                    return False
+                self._failed.pop(voice_id, None)
+                self.counters["previews_rendered"] += 1
+                return True
+
+        rendered = sum(await asyncio.gather(*(_render(voice_id) for voice_id in missing)))
+        logger.info(f"[VOICE CATALOG] Rendered {rendered}/{len(missing)} voice previews")
+        return rendered
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        """Refresh the list and render missing previews now and then every TTL"""
+        while True:
+            try:
+                await self.refresh()
+                await self.render_missing()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[VOICE CATALOG] Background refresh failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(max(1.0, self.ttl))
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "voices": len(self._voices),
+            "previews_ready": sum(1 for voice in self._voices if self.preview_ready(voice["id"])),
+            "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None,
+            "failed": dict(self._failed),
+        }
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_voice_catalog(source) -> VoiceCatalog:
+    return VoiceCatalog(
+        source,
+        preview_dir=settings.VOICE_PREVIEW_DIR,
+        ttl=settings.VOICE_CATALOG_TTL_SECONDS,
+        preview_text=settings.VOICE_PREVIEW_TEXT,
+    )
@@ -0,0 +1,142 @@
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import User, VoiceHistory
+from schemas import VoiceGenerateResponse
+from services.usage_counters import usage_counters
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _fill_missing_counters(current_user: User) -> None:
+    """Treat NULL counters as zero without making the user dirty (daily resets run in services.daily_reset)"""
+    if current_user.daily_voice_count is None:
+        set_committed_value(current_user, "daily_voice_count", 0)
+    if current_user.total_tokens_used is None:
+        set_committed_value(current_user, "total_tokens_used", 0)
+
+
+def max_total_tokens(current_user: User) -> int:
+    return 300 if current_user.plan == "Free" else 800
+
+
+def max_daily_voices(current_user: User) -> int:
+    return 2 if current_user.plan == "Free" else 5
+
+
+def check_voice_limits(current_user: User, word_count: int) -> Optional[VoiceGenerateResponse]:
+    """
+    Check daily, per-generation and lifetime token limits.
+    Returns an error response if a limit is hit, otherwise None.
+    """
+    _fill_missing_counters(current_user)
+
+    # Check daily voice generation limits
+    MAX_DAILY_VOICES = max_daily_voices(current_user)
+    logger.info(f"[DAILY VOICE LIMIT] Plan: {current_user.plan}, Max daily voices: {MAX_DAILY_VOICES}, Current count: {current_user.daily_voice_count}")
+
+    if current_user.daily_voice_count >= MAX_DAILY_VOICES:
+        logger.warning(f"[LIMIT EXCEEDED] Daily voice limit reached: {current_user.daily_voice_count}/{MAX_DAILY_VOICES}")
+        error_detail = {
+            "message": f"Daily voice generation limit reached. You can generate up to {MAX_DAILY_VOICES} voices per day. You have already generated {current_user.daily_voice_count} voices today.",
+            "error_type": "DAILY_VOICE_LIMIT_EXCEEDED",
+            "status_code": 429,
+            "details": f"You have reached your daily limit of {MAX_DAILY_VOICES} voice generations. Please try again tomorrow.",
+            "timestamp": datetime.now().isoformat(),
+            "daily_count": current_user.daily_voice_count,
+            "max_daily_voices": MAX_DAILY_VOICES
+        }
+        return VoiceGenerateResponse(
+            success=False,
+            message=error_detail["message"],
+            error=error_detail,
+            daily_count=current_user.daily_voice_count,
+            limit_reached=True,
+            tokens_used=current_user.total_tokens_used or 0,
+            tokens_remaining=0
+        )
+
+    # Enforce plan limits based on tokens/words
+    MAX_TOTAL_TOKENS = max_total_tokens(current_user)
+    if current_user.plan == "Free":
+        # Free users: 150 words max per generation, 300 total tokens max
+        MAX_WORDS_PER_GENERATION = 150
+
+        logger.info(f"[LIMIT CHECK] Plan: Free, Max words/generation: {MAX_WORDS_PER_GENERATION}, Max total tokens: {MAX_TOTAL_TOKENS}")
+
+        # Check word limit per generation
+        if word_count > MAX_WORDS_PER_GENERATION:
+            logger.warning(f"[LIMIT EXCEEDED] Word limit exceeded: {word_count} > {MAX_WORDS_PER_GENERATION}")
+            error_detail = {
+                "message": f"Text exceeds maximum word limit. Maximum {MAX_WORDS_PER_GENERATION} words allowed for free plan. Your text has {word_count} words.",
+                "error_type": "WORD_LIMIT_EXCEEDED",
+                "status_code": 400,
+                "details": f"Your text has {word_count} words, but the maximum allowed is {MAX_WORDS_PER_GENERATION} words per generation.",
+                "timestamp": datetime.now().isoformat()
+            }
+            return VoiceGenerateResponse(
+                success=False,
+                message=error_detail["message"],
+                error=error_detail,
+                daily_count=current_user.daily_voice_count,
+                limit_reached=False,
+                tokens_used=current_user.total_tokens_used or 0,
+                tokens_remaining=0
+            )
+    else:
+        # Paid users: unlimited generations but max 800 tokens per person
+        logger.info(f"[LIMIT CHECK] Plan: Paid, Max total tokens: {MAX_TOTAL_TOKENS}")
+
+    # Check total tokens used
+    logger.info(f"[TOKEN USAGE] Current: {current_user.total_tokens_used}, Requested: {word_count}, Total after: {current_user.total_tokens_used + word_count}")
+
+    if current_user.total_tokens_used + word_count > MAX_TOTAL_TOKENS:
+        remaining = MAX_TOTAL_TOKENS - current_user.total_tokens_used
+        logger.warning(f"[LIMIT EXCEEDED] Token limit reached: {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS}, Remaining: {remaining}")
+        error_detail = {
+            "message": f"Token limit reached. You have used {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words.",
+            "error_type": "TOKEN_LIMIT_EXCEEDED",
+            "status_code": 429,
+            "details": f"You have used {current_user.total_tokens_used} out of {MAX_TOTAL_TOKENS} total tokens. Remaining: {remaining} words.",
+            "timestamp": datetime.now().isoformat()
+        }
+        return VoiceGenerateResponse(
+            success=False,
+            message=error_detail["message"],
+            error=error_detail,
+            daily_count=current_user.daily_voice_count,
+            limit_reached=True,
+            tokens_used=current_user.total_tokens_used,
+            tokens_remaining=remaining
+        )
+
+    return None
+
+
+def record_voice_history(db: Session, current_user: User, text: str, audio_url: Optional[str] = None) -> VoiceHistory:
+    """Save the history entry for a generation whose quota was reserved (services.quota_reservation)"""
+    voice_entry = VoiceHistory(
+        user_id=current_user.id,
+        text=text,
+        audio_url=audio_url
+    )
+    db.add(voice_entry)
+    db.commit()
+    db.refresh(voice_entry)
+    usage_counters.apply(current_user)  # the commit expired it; show counters not yet flushed
+    return voice_entry
+
+
+def record_batch_history(db: Session, current_user: User, entries: List[Tuple[str, Optional[str]]]) -> List[VoiceHistory]:
+    """One history entry per (text, audio_url) of a batch, in one commit"""
+    voice_entries = [VoiceHistory(user_id=current_user.id, text=text, audio_url=audio_url) for text, audio_url in entries]
+    db.add_all(voice_entries)
+    db.commit()
+    usage_counters.apply(current_user)
+    return voice_entries
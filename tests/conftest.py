@@ -0,0 +1,86 @@
+"""
+Shared test setup: an isolated SQLite database and storage directories, set
+before the application modules read their configuration. No test talks to
+the network.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP = tempfile.mkdtemp(prefix="myaistudio-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP, 'test.db')}",
+    "JWT_SECRET": "test-secret",
+    "HTTP_WARMUP_ENABLED": "false",
+    "USAGE_WRITE_BEHIND": "false",
+    "TTS_CACHE_DIR": os.path.join(_TMP, "tts_cache"),
+    "TTS_SENTENCE_CACHE_DIR": os.path.join(_TMP, "tts_sentence_cache"),
+    "AUDIO_STORE_DIR": os.path.join(_TMP, "audio_store"),
+    "VOICE_PREVIEW_DIR": os.path.join(_TMP, "voice_previews"),
+})
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models import User  # noqa: E402
+from services.history_search import history_search  # noqa: E402
+from utils.jwt_handler import create_access_token  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    Base.metadata.create_all(bind=engine)
+    history_search.ensure_index(engine)
+    yield engine
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    """The API routes without main.py's startup hooks (no worker pools, no upstream warm-up)"""
+    from routes import audio, tts
+
+    app = FastAPI()
+    app.include_router(tts.router, prefix="/api")
+    app.include_router(audio.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(db):
+    """make_user(plan, tokens, daily) -> a new User with those usage counters"""
+    def _make_user(plan: str = "Free", tokens: int = 0, daily: int = 0) -> User:
+        user = User(
+            name="Test",
+            email=f"{uuid.uuid4().hex}@example.com",
+            password_hash="x",
+            plan=plan,
+            total_tokens_used=tokens,
+            daily_voice_count=daily,
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+    return _make_user
+
+
+@pytest.fixture
+def auth_headers():
+    def _auth_headers(user: User) -> dict:
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+    return _auth_headers
@@ -0,0 +1,49 @@
+import asyncio
+import os
+
+from services.audio_cache import AudioCache, make_audio_key, normalize_text
+
+
+def test_key_ignores_trivial_text_differences():
+    assert normalize_text("  Hello \n  world ") == "Hello world"
+    assert make_audio_key("Hello  world", "sarah", "mp3") == make_audio_key(" Hello world\n", "sarah", "mp3")
+    assert make_audio_key("Hello world", "sarah", "mp3") != make_audio_key("Hello world", "adam", "mp3")
+    assert make_audio_key("Hello world", "sarah", "mp3") != make_audio_key("Hello world", "sarah", "wav")
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = AudioCache(memory_bytes=10, disk_dir=None, disk_bytes=0)
+
+    async def scenario():
+        await cache.put("a", b"aaaa")
+        await cache.put("b", b"bbbb")
+        assert await cache.get("a") == b"aaaa"  # a is now the most recently used
+        await cache.put("c", b"cccc")
+        return [await cache.get(key) for key in "abc"]
+
+    assert asyncio.run(scenario()) == [b"aaaa", None, b"cccc"]
+    stats = cache.stats()
+    assert stats["memory_evictions"] == 1
+    assert stats["memory_bytes"] == 8
+
+
+def test_disk_tier_survives_a_restart_and_keeps_its_budget(tmp_path):
+    cache = AudioCache(memory_bytes=0, disk_dir=str(tmp_path), disk_bytes=10)
+
+    async def fill():
+        await cache.put("a" * 64, b"1234")
+        await cache.put("b" * 64, b"5678")
+        await cache.put("c" * 64, b"90ab")
+
+    asyncio.run(fill())
+    assert cache.stats()["disk_bytes"] == 8
+    assert not os.path.exists(os.path.join(tmp_path, "aa", "a" * 64 + ".bin"))
+
+    restarted = AudioCache(memory_bytes=100, disk_dir=str(tmp_path), disk_bytes=10)
+
+    async def read():
+        return await restarted.get("b" * 64), await restarted.get("b" * 64), await restarted.get("a" * 64)
+
+    assert asyncio.run(read()) == (b"5678", b"5678", None)
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
@@ -0,0 +1,93 @@
+import pytest
+
+from services.audio_store import audio_store
+
+DATA = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture(scope="module")
+def audio_id():
+    return audio_store.put_sync(DATA)
+
+
+def _get(client, audio_id, method="GET", **headers):
+    return client.request(method, f"/static/audio/{audio_id}", headers=headers)
+
+
+def test_full_file_with_cache_headers(client, audio_id):
+    response = _get(client, audio_id)
+
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["etag"] == f'"{audio_id}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-0", 0, 0),
+    ("bytes=10-19", 10, 19),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=1000-5000", 1000, 1023),  # clamped to the end of the file
+    ("bytes=-24", 1000, 1023),  # suffix
+    ("bytes=-5000", 0, 1023),  # suffix longer than the file
+])
+def test_single_range(client, audio_id, header, start, end):
+    response = _get(client, audio_id, Range=header)
+
+    assert response.status_code == 206
+    assert response.content == DATA[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=5-2",  # last before first: invalid, ignored (RFC 9110 14.1.1)
+    "bytes=0-1,5-6",  # multi-range is not supported
+    "bytes=abc",
+    "items=0-10",
+    "bytes=-",
+])
+def test_ignored_range_serves_the_full_file(client, audio_id, header):
+    response = _get(client, audio_id, Range=header)
+
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert "content-range" not in response.headers
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_range(client, audio_id, header):
+    response = _get(client, audio_id, Range=header)
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_if_range_with_another_validator_serves_the_full_file(client, audio_id):
+    response = _get(client, audio_id, Range="bytes=0-9", **{"If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+    response = _get(client, audio_id, Range="bytes=0-9", **{"If-Range": f'"{audio_id}"'})
+    assert response.status_code == 206
+
+
+def test_if_none_match(client, audio_id):
+    assert _get(client, audio_id, **{"If-None-Match": f'"{audio_id}"'}).status_code == 304
+    assert _get(client, audio_id, **{"If-None-Match": f'W/"{audio_id}", "x"'}).status_code == 304
+    assert _get(client, audio_id, **{"If-None-Match": '"x"'}).status_code == 200
+
+
+def test_head_sends_the_length_without_a_body(client, audio_id):
+    response = _get(client, audio_id, method="HEAD", Range="bytes=0-99")
+
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "100"
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("path", ["not-an-id", "0" * 64, "0" * 64 + ".exe"])
+def test_unknown_audio(client, path):
+    assert client.get(f"/static/audio/{path}").status_code == 404
@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_outage
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code=None, error_type=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.error_type = error_type
+
+
+async def _ok():
+    return "ok"
+
+
+async def _down():
+    raise UpstreamError(503)
+
+
+def _run(breaker, fn):
+    return asyncio.run(breaker.call(fn))
+
+
+def _fail(breaker, times=1, fn=_down):
+    for _ in range(times):
+        with pytest.raises((UpstreamError, CircuitOpenError)):
+            _run(breaker, fn)
+
+
+def test_is_outage():
+    request = httpx.Request("GET", "https://upstream.test/")
+    assert is_outage(httpx.ConnectError("refused", request=request))
+    assert is_outage(httpx.HTTPStatusError("boom", request=request, response=httpx.Response(502, request=request)))
+    assert is_outage(UpstreamError(500))
+    assert is_outage(UpstreamError(error_type="TIMEOUT"))
+    assert not is_outage(UpstreamError(429))
+    assert not is_outage(UpstreamError(400))
+    assert not is_outage(ValueError("bad input"))
+    assert not is_outage(CircuitOpenError("x", 1))
+
+
+def test_consecutive_outages_open_the_circuit():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+
+    _fail(breaker, times=2)
+    assert breaker.state == CLOSED
+    _fail(breaker)
+    assert breaker.state == OPEN
+
+    calls = []
+
+    async def counted():
+        calls.append(1)
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        _run(breaker, counted)
+    assert calls == []
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_a_success_or_client_error_resets_the_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+
+    async def bad_request():
+        raise UpstreamError(400)
+
+    _fail(breaker)
+    _run(breaker, _ok)
+    _fail(breaker)
+    _fail(breaker, fn=bad_request)
+    _fail(breaker)
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    _fail(breaker)
+
+    breaker.before_call()  # reset_timeout passed: half-open, this call is the trial
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_a_failed_trial_opens_the_circuit_again():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    _fail(breaker, times=3)
+    breaker.reset_timeout = 0
+
+    _fail(breaker)
+
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["opened"] == 2
+
+
+def test_a_successful_probe_half_opens_the_circuit():
+    probes = []
+
+    async def probe():
+        probes.append(1)
+        if len(probes) < 2:
+            raise httpx.ConnectError("still down")
+
+    async def scenario():
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60, probe_interval=0.01, probe=probe)
+        with pytest.raises(UpstreamError):
+            await breaker.call(_down)
+        assert breaker.state == OPEN
+        await asyncio.sleep(0.1)
+        return breaker
+
+    breaker = asyncio.run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert len(probes) == 2
+
+
+def test_upstream_status_needs_the_internal_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import main
+    from config import settings
+
+    client = TestClient(main.app)  # not entered: no startup hooks
+
+    monkeypatch.setattr(settings, "INTERNAL_STATUS_TOKEN", None)
+    assert client.get("/internal/upstreams", headers={"X-Internal-Token": ""}).status_code == 404
+
+    monkeypatch.setattr(settings, "INTERNAL_STATUS_TOKEN", "s3cret")
+    assert client.get("/internal/upstreams").status_code == 403
+    assert client.get("/internal/upstreams", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    response = client.get("/internal/upstreams", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "upstreams" in response.json()
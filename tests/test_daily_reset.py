@@ -0,0 +1,44 @@
+from datetime import timedelta, timezone
+
+from models import User
+from services.daily_reset import DAILY_COUNTER_COLUMNS, DailyReset
+from services.usage_counters import UsageCounters
+
+
+def _reset():
+    return DailyReset(timezone.utc, usage=UsageCounters(enabled=False))
+
+
+def _reload(db, user):
+    db.expire_all()
+    return db.get(User, user.id)
+
+
+def test_daily_counts_are_reset_once_a_day(db, make_user):
+    reset = _reset()
+    yesterday, today = make_user("Paid", daily=5), make_user("Paid", daily=2)
+    yesterday.last_reset_date = reset.today() - timedelta(days=1)
+    today.last_reset_date = reset.today()
+    db.commit()
+
+    assert reset.reset_now() >= 1
+
+    assert (_reload(db, yesterday).daily_voice_count, _reload(db, yesterday).last_reset_date) == (0, reset.today())
+    assert _reload(db, today).daily_voice_count == 2
+    # Nothing is left to reset today
+    assert reset.reset_now() == 0
+
+
+def test_every_daily_counter_is_reset(db, make_user):
+    reset = _reset()
+    user = make_user("Paid")
+    for name in DAILY_COUNTER_COLUMNS:
+        setattr(user, name, 3)
+    user.last_reset_date = reset.today() - timedelta(days=1)
+    db.commit()
+
+    reset.reset_now()
+
+    user = _reload(db, user)
+    assert "daily_voice_count" in DAILY_COUNTER_COLUMNS
+    assert all(getattr(user, name) == 0 for name in DAILY_COUNTER_COLUMNS)
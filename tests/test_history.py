@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+
+from models import VoiceHistory
+
+
+def _add_history(db, user, texts, created_at=None):
+    """One entry per text; all with the same created_at when given (ties are broken by id)"""
+    entries = [VoiceHistory(user_id=user.id, text=text, audio_url=f"/static/audio/{i}", created_at=created_at)
+               for i, text in enumerate(texts)]
+    db.add_all(entries)
+    db.commit()
+    return [entry.id for entry in entries]
+
+
+def _all_pages(client, headers, path, limit):
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get(path, params=params, headers=headers)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+def test_history_pages_are_newest_first_without_gaps_or_repeats(client, db, make_user, auth_headers):
+    user = make_user()
+    same_time = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ids = _add_history(db, user, [f"entry {i}" for i in range(25)], created_at=same_time)
+    newer = _add_history(db, user, ["newest"], created_at=same_time + timedelta(minutes=1))
+
+    pages = _all_pages(client, auth_headers(user), "/api/history", limit=10)
+
+    assert [len(page) for page in pages] == [10, 10, 6]
+    assert [entry["id"] for page in pages for entry in page] == newer + sorted(ids, reverse=True)
+
+
+def test_history_only_lists_the_users_own_entries(client, db, make_user, auth_headers):
+    user, other = make_user(), make_user()
+    own = _add_history(db, user, ["mine"])
+    foreign = _add_history(db, other, ["not mine"])
+
+    response = client.get("/api/history", headers=auth_headers(user))
+    assert [entry["id"] for entry in response.json()] == own
+
+    # Another user's entry (or a missing one) is not a valid cursor
+    response = client.get("/api/history", params={"cursor": foreign[0]}, headers=auth_headers(user))
+    assert (response.status_code, response.json()["detail"]) == (400, "Invalid cursor")
+    response = client.get("/api/history", params={"cursor": foreign[0] + 10**6}, headers=auth_headers(user))
+    assert response.status_code == 400
+
+
+def test_history_fields_selects_the_returned_columns(client, db, make_user, auth_headers):
+    user = make_user()
+    _add_history(db, user, ["some text"])
+
+    response = client.get("/api/history", params={"fields": "id,audio_url"}, headers=auth_headers(user))
+    assert list(response.json()[0]) == ["id", "audio_url"]
+
+    response = client.get("/api/history", params={"fields": "id,password"}, headers=auth_headers(user))
+    assert response.status_code == 400
+
+
+def test_history_page_size_is_capped(client, db, make_user, auth_headers, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "HISTORY_MAX_PAGE_SIZE", 3)
+    user = make_user()
+    _add_history(db, user, [f"entry {i}" for i in range(5)])
+
+    response = client.get("/api/history", params={"limit": 1000}, headers=auth_headers(user))
+
+    assert len(response.json()) == 3
+    assert "X-Next-Cursor" in response.headers
+
+
+def test_search_matches_every_word_and_a_prefix_of_the_last(client, db, make_user, auth_headers):
+    user = make_user()
+    ids = _add_history(db, user, ["Hello wonderful world", "hello there", "goodbye world", "world of hellos"])
+
+    def search(q):
+        response = client.get("/api/history/search", params={"q": q}, headers=auth_headers(user))
+        assert response.status_code == 200
+        return sorted(entry["id"] for entry in response.json())
+
+    assert search("hello world") == [ids[0]]
+    assert search("WORLD hel") == [ids[0], ids[3]]
+    assert search("goodbye") == [ids[2]]
+    assert search("missing") == []
+
+
+def test_search_ranks_the_best_match_first(client, db, make_user, auth_headers):
+    user = make_user()
+    filler = " ".join(["filler"] * 40)
+    weak, strong = _add_history(db, user, [f"rocket {filler}", "rocket rocket rocket"])
+
+    response = client.get("/api/history/search", params={"q": "rocket"}, headers=auth_headers(user))
+
+    assert [entry["id"] for entry in response.json()] == [strong, weak]
+
+
+def test_search_pages_through_tied_ranks_without_gaps_or_repeats(client, db, make_user, auth_headers):
+    user = make_user()
+    ids = _add_history(db, user, ["same words every time"] * 25)
+    _add_history(db, make_user(), ["same words every time"])  # another user's entry
+
+    pages = _all_pages(client, auth_headers(user), "/api/history/search?q=same+words", limit=10)
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sorted(entry["id"] for page in pages for entry in page) == sorted(ids)
+
+
+def test_search_rejects_a_malformed_cursor(client, make_user, auth_headers):
+    user = make_user()
+
+    response = client.get("/api/history/search", params={"q": "x", "cursor": "not-a-cursor"}, headers=auth_headers(user))
+
+    assert response.status_code == 400
+
+
+def test_search_input_cannot_break_the_match_expression(client, db, make_user, auth_headers):
+    user = make_user()
+    ids = _add_history(db, user, ["quoted text here"])
+
+    for q in ['"quoted" OR (', "NEAR(text*", "-*^:"]:
+        response = client.get("/api/history/search", params={"q": q}, headers=auth_headers(user))
+        assert response.status_code == 200
+    # Operators are plain words: both must appear
+    response = client.get("/api/history/search", params={"q": '"quoted" (text*'}, headers=auth_headers(user))
+    assert [entry["id"] for entry in response.json()] == ids
+
+
+def test_search_cursor_round_trips_exactly():
+    from services.history_search import history_search
+
+    rank, entry_id = history_search.decode_cursor(history_search.encode_cursor({"rank": -1.2345678901234567e-06, "id": 42}))
+
+    assert (rank, entry_id) == (-1.2345678901234567e-06, 42)
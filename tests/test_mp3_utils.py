@@ -0,0 +1,71 @@
+from utils.mp3_utils import audio_frames, concat_mp3, duration_seconds, first_frame_header, parse_frame_header
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono: 417-byte frames of 1152 samples
+HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+FRAME_LENGTH = 417
+
+
+def _frame(fill: int) -> bytes:
+    return HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+
+def _info_frame() -> bytes:
+    # Xing/Info tag after the 17 bytes of mono MPEG-1 side info
+    return HEADER + bytes(17) + b"Info" + bytes(FRAME_LENGTH - 25)
+
+
+def _id3v2(size: int = 20) -> bytes:
+    return b"ID3\x04\x00\x00" + bytes([0, 0, 0, size]) + bytes(size)
+
+
+def _id3v1() -> bytes:
+    return b"TAG" + bytes(125)
+
+
+def _stream(*fills: int, tags: bool = True) -> bytes:
+    frames = b"".join(_frame(fill) for fill in fills)
+    if not tags:
+        return frames
+    return _id3v2() + _info_frame() + frames + _id3v1()
+
+
+def test_parse_frame_header():
+    header = parse_frame_header(HEADER, 0)
+
+    assert (header.version, header.bitrate, header.sample_rate, header.channels) == (3, 128, 44100, 1)
+    assert header.frame_length == FRAME_LENGTH
+    assert header.samples_per_frame == 1152
+    assert parse_frame_header(b"\xff\xfb\xf0\xc0", 0) is None  # bitrate index 15
+    assert parse_frame_header(b"\xff\xfd\x90\xc0", 0) is None  # Layer II
+    assert parse_frame_header(b"ID3\x04", 0) is None
+
+
+def test_audio_frames_skip_tags_and_the_info_frame():
+    frames = audio_frames(_stream(1, 2, 3))
+
+    assert frames == [_frame(1), _frame(2), _frame(3)]
+    assert first_frame_header(_stream(1)).bitrate == 128
+
+
+def test_frames_are_found_again_after_garbage():
+    # The stray header in the garbage is not followed by a frame, so it is no sync
+    data = b"\x00garbage" + HEADER + b"\x12" * 8 + _frame(1) + _frame(2)
+
+    assert audio_frames(data) == [_frame(1), _frame(2)]
+
+
+def test_duration_comes_from_the_frames():
+    assert abs(duration_seconds(_stream(*range(10))) - 10 * 1152 / 44100) < 1e-9
+
+
+def test_concat_joins_frames_without_tags():
+    joined = concat_mp3([_stream(1, 2), _stream(3), _stream(4, 5, tags=False)])
+
+    assert joined == b"".join(_frame(fill) for fill in (1, 2, 3, 4, 5))
+    assert abs(duration_seconds(joined) - 5 * 1152 / 44100) < 1e-9
+
+
+def test_concat_of_one_part_returns_it_unchanged():
+    part = _stream(1)
+
+    assert concat_mp3([part]) is part
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from database import SessionLocal
+from models import User
+from services import quota_reservation
+from services.quota_reservation import release_voice_quota, reserve_voice_quota
+from services.usage_counters import UsageCounters
+
+
+def _reserve_in_parallel(user_id: int, requests: int, word_count: int):
+    """Run `requests` reservations at once, each with its own session and User, like concurrent requests"""
+    barrier = threading.Barrier(requests)
+    results = [None] * requests
+
+    def worker(index: int) -> None:
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).one()
+            barrier.wait()
+            results[index] = reserve_voice_quota(db, user, word_count)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _counters(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).one()
+        return user.total_tokens_used, user.daily_voice_count
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    counters = UsageCounters(session_factory=SessionLocal, enabled=True)
+    monkeypatch.setattr(quota_reservation, "usage_counters", counters)
+    return counters
+
+
+def test_parallel_reservations_never_overshoot_the_token_cap(make_user):
+    # 780 of 800 tokens used: 20 left, room for 3 requests of 6 words
+    user = make_user("Paid", tokens=780)
+
+    results = _reserve_in_parallel(user.id, requests=10, word_count=6)
+
+    reserved = [reservation for reservation, error in results if reservation is not None]
+    refused = [error for reservation, error in results if reservation is None]
+    assert len(reserved) == 3
+    assert len(refused) == 7
+    assert all(error.error["error_type"] == "TOKEN_LIMIT_EXCEEDED" for error in refused)
+    assert _counters(user.id) == (798, 3)
+
+
+def test_parallel_reservations_never_overshoot_the_daily_limit(make_user):
+    user = make_user("Free", daily=1)
+
+    results = _reserve_in_parallel(user.id, requests=5, word_count=1)
+
+    assert sum(reservation is not None for reservation, _ in results) == 1
+    assert _counters(user.id) == (1, 2)
+
+
+def test_write_behind_reservations_never_overshoot(make_user, write_behind):
+    user = make_user("Paid", tokens=780)
+
+    results = _reserve_in_parallel(user.id, requests=10, word_count=6)
+
+    assert sum(reservation is not None for reservation, _ in results) == 3
+    # Nothing reaches the database until the counters are flushed
+    assert _counters(user.id) == (780, 0)
+    assert write_behind.flush() == 1
+    assert _counters(user.id) == (798, 3)
+
+
+def test_release_gives_the_reservation_back(db, make_user):
+    user = make_user("Paid", tokens=100)
+    reservation, error = reserve_voice_quota(db, user, 10)
+    assert error is None
+    assert _counters(user.id) == (110, 1)
+
+    release_voice_quota(db, reservation)
+    release_voice_quota(db, reservation)  # a second release is a no-op
+
+    assert _counters(user.id) == (100, 0)
+
+
+def test_partial_release_keeps_the_generation_charged(db, make_user):
+    user = make_user("Paid", tokens=100)
+    reservation, _ = reserve_voice_quota(db, user, 10)
+
+    release_voice_quota(db, reservation, tokens=4)
+
+    assert _counters(user.id) == (106, 1)
+
+
+def test_write_behind_release_is_flushed(db, make_user, write_behind):
+    user = make_user("Paid", tokens=100)
+    reservation, _ = reserve_voice_quota(db, user, 10)
+    assert (user.total_tokens_used, user.daily_voice_count) == (110, 1)
+
+    release_voice_quota(db, reservation)
+    write_behind.flush()
+
+    assert (user.total_tokens_used, user.daily_voice_count) == (100, 0)
+    assert _counters(user.id) == (100, 0)
+
+
+def test_limits_are_checked_before_reserving(db, make_user):
+    user = make_user("Free")
+
+    reservation, error = reserve_voice_quota(db, user, 151)
+
+    assert reservation is None
+    assert error.error["error_type"] == "WORD_LIMIT_EXCEEDED"
+    assert _counters(user.id) == (0, 0)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_share_one_execution():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"audio"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", work) for _ in range(5)], flight.do("other", work))
+
+    assert asyncio.run(scenario()) == [b"audio"] * 6
+    assert len(calls) == 2
+    assert flight.stats() == {"calls": 6, "executions": 2, "coalesced": 4, "failures": 0, "in_flight": 0}
+
+
+def test_a_failure_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        results = await asyncio.gather(*[flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+        # The next call starts afresh
+        later = await flight.do("key", ok)
+        return results, later
+
+    results, later = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert later == "ok"
+    assert flight.stats()["failures"] == 1
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
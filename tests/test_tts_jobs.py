@@ -0,0 +1,212 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from models import TTSJob, User, VoiceHistory
+from services.audio_store import AudioStore
+from services import tts_jobs
+from services.http_client import http_clients
+from services.tts_jobs import (
+    JOB_FAILED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JobQueueFullError,
+    TTSJobManager,
+    WebhookURLError,
+    check_webhook_url,
+    new_job_id,
+)
+
+
+class FakeRouter:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    async def generate_voice(self, text, voice="sarah", response_format="mp3", use_cache=True):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return f"audio for {text}".encode()
+
+
+def _add_job(db, user, text="hello there world", **fields):
+    job = TTSJob(id=new_job_id(), user_id=user.id, text=text, voice="sarah", word_count=len(text.split()), **fields)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def _run_jobs(manager):
+    """Start the manager, which picks up the jobs queued in the database, and wait for them"""
+    async def scenario():
+        await manager.start()
+        await manager._queue.join()
+        await manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def _reload(db, model, key):
+    db.expire_all()
+    return db.get(model, key)
+
+
+def test_a_job_is_charged_once_and_its_audio_stored(db, make_user, tmp_path):
+    user = make_user("Paid", tokens=100)
+    job_id = _add_job(db, user)
+    manager = TTSJobManager(FakeRouter(), workers=1, queue_size=5, store=AudioStore(str(tmp_path)))
+
+    _run_jobs(manager)
+
+    job = _reload(db, TTSJob, job_id)
+    assert job.status == JOB_SUCCEEDED
+    assert job.quota_charged
+    with open(job.audio_path, "rb") as f:
+        assert f.read() == b"audio for hello there world"
+    user = _reload(db, User, user.id)
+    assert (user.total_tokens_used, user.daily_voice_count) == (103, 1)
+    history = db.query(VoiceHistory).filter(VoiceHistory.user_id == user.id).one()
+    assert history.audio_url.startswith("/static/audio/")
+    assert manager.stats()["succeeded"] == 1
+
+
+def test_a_failed_job_is_refunded(db, make_user, tmp_path):
+    user = make_user("Paid", tokens=100)
+    job_id = _add_job(db, user)
+    manager = TTSJobManager(FakeRouter(error=RuntimeError("upstream down")), workers=1, queue_size=5, store=AudioStore(str(tmp_path)))
+
+    _run_jobs(manager)
+
+    job = _reload(db, TTSJob, job_id)
+    assert (job.status, job.error) == (JOB_FAILED, "upstream down")
+    user = _reload(db, User, user.id)
+    assert (user.total_tokens_used, user.daily_voice_count) == (100, 0)
+
+
+def test_a_job_over_the_quota_fails_without_synthesis(db, make_user, tmp_path):
+    user = make_user("Paid", tokens=799)
+    job_id = _add_job(db, user)
+    router = FakeRouter()
+    manager = TTSJobManager(router, workers=1, queue_size=5, store=AudioStore(str(tmp_path)))
+
+    _run_jobs(manager)
+
+    assert _reload(db, TTSJob, job_id).status == JOB_FAILED
+    assert router.calls == 0
+    assert _reload(db, User, user.id).total_tokens_used == 799
+
+
+def test_jobs_interrupted_by_a_restart_are_resumed_without_charging_again(db, make_user, tmp_path):
+    user = make_user("Paid", tokens=103, daily=1)
+    # Left behind by a process that stopped: one charged mid-run, one never started
+    running = _add_job(db, user, status=JOB_RUNNING, quota_charged=True)
+    queued = _add_job(db, user, text="second job")
+    manager = TTSJobManager(FakeRouter(), workers=2, queue_size=5, store=AudioStore(str(tmp_path)))
+
+    _run_jobs(manager)
+
+    assert _reload(db, TTSJob, running).status == JOB_SUCCEEDED
+    assert _reload(db, TTSJob, queued).status == JOB_SUCCEEDED
+    user = _reload(db, User, user.id)
+    assert (user.total_tokens_used, user.daily_voice_count) == (105, 2)
+
+
+def test_enqueue_refuses_when_the_queue_is_full():
+    manager = TTSJobManager(FakeRouter(), workers=1, queue_size=2)
+
+    manager.enqueue("a")
+    manager.enqueue("b")
+    with pytest.raises(JobQueueFullError):
+        manager.enqueue("c")
+
+
+@pytest.mark.parametrize("url", [
+    "http://8.8.8.8/hook",
+    "https:///hook",
+    "https://127.0.0.1/hook",
+    "https://localhost/hook",
+    "https://10.1.2.3/hook",
+    "https://169.254.169.254/latest/meta-data",
+    "https://100.64.0.1/hook",
+    "https://[::1]/hook",
+    "https://[::ffff:192.168.0.1]/hook",
+    "https://224.0.0.1/hook",
+])
+def test_webhook_urls_to_internal_addresses_are_refused(url):
+    with pytest.raises(WebhookURLError):
+        asyncio.run(check_webhook_url(url))
+
+
+def test_webhook_to_a_public_address_is_accepted():
+    assert asyncio.run(check_webhook_url("https://8.8.8.8:8443/hook")) == "8.8.8.8"
+
+
+def _webhook_receiver(monkeypatch, status_code=204):
+    received = []
+
+    def handler(request):
+        received.append(request)
+        return httpx.Response(status_code, headers={"Location": "https://127.0.0.1/internal"})
+
+    # A client that would follow redirects, to show the webhook call turns that off
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+    monkeypatch.setitem(http_clients._clients, "webhooks", client)
+    return received
+
+
+def _resolve_to(monkeypatch, *answers):
+    """Each DNS lookup of the webhook host gets the next answer"""
+    answers = iter(answers)
+
+    async def resolve(host, port):
+        return next(answers)
+
+    monkeypatch.setattr(tts_jobs, "_resolve", resolve)
+
+
+def test_the_webhook_receives_the_result_at_the_checked_address(db, make_user, tmp_path, monkeypatch):
+    received = _webhook_receiver(monkeypatch)
+    _resolve_to(monkeypatch, ["93.184.216.34"])
+    user = make_user("Paid")
+    job_id = _add_job(db, user, webhook_url="https://hooks.example.com:8443/hook?job=1")
+    manager = TTSJobManager(FakeRouter(), workers=1, queue_size=5, store=AudioStore(str(tmp_path)))
+
+    _run_jobs(manager)
+
+    [request] = received
+    assert str(request.url) == "https://93.184.216.34:8443/hook?job=1"
+    assert request.headers["host"] == "hooks.example.com:8443"
+    assert request.extensions["sni_hostname"] == "hooks.example.com"
+    payload = json.loads(request.content)
+    assert (payload["job_id"], payload["status"]) == (job_id, JOB_SUCCEEDED)
+    assert payload["audio_url"] == f"/api/tts/jobs/{job_id}/audio"
+    assert manager.stats()["webhooks_sent"] == 1
+
+
+def test_a_host_rebound_to_an_internal_address_gets_no_webhook(monkeypatch):
+    received = _webhook_receiver(monkeypatch)
+    # Public when the job was created, loopback by the time it is delivered
+    _resolve_to(monkeypatch, ["93.184.216.34"], ["127.0.0.1"])
+    manager = TTSJobManager(FakeRouter(), workers=1, queue_size=5)
+
+    async def scenario():
+        await check_webhook_url("https://rebind.example.com/hook")
+        await manager._send_webhook("https://rebind.example.com/hook", {"job_id": "x"})
+
+    asyncio.run(scenario())
+
+    assert received == []
+    assert manager.stats()["webhooks_failed"] == 1
+
+
+def test_webhook_redirects_are_not_followed(monkeypatch):
+    received = _webhook_receiver(monkeypatch, status_code=302)
+    _resolve_to(monkeypatch, ["93.184.216.34"])
+    manager = TTSJobManager(FakeRouter(), workers=1, queue_size=5)
+
+    asyncio.run(manager._send_webhook("https://hooks.example.com/hook", {"job_id": "x"}))
+
+    assert [str(request.url) for request in received] == ["https://93.184.216.34/hook"]
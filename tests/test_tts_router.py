@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+
+from services.audio_cache import AudioCache
+from services.lamonfox_service import LamonfoxService
+from services.tts_router import LemonfoxProvider, TTSRouter
+
+
+class FakeProvider:
+    def __init__(self, name, delay=0.0, error=None, native_formats=("mp3",), available=True, from_upstream=True):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.native_formats = set(native_formats)
+        self._available = available
+        self.from_upstream = from_upstream
+        self.calls = 0
+
+    def enabled(self) -> bool:
+        return True
+
+    def available(self) -> bool:
+        return self._available
+
+    def current_model(self) -> str:
+        return "model"
+
+    async def synthesize(self, text, voice, response_format, use_cache):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f"{self.name}:{text}".encode(), "model", self.from_upstream
+
+
+def _history(router, provider, seconds, samples=20, ok=True):
+    for _ in range(samples):
+        router._stats_for(provider).record(seconds, ok=ok)
+
+
+def test_untried_providers_keep_the_configured_order():
+    first, second = FakeProvider("first"), FakeProvider("second")
+    router = TTSRouter([first, second])
+
+    assert router.ranked() == [first, second]
+    assert asyncio.run(router.generate_voice("hi")) == b"first:hi"
+
+
+def test_the_fastest_healthy_provider_is_preferred():
+    slow, fast, failing, open_circuit = (FakeProvider("slow"), FakeProvider("fast"), FakeProvider("failing"),
+                                         FakeProvider("open", available=False))
+    router = TTSRouter([open_circuit, failing, slow, fast])
+    _history(router, slow, 2.0)
+    _history(router, fast, 0.5)
+    _history(router, failing, 0.1, samples=5, ok=False)
+
+    assert router.ranked() == [fast, slow, failing, open_circuit]
+
+
+def test_failover_to_the_next_provider():
+    broken, backup = FakeProvider("broken", error=RuntimeError("down")), FakeProvider("backup")
+    router = TTSRouter([broken, backup])
+
+    assert asyncio.run(router.generate_voice("hi")) == b"backup:hi"
+    assert router.counters["failovers"] == 1
+    assert router.stats()["providers"]["broken/model"]["error_rate"] == 1.0
+
+
+def test_the_last_error_is_raised_when_every_provider_fails():
+    router = TTSRouter([FakeProvider("a", error=RuntimeError("a down")), FakeProvider("b", error=RuntimeError("b down"))])
+
+    with pytest.raises(RuntimeError, match="b down"):
+        asyncio.run(router.generate_voice("hi"))
+
+
+def test_only_providers_with_the_format_are_used():
+    mp3_only, wav = FakeProvider("mp3_only"), FakeProvider("wav", native_formats=("mp3", "wav"))
+    router = TTSRouter([mp3_only, wav])
+
+    assert asyncio.run(router.generate_voice("hi", response_format="wav")) == b"wav:hi"
+    assert router.supports_format("wav")
+    assert not router.supports_format("flac")
+
+
+def test_a_slow_primary_is_hedged_and_the_first_answer_wins():
+    primary, secondary = FakeProvider("primary", delay=0.5), FakeProvider("secondary", delay=0.01)
+    router = TTSRouter([primary, secondary], hedge_enabled=True, hedge_min_samples=20)
+    _history(router, primary, 0.02)
+
+    started = time.monotonic()
+    assert asyncio.run(router.generate_voice("hi")) == b"secondary:hi"
+
+    assert time.monotonic() - started < 0.4
+    assert router.counters["hedges"] == 1
+    assert router.counters["hedge_wins"] == 1
+
+
+def test_a_fast_primary_is_not_hedged():
+    primary, secondary = FakeProvider("primary"), FakeProvider("secondary")
+    router = TTSRouter([primary, secondary], hedge_enabled=True, hedge_min_samples=20)
+    _history(router, primary, 0.5)
+
+    assert asyncio.run(router.generate_voice("hi")) == b"primary:hi"
+    assert secondary.calls == 0
+    assert router.counters["hedges"] == 0
+
+
+def test_without_enough_history_hedging_is_plain_failover():
+    primary, secondary = FakeProvider("primary", delay=0.05), FakeProvider("secondary")
+    router = TTSRouter([primary, secondary], hedge_enabled=True, hedge_min_samples=20)
+    _history(router, primary, 0.01, samples=5)
+
+    assert asyncio.run(router.generate_voice("hi")) == b"primary:hi"
+    assert secondary.calls == 0
+
+
+def test_only_upstream_calls_are_latency_samples():
+    upstream, cached = FakeProvider("upstream"), FakeProvider("cached", from_upstream=False)
+    router = TTSRouter([upstream, cached])
+
+    asyncio.run(router.call(upstream, "hi", "sarah", "mp3", True))
+    asyncio.run(router.call(cached, "hi", "sarah", "mp3", True))
+
+    assert router.stats()["providers"].keys() == {"upstream/model"}
+
+
+def _lemonfox(monkeypatch, delay=0.0):
+    service = LamonfoxService(cache=AudioCache(memory_bytes=1 << 20, disk_dir=None, disk_bytes=0))
+    service.api_key = "test"
+    requests = []
+
+    async def fake_request(text, voice, response_format):
+        requests.append(text)
+        await asyncio.sleep(delay)
+        return f"lemonfox:{text}".encode()
+
+    monkeypatch.setattr(service, "_governed_request", fake_request)
+    return LemonfoxProvider(service), requests
+
+
+def _samples(router, provider):
+    return router._stats_for(provider).snapshot()["samples"]
+
+
+def test_a_cache_hit_adds_no_latency_sample(monkeypatch):
+    provider, requests = _lemonfox(monkeypatch)
+    router = TTSRouter([provider])
+
+    async def scenario():
+        first = await router.generate_voice("hi")
+        return first, await router.generate_voice("hi")
+
+    assert asyncio.run(scenario()) == (b"lemonfox:hi", b"lemonfox:hi")
+    assert requests == ["hi"]
+    assert _samples(router, provider) == 1
+
+
+def test_callers_joining_an_in_flight_request_add_no_latency_sample(monkeypatch):
+    provider, requests = _lemonfox(monkeypatch, delay=0.05)
+    router = TTSRouter([provider])
+
+    async def scenario():
+        return await asyncio.gather(*(router.generate_voice("hi", use_cache=False) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == [b"lemonfox:hi"] * 3
+    assert requests == ["hi"]
+    assert _samples(router, provider) == 1
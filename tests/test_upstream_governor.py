@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from services.upstream_governor import UpstreamBusyError, UpstreamGovernor, parse_retry_after
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code=None, error_type=None, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.error_type = error_type
+        self.retry_after = retry_after
+
+
+def _governor(**kwargs) -> UpstreamGovernor:
+    options = dict(requests_per_second=1000, chars_per_second=100000, backoff_base=0.001, backoff_max=0.01)
+    options.update(kwargs)
+    return UpstreamGovernor("test", **options)
+
+
+def _flaky(*errors, result="audio"):
+    """fn for call(): raises the given errors in turn, then returns result"""
+    remaining = list(errors)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    return fn, calls
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" 1.5 ") == 1.5
+    assert parse_retry_after("-4") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_transient_failures_are_retried():
+    governor = _governor()
+    fn, calls = _flaky(UpstreamError(503), UpstreamError(error_type="TIMEOUT"))
+
+    assert asyncio.run(governor.call(fn)) == "audio"
+    assert len(calls) == 3
+    assert governor.stats()["retries"] == 2
+    assert governor.stats()["server_errors"] == 2
+
+
+@pytest.mark.parametrize("error", [UpstreamError(400), ValueError("bad input")])
+def test_other_failures_are_not_retried(error):
+    governor = _governor()
+    fn, calls = _flaky(error)
+
+    with pytest.raises(type(error)):
+        asyncio.run(governor.call(fn))
+    assert len(calls) == 1
+
+
+def test_retries_stop_after_max_attempts():
+    governor = _governor(max_attempts=3)
+    fn, calls = _flaky(*[UpstreamError(502)] * 5)
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(governor.call(fn))
+    assert len(calls) == 3
+
+
+def test_throttling_halves_the_limit_and_pauses_every_caller():
+    governor = _governor(max_concurrency=8)
+    fn, _ = _flaky(UpstreamError(429, retry_after=0.2))
+
+    started = time.monotonic()
+    assert asyncio.run(governor.call(fn)) == "audio"
+
+    assert time.monotonic() - started >= 0.2
+    stats = governor.stats()
+    assert stats["throttled"] == 1
+    assert stats["concurrency_limit"] < 8
+
+
+def test_concurrency_stays_within_the_limit():
+    governor = _governor(max_concurrency=2)
+    in_flight, peak = 0, 0
+
+    async def fn():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "audio"
+
+    async def scenario():
+        return await asyncio.gather(*[governor.call(fn) for _ in range(6)])
+
+    assert asyncio.run(scenario()) == ["audio"] * 6
+    assert peak == 2
+    assert governor.stats()["max_in_flight"] == 2
+
+
+def test_requests_that_cannot_start_before_the_deadline_are_rejected():
+    governor = _governor(max_concurrency=1, deadline=0.05)
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "audio"
+
+    async def scenario():
+        return await asyncio.gather(governor.call(slow), governor.call(slow), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert results[0] == "audio"
+    assert isinstance(results[1], UpstreamBusyError)
+    assert governor.stats()["rejected"] == 1
+
+
+def test_rate_limit_spaces_out_requests():
+    governor = _governor(requests_per_second=20)
+
+    async def fn():
+        return "audio"
+
+    async def scenario():
+        # The bucket holds one second's burst (20), the next 5 wait for refills
+        return await asyncio.gather(*[governor.call(fn) for _ in range(25)])
+
+    started = time.monotonic()
+    asyncio.run(scenario())
+    assert time.monotonic() - started >= 0.2
@@ -0,0 +1,80 @@
+from database import SessionLocal
+from models import User
+from services.usage_counters import UsageCounters
+
+
+def _counters(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).one()
+        return user.total_tokens_used, user.daily_voice_count
+    finally:
+        db.close()
+
+
+def test_flush_writes_all_pending_users_at_once(make_user):
+    counters = UsageCounters(enabled=True)
+    first, second = make_user("Paid", tokens=10), make_user("Paid")
+
+    assert counters.reserve(first, 5, 1, max_tokens=800, max_daily=5)
+    assert counters.reserve(first, 5, 1, max_tokens=800, max_daily=5)
+    assert counters.reserve(second, 7, 1, max_tokens=800, max_daily=5)
+
+    assert counters.flush() == 2
+    assert _counters(first.id) == (20, 2)
+    assert _counters(second.id) == (7, 1)
+    # Nothing is pending any more
+    assert counters.flush() == 0
+    assert counters.stats()["rows_written"] == 2
+
+
+def test_refused_reservation_changes_nothing(make_user):
+    counters = UsageCounters(enabled=True)
+    user = make_user("Paid", tokens=795)
+
+    assert not counters.reserve(user, 6, 1, max_tokens=800, max_daily=5)
+
+    assert counters.flush() == 0
+    assert counters.stats()["refused"] == 1
+    assert _counters(user.id) == (795, 0)
+
+
+def test_failed_flush_keeps_the_deltas_for_the_next_one(make_user):
+    def failing_session():
+        db = SessionLocal()
+
+        def commit():
+            raise RuntimeError("database unavailable")
+
+        db.commit = commit
+        return db
+
+    counters = UsageCounters(session_factory=failing_session, enabled=True)
+    user = make_user("Paid")
+    counters.reserve(user, 4, 1, max_tokens=800, max_daily=5)
+
+    assert counters.flush() == 0
+    assert counters.stats()["flush_failures"] == 1
+    assert _counters(user.id) == (0, 0)
+
+    counters.session_factory = SessionLocal
+    assert counters.flush() == 1
+    assert _counters(user.id) == (4, 1)
+
+
+def test_refund_of_an_untracked_user_is_left_to_the_database(make_user):
+    counters = UsageCounters(enabled=True)
+    user = make_user("Paid", tokens=10)
+
+    assert not counters.refund(user.id, 5, 1)
+
+
+def test_reset_daily_drops_the_pending_daily_count(make_user):
+    counters = UsageCounters(enabled=True)
+    user = make_user("Paid", daily=3)
+    counters.reserve(user, 2, 1, max_tokens=800, max_daily=5)
+
+    counters.reset_daily(user.id)
+    counters.flush()
+
+    assert _counters(user.id) == (2, 3)
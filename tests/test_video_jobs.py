@@ -0,0 +1,110 @@
+import asyncio
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from models import GeneratedVideo, VideoJob
+from services import video_jobs
+from services.tts_jobs import JOB_FAILED, JOB_SUCCEEDED, JobQueueFullError, new_job_id
+from services.video_jobs import VideoJobManager
+
+# The fake renderer reaches the render processes by being patched in before they fork
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+
+FAIL, CRASH = 98, 99
+
+
+def fake_render(image_paths, output_path, duration_seconds, crossfade, transition):
+    """Stands in for render_slideshow: the duration selects failure or a crashing process"""
+    if duration_seconds == FAIL:
+        raise RuntimeError("Failed to load image 1")
+    if duration_seconds == CRASH:
+        os._exit(1)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(b"\x00\x00\x00\x18ftypmp42" + bytes(2000))
+    return os.path.getsize(output_path)
+
+
+@pytest.fixture(autouse=True)
+def fake_renderer(monkeypatch):
+    monkeypatch.setattr(video_jobs, "render_slideshow", fake_render)
+
+
+def _add_job(db, user, tmp_path, duration_seconds=2):
+    image_paths = []
+    for i in range(2):
+        path = tmp_path / f"{new_job_id()}.jpg"
+        path.write_bytes(b"image")
+        image_paths.append(str(path))
+    job = VideoJob(id=new_job_id(), user_id=user.id, image_paths=json.dumps(image_paths), duration_seconds=duration_seconds)
+    db.add(job)
+    db.commit()
+    return job.id, image_paths
+
+
+def _run_jobs(manager, *job_ids):
+    """Start the manager, which picks up the jobs queued in the database, and wait for them"""
+    async def scenario():
+        await manager.start()
+        finished = [await manager.wait(job_id, timeout=30) for job_id in job_ids]
+        await manager.shutdown()
+        return finished
+
+    return asyncio.run(scenario())
+
+
+def _reload(db, job_id):
+    db.expire_all()
+    return db.get(VideoJob, job_id)
+
+
+def test_a_rendered_job_is_recorded_and_its_uploads_removed(db, make_user, tmp_path):
+    user = make_user()
+    job_id, image_paths = _add_job(db, user, tmp_path)
+    manager = VideoJobManager(workers=1, queue_size=5, videos_dir=str(tmp_path / "videos"))
+
+    assert _run_jobs(manager, job_id) == [True]
+
+    job = _reload(db, job_id)
+    assert job.status == JOB_SUCCEEDED
+    assert job.video_size == 2012
+    filename = job.video_url.rsplit("/", 1)[1]
+    assert os.path.getsize(tmp_path / "videos" / filename) == 2012
+    assert db.query(GeneratedVideo).filter(GeneratedVideo.user_id == user.id).one().video_url == job.video_url
+    assert not any(os.path.exists(path) for path in image_paths)
+
+
+def test_a_failed_render_is_reported(db, make_user, tmp_path):
+    user = make_user()
+    job_id, image_paths = _add_job(db, user, tmp_path, duration_seconds=FAIL)
+    manager = VideoJobManager(workers=1, queue_size=5, videos_dir=str(tmp_path / "videos"))
+
+    _run_jobs(manager, job_id)
+
+    job = _reload(db, job_id)
+    assert (job.status, job.error) == (JOB_FAILED, "Failed to load image 1")
+    assert not any(os.path.exists(path) for path in image_paths)
+
+
+def test_a_crashed_render_process_is_replaced(db, make_user, tmp_path):
+    user = make_user()
+    crashing, _ = _add_job(db, user, tmp_path, duration_seconds=CRASH)
+    after, _ = _add_job(db, user, tmp_path)
+    manager = VideoJobManager(workers=1, queue_size=5, videos_dir=str(tmp_path / "videos"))
+
+    _run_jobs(manager, crashing, after)
+
+    assert _reload(db, crashing).error == "The video renderer crashed. Please try again."
+    assert _reload(db, after).status == JOB_SUCCEEDED
+    assert manager.stats()["pool_restarts"] == 1
+
+
+def test_enqueue_refuses_when_the_queue_is_full(tmp_path):
+    manager = VideoJobManager(workers=1, queue_size=1, videos_dir=str(tmp_path))
+
+    manager.enqueue("a")
+    with pytest.raises(JobQueueFullError):
+        manager.enqueue("b")
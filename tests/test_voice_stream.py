@@ -0,0 +1,113 @@
+import pytest
+
+from models import User, VoiceHistory
+from routes import tts
+from utils import audio_utils
+
+
+class FakeStream:
+    """Stands in for LamonfoxService.stream_voice, remembering what was asked for"""
+
+    def __init__(self, chunks=(b"chunk-1", b"chunk-2"), error=None):
+        self.chunks = chunks
+        self.error = error
+        self.requests = []
+
+    async def __call__(self, text, voice="sarah", response_format="mp3", chunk_size=16384):
+        self.requests.append((text, voice, response_format))
+        if self.error is not None:
+            raise self.error
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    fake = FakeStream()
+    monkeypatch.setattr(tts.lamonfox_service, "stream_voice", fake)
+    return fake
+
+
+def _post(client, headers, **body):
+    return client.post("/api/generate-voice/stream", json={"text": "hello there world", **body}, headers=headers)
+
+
+def _tokens(db, user):
+    db.expire_all()
+    return db.get(User, user.id).total_tokens_used
+
+
+def test_the_requested_format_is_streamed_and_stored(client, db, make_user, auth_headers, stream):
+    user = make_user("Paid")
+
+    response = _post(client, auth_headers(user), format="opus")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/ogg"
+    assert response.content == b"chunk-1chunk-2"
+    assert stream.requests == [("hello there world", "sarah", "opus")]
+    history = db.query(VoiceHistory).filter(VoiceHistory.user_id == user.id).one()
+    assert history.audio_url.endswith(".ogg")
+
+
+@pytest.mark.parametrize("plan, body", [
+    ("Paid", {"format": "wav"}),
+    ("Paid", {"bitrate": 32}),
+    ("Free", {"format": "aac"}),
+])
+def test_formats_the_stream_cannot_serve_are_refused(client, db, make_user, auth_headers, stream, plan, body):
+    user = make_user(plan)
+
+    response = _post(client, auth_headers(user), **body)
+
+    assert response.status_code == 400
+    assert response.json()["error"]["error_type"] == "INVALID_FORMAT"
+    assert stream.requests == []
+    assert _tokens(db, user) == 0
+
+
+def test_a_failed_stream_falls_back_to_the_router(client, db, make_user, auth_headers, monkeypatch):
+    calls = []
+
+    async def generate_voice(text, voice="sarah", response_format="mp3", use_cache=True):
+        calls.append(response_format)
+        return b"from the router"
+
+    monkeypatch.setattr(tts.lamonfox_service, "stream_voice", FakeStream(error=RuntimeError("Lemonfox is down")))
+    monkeypatch.setattr(tts.tts_router, "generate_voice", generate_voice)
+    user = make_user("Paid")
+
+    response = _post(client, auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.content == b"from the router"
+    assert calls == ["mp3"]
+    assert _tokens(db, user) == 3
+
+
+@pytest.mark.skipif(not audio_utils.AUDIO_PROCESSING_AVAILABLE, reason="needs NumPy and ffmpeg")
+def test_a_trial_stream_ends_with_the_watermark(client, make_user, auth_headers, monkeypatch):
+    from utils import pcm_pipeline
+    from utils.mp3_utils import duration_seconds
+
+    speech = pcm_pipeline.encode(pcm_pipeline.tone(300, 2000, 24000, 1, -6), "mp3", 64)
+    monkeypatch.setattr(tts.lamonfox_service, "stream_voice", FakeStream(chunks=(speech,)))
+    user = make_user("Free")
+
+    response = _post(client, auth_headers(user))
+
+    assert response.status_code == 200
+    assert response.content.startswith(speech)
+    assert duration_seconds(response.content) > duration_seconds(speech) + 0.9
+
+
+def test_a_trial_stream_without_a_watermark_is_refused(client, db, make_user, auth_headers, stream, monkeypatch):
+    monkeypatch.setattr(tts, "watermark_frames_for", lambda audio: b"")
+    monkeypatch.setattr(tts, "encode_watermark_frames", lambda audio: b"")
+    user = make_user("Free")
+
+    response = _post(client, auth_headers(user))
+
+    assert response.status_code == 503
+    assert response.json()["error"]["error_type"] == "WATERMARK_UNAVAILABLE"
+    assert _tokens(db, user) == 0
@@ -0,0 +1,63 @@
+import pytest
+
+from utils import audio_utils
+from utils.mp3_utils import audio_frames, duration_seconds, first_frame_header
+
+pytestmark = pytest.mark.skipif(not audio_utils.AUDIO_PROCESSING_AVAILABLE, reason="needs NumPy and ffmpeg")
+
+
+def _speech(sample_rate: int = 24000, channels: int = 1, bitrate: int = 64) -> bytes:
+    from utils import pcm_pipeline
+
+    return pcm_pipeline.encode(pcm_pipeline.tone(300, 2000, sample_rate, channels, -6), "mp3", bitrate)
+
+
+@pytest.fixture(autouse=True)
+def no_pre_encoded_watermarks(monkeypatch):
+    monkeypatch.setattr(audio_utils, "_watermark_frames", {})
+
+
+def test_matching_watermark_frames_are_appended_without_decoding():
+    speech = _speech()
+    assert audio_utils.encode_watermark_frames(speech)
+
+    watermarked, path = audio_utils.watermark_audio_with_path(speech)
+
+    assert path == "frame_appends"
+    # The speech frames come through untouched, followed by about a second of beep
+    assert watermarked.startswith(b"".join(audio_frames(speech)))
+    assert 0.9 < duration_seconds(watermarked) - duration_seconds(speech) < 1.2
+    header = first_frame_header(watermarked[-2000:])
+    assert (header.sample_rate, header.channels) == (24000, 1)
+
+
+def test_without_a_matching_variant_the_audio_is_re_encoded_once():
+    speech = _speech(sample_rate=16000)
+
+    watermarked, path = audio_utils.watermark_audio_with_path(speech)
+
+    assert path == "decode_fallbacks"
+    header = first_frame_header(watermarked)
+    assert header.sample_rate == 16000
+    assert duration_seconds(watermarked) > duration_seconds(speech) + 0.9
+
+
+def test_stream_watermark_matches_the_stream():
+    speech = _speech(sample_rate=16000, channels=1, bitrate=40)
+
+    frames = audio_utils.encode_watermark_frames(speech)
+
+    header = first_frame_header(frames)
+    assert (header.sample_rate, header.channels) == (16000, 1)
+    assert audio_utils.watermark_frames_for(speech) == frames
+
+
+def test_watermark_counts_the_path_taken():
+    before = dict(audio_utils.WATERMARK_STATS)
+    speech = _speech()
+    audio_utils.encode_watermark_frames(speech)
+
+    audio_utils.watermark_audio(speech)
+
+    assert audio_utils.WATERMARK_STATS["frame_appends"] == before["frame_appends"] + 1
+    assert audio_utils.WATERMARK_STATS["decode_fallbacks"] == before["decode_fallbacks"]
@@ -0,0 +1,78 @@
+import os
+import shutil
+import subprocess
+from typing import Optional
+
+# Output formats offered to clients: media type, file extension, ffmpeg encoder arguments
+# and the bitrate used when a transcode is needed but no bitrate was requested
+AUDIO_FORMATS = {
+    "mp3": {"media_type": "audio/mpeg", "extension": "mp3", "codec": ["-c:a", "libmp3lame", "-f", "mp3"], "default_kbps": 64},
+    "opus": {"media_type": "audio/ogg", "extension": "ogg", "codec": ["-c:a", "libopus", "-application", "voip", "-f", "ogg"], "default_kbps": 32},
+    "aac": {"media_type": "audio/aac", "extension": "aac", "codec": ["-c:a", "aac", "-f", "adts"], "default_kbps": 48},
+}
+
+MIN_BITRATE_KBPS = 16
+MAX_BITRATE_KBPS = 192
+
+# Extension -> media type, for serving stored files
+MEDIA_TYPES = {spec["extension"]: spec["media_type"] for spec in AUDIO_FORMATS.values()}
+
+TRANSCODE_TIMEOUT_SECONDS = 60
+
+
+def media_type_for(fmt: str) -> str:
+    return AUDIO_FORMATS[fmt]["media_type"]
+
+
+def extension_for(fmt: str) -> str:
+    return AUDIO_FORMATS[fmt]["extension"]
+
+
+def validate_format(fmt: str, bitrate: Optional[int]) -> Optional[str]:
+    """Returns an error message for an unsupported format/bitrate, otherwise None"""
+    if fmt not in AUDIO_FORMATS:
+        return f"Unsupported format '{fmt}'. Supported formats: {', '.join(AUDIO_FORMATS)}"
+    if bitrate is not None and not MIN_BITRATE_KBPS <= bitrate <= MAX_BITRATE_KBPS:
+        return f"Bitrate must be between {MIN_BITRATE_KBPS} and {MAX_BITRATE_KBPS} kbps"
+    return None
+
+
+def needs_transcode(fmt: str, bitrate: Optional[int]) -> bool:
+    """MP3 at the upstream bitrate is what synthesis produces; everything else is a variant"""
+    return fmt != "mp3" or bitrate is not None
+
+
+def find_ffmpeg() -> str:
+    """ffmpeg configured at import time (imageio-ffmpeg or system), else the one on PATH"""
+    binary = os.environ.get("FFMPEG_BINARY")
+    if not binary:
+        try:
+            import imageio_ffmpeg
+            binary = imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            binary = shutil.which("ffmpeg")
+    if not binary:
+        raise RuntimeError("ffmpeg is not available for audio processing")
+    return binary
+
+
+def transcode_audio(audio_data: bytes, fmt: str, bitrate: Optional[int] = None) -> bytes:
+    """
+    Transcode audio to fmt at bitrate kbps (the format's default when None) with one
+    ffmpeg process, piping through stdin/stdout. Speech is mono, so output is mono.
+    Runs in the audio executor.
+    """
+    spec = AUDIO_FORMATS[fmt]
+    kbps = bitrate or spec["default_kbps"]
+    command = [
+        find_ffmpeg(), "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn", "-ac", "1",
+        *spec["codec"],
+        "-b:a", f"{kbps}k",
+        "pipe:1",
+    ]
+    result = subprocess.run(command, input=audio_data, capture_output=True, timeout=TRANSCODE_TIMEOUT_SECONDS)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"ffmpeg transcode to {fmt}@{kbps}k failed: {result.stderr.decode('utf-8', 'replace')[-300:]}")
+    return result.stdout
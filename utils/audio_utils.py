@@ -1,22 +1,22 @@
 import base64
-import io
 import os
 import shutil
+from typing import Optional, Tuple
 from dotenv import load_dotenv
+from utils.mp3_utils import audio_frames, first_frame_header
 
 load_dotenv()
 
-# Configure pydub to use ffmpeg BEFORE importing pydub
-# This prevents the warning from appearing when pydub checks for ffmpeg at import time
+# Locate ffmpeg (used by the PCM pipeline to decode/encode) and export it as FFMPEG_BINARY
 ffmpeg_binary = None
 try:
     import imageio_ffmpeg
     ffmpeg_binary = imageio_ffmpeg.get_ffmpeg_exe()
     ffmpeg_dir = os.path.dirname(ffmpeg_binary)
-    # Add to PATH so pydub can find it
+    # Add to PATH so subprocesses (and MoviePy) can find it
     if ffmpeg_dir not in os.environ.get("PATH", ""):
         os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
-    # Set environment variable that pydub checks
+    # Set environment variable the PCM pipeline checks
     os.environ["FFMPEG_BINARY"] = ffmpeg_binary
 except Exception:
     # Fallback to system ffmpeg
@@ -28,53 +28,160 @@ except Exception:
         os.environ["FFMPEG_BINARY"] = ffmpeg_path
         ffmpeg_binary = ffmpeg_path
 
-# Suppress pydub's warning by setting the converter before import
-# pydub checks for ffmpeg in utils.py at import time, so we need to configure it first
-import warnings
-warnings.filterwarnings("ignore", message=".*ffmpeg.*", category=RuntimeWarning)
-
-# Try to import pydub, fallback if not available
+# Decoding/encoding needs NumPy and ffmpeg; without them trial audio is not watermarked
 try:
-    from pydub import AudioSegment
-    # Configure AudioSegment to use our ffmpeg binary if found
-    if ffmpeg_binary:
-        # Set the converter directly to avoid pydub's check
-        AudioSegment.converter = ffmpeg_binary
-    PYDUB_AVAILABLE = True
+    from utils import pcm_pipeline
+    AUDIO_PROCESSING_AVAILABLE = ffmpeg_binary is not None
 except ImportError:
-    PYDUB_AVAILABLE = False
-    print("Warning: pydub not available. Watermarking will be disabled.")
+    AUDIO_PROCESSING_AVAILABLE = False
+if not AUDIO_PROCESSING_AVAILABLE:
+    print("Warning: NumPy or ffmpeg not available. Watermarking will be disabled.")
 
-def add_watermark_to_audio(audio_data: bytes) -> str:
+# Watermark settings: a short beep appended to trial audio
+WATERMARK_FREQUENCY = 440
+WATERMARK_DURATION_MS = 1000
+WATERMARK_VOLUME_DB = -12.0
+
+# Stream parameters the watermark is pre-encoded for at startup
+WATERMARK_SAMPLE_RATES = (22050, 24000, 44100, 48000)
+WATERMARK_CHANNELS = (1, 2)
+WATERMARK_BITRATES = (32, 48, 64, 96, 128, 192)
+
+# (sample_rate, channels, bitrate) -> MP3 frames of the watermark (no tags / Info header)
+_watermark_frames = {}
+
+WATERMARK_STATS = {
+    "frame_appends": 0,
+    "decode_fallbacks": 0,
+}
+
+
+def _watermark_tone(sample_rate: int = 44100, channels: int = 1):
+    return pcm_pipeline.tone(WATERMARK_FREQUENCY, WATERMARK_DURATION_MS, sample_rate, channels, WATERMARK_VOLUME_DB)
+
+
+def prepare_watermarks() -> int:
+    """
+    Pre-encode the watermark for common sample rates, channel counts and bitrates
+    so trial audio can be watermarked by appending MP3 frames, without decoding.
+    Returns the number of variants prepared.
+    """
+    if not AUDIO_PROCESSING_AVAILABLE:
+        return 0
+    for sample_rate in WATERMARK_SAMPLE_RATES:
+        for channels in WATERMARK_CHANNELS:
+            for bitrate in WATERMARK_BITRATES:
+                try:
+                    encoded = pcm_pipeline.encode(_watermark_tone(sample_rate, channels), "mp3", bitrate)
+                except Exception as e:
+                    print(f"Error pre-encoding watermark ({sample_rate} Hz, {channels} ch, {bitrate}k): {e}")
+                    continue
+                header = first_frame_header(encoded)
+                if header is None:
+                    continue
+                # Key by what the encoder actually produced (it may clamp the bitrate)
+                _watermark_frames[(header.sample_rate, header.channels, header.bitrate)] = b"".join(audio_frames(encoded))
+    return len(_watermark_frames)
+
+
+def _find_watermark_frames(header) -> bytes:
+    """
+    Pre-encoded watermark matching the stream's sample rate and channels.
+    Prefers the same bitrate, otherwise the closest one (MP3 allows the
+    bitrate to change between frames; sample rate and channels may not).
+    """
+    exact = _watermark_frames.get((header.sample_rate, header.channels, header.bitrate))
+    if exact is not None:
+        return exact
+    candidates = [
+        (abs(bitrate - header.bitrate), frames)
+        for (sample_rate, channels, bitrate), frames in _watermark_frames.items()
+        if sample_rate == header.sample_rate and channels == header.channels
+    ]
+    if not candidates:
+        return b""
+    return min(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def watermark_frames_for(audio_data: bytes) -> bytes:
+    """Watermark frames compatible with the given MP3 audio (empty if none match)"""
+    header = first_frame_header(audio_data)
+    if header is None:
+        return b""
+    return _find_watermark_frames(header)
+
+
+def _watermark_with_decode(audio_data: bytes) -> bytes:
     """
-    Add watermark audio to the generated voice for trial users
+    Fallback: decode once, append the beep and encode once (PCM pipeline).
+    Only used when no pre-encoded watermark matches the stream.
     """
-    if not PYDUB_AVAILABLE:
-        # If pydub is not available, just return the original audio
-        return base64.b64encode(audio_data).decode('utf-8')
-    
+    header = first_frame_header(audio_data)
+    bitrate = header.bitrate if header else None
+    return pcm_pipeline.Pipeline(pcm_pipeline.append(_watermark_tone)).process(audio_data, "mp3", bitrate)
+
+
+def watermark_audio_with_path(audio_data: bytes) -> Tuple[bytes, Optional[str]]:
+    """
+    Append the watermark to MP3 audio at a frame boundary (no codec involved).
+    The beep goes at the end: frames after a splice could reference the bit
+    reservoir of the frames before it, so the watermark is never spliced into
+    the middle of the speech.
+    Also returns the WATERMARK_STATS key of the path taken (None if nothing was
+    done), so a caller running this in a worker process can count it.
+    """
+    if not AUDIO_PROCESSING_AVAILABLE:
+        # Without NumPy/ffmpeg, just return the original audio
+        return audio_data, None
+
     try:
-        # Load the main audio
-        main_audio = AudioSegment.from_file(io.BytesIO(audio_data))
-        
-        # Create watermark text as audio (you might want to use TTS for this)
-        # For now, we'll create a simple beep as watermark
-        watermark_audio = AudioSegment.sine(440, duration=1000)  # 1 second beep
-        
-        # Add watermark at the end
-        watermarked_audio = main_audio + watermark_audio
-        
-        # Convert to base64 for streaming
-        output = io.BytesIO()
-        watermarked_audio.export(output, format="mp3")
-        watermarked_data = output.getvalue()
-        
-        return base64.b64encode(watermarked_data).decode('utf-8')
-    
+        watermark = watermark_frames_for(audio_data)
+        if watermark:
+            return b"".join(audio_frames(audio_data)) + watermark, "frame_appends"
+        return _watermark_with_decode(audio_data), "decode_fallbacks"
+
     except Exception as e:
         print(f"Error adding watermark: {e}")
         # Return original audio if watermarking fails
-        return base64.b64encode(audio_data).decode('utf-8')
+        return audio_data, None
+
+
+def watermark_audio(audio_data: bytes) -> bytes:
+    """Watermark MP3 audio in this process (see watermark_audio_with_path)"""
+    audio_data, path = watermark_audio_with_path(audio_data)
+    if path is not None:
+        WATERMARK_STATS[path] += 1
+    return audio_data
+
+
+def add_watermark_to_audio(audio_data: bytes) -> str:
+    """
+    Add watermark audio to the generated voice for trial users (base64 result)
+    """
+    return base64.b64encode(watermark_audio(audio_data)).decode('utf-8')
+
+
+def encode_watermark_frames(audio_data: bytes) -> bytes:
+    """
+    Encode the watermark for the stream's own sample rate, channels and bitrate
+    when no pre-encoded variant matches (kept for later streams). Returns bare
+    MP3 frames, or empty when the encoder cannot match the stream: appending
+    frames of another sample rate or channel count breaks playback.
+    """
+    header = first_frame_header(audio_data)
+    if header is None or not AUDIO_PROCESSING_AVAILABLE:
+        return b""
+    try:
+        encoded = pcm_pipeline.encode(_watermark_tone(header.sample_rate, header.channels), "mp3", header.bitrate)
+    except Exception as e:
+        print(f"Error encoding watermark ({header.sample_rate} Hz, {header.channels} ch, {header.bitrate}k): {e}")
+        return b""
+    produced = first_frame_header(encoded)
+    if produced is None or (produced.sample_rate, produced.channels) != (header.sample_rate, header.channels):
+        return b""
+    frames = b"".join(audio_frames(encoded))
+    _watermark_frames[(produced.sample_rate, produced.channels, produced.bitrate)] = frames
+    return frames
 
 def audio_to_base64(audio_data: bytes) -> str:
     """
@@ -0,0 +1,310 @@
+# Logging for the API process.
+# Records are handed to a queue on the calling thread and written to stdout by a
+# QueueListener thread, so a slow stdout consumer never blocks the event loop.
+# Every record carries the request id (RequestContextMiddleware).
+#
+# Per-module levels and sampling (LOG_LEVELS / LOG_SAMPLING, "module=value,..."):
+# records below WARNING from a sampled module are held back for the duration of
+# the request and written only if the request is sampled (one random draw per
+# request, so a sampled request is complete) or if it failed (an ERROR record or
+# a 5xx response). A module matches its own logger and every child logger.
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Request id of the request being handled ("-" outside requests)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class _RequestLogs:
+    """Held-back records of one request and whether it failed"""
+
+    __slots__ = ("records", "failed", "draw")
+
+    def __init__(self, max_records: int):
+        self.records = deque(maxlen=max_records)
+        self.failed = False
+        self.draw = random.random()
+
+
+_request_logs: ContextVar[Optional[_RequestLogs]] = ContextVar("request_logs", default=None)
+
+
+def parse_module_settings(value: str, cast) -> Dict[str, object]:
+    """'services.lamonfox_service=DEBUG, routes.tts=INFO' -> {'services.lamonfox_service': 'DEBUG', ...}"""
+    result = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        module, setting = item.split("=", 1)
+        result[module.strip()] = cast(setting.strip())
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request id, message (and exception)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+
+class _QueueDrainHandler(logging.StreamHandler):
+    """StreamHandler for the listener thread: flushes once the queue is drained, not per record"""
+
+    def __init__(self, stream, log_queue: queue.SimpleQueue):
+        super().__init__(stream)
+        self.log_queue = log_queue
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if self.log_queue.empty():
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class SampledQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that tags records with the request id, holds back sampled
+    modules' records until the request ends, and drops records (counting them)
+    instead of blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, sampling: Dict[str, float], max_size: int = 10000, max_request_records: int = 500):
+        super().__init__(log_queue)
+        self.sampling = sampling
+        self.max_size = max_size
+        self.max_request_records = max_request_records
+        self._rates: Dict[str, float] = {}
+        self.counters = {
+            "written": 0,
+            "sampled_out": 0,
+            "dropped": 0,
+        }
+
+    def rate_for(self, name: str) -> float:
+        """Sampling rate of the most specific configured module for a logger name"""
+        rate = self._rates.get(name)
+        if rate is None:
+            rate = 1.0
+            module = name
+            while module:
+                if module in self.sampling:
+                    rate = self.sampling[module]
+                    break
+                module = module.rpartition(".")[0]
+            self._rates[name] = rate
+        return rate
+
+    def emit(self, record: logging.LogRecord) -> None:
+        record.request_id = request_id_var.get()
+        request_logs = _request_logs.get()
+        if record.levelno >= logging.WARNING:
+            if request_logs is not None and record.levelno >= logging.ERROR:
+                request_logs.failed = True
+            self.put(record)
+            return
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            self.put(record)
+        elif request_logs is not None:
+            request_logs.records.append(record)
+        elif random.random() < rate:
+            self.put(record)
+        else:
+            self.counters["sampled_out"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message arguments and render the traceback on the caller's thread
+        (they may change or be freed later). Unlike QueueHandler.prepare the record is
+        not copied: this is the only handler on the root logger.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def put(self, record: logging.LogRecord) -> None:
+        # SimpleQueue has no bound of its own (and no lock to take on put)
+        if self.queue.qsize() >= self.max_size:
+            self.counters["dropped"] += 1
+            return
+        try:
+            self.enqueue(self.prepare(record))
+            self.counters["written"] += 1
+        except Exception:
+            self.handleError(record)
+
+    def begin_request(self) -> _RequestLogs:
+        return _RequestLogs(self.max_request_records)
+
+    def end_request(self, request_logs: _RequestLogs, failed: bool = False) -> None:
+        """Write the request's held-back records that are sampled in (all of them if it failed)"""
+        failed = failed or request_logs.failed
+        for record in request_logs.records:
+            if failed or request_logs.draw < self.rate_for(record.name):
+                self.put(record)
+            else:
+                self.counters["sampled_out"] += 1
+        request_logs.records.clear()
+
+    def stats(self) -> dict:
+        return {**self.counters, "queued": self.queue.qsize()}
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware: gives every HTTP request an id (the client's X-Request-ID or
+    a new one), returns it in the X-Request-ID response header and settles the
+    request's sampled log records when the response is done.
+    """
+
+    def __init__(self, app, handler: Optional[SampledQueueHandler] = None):
+        self.app = app
+        self.handler = handler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        handler = self.handler or _handler
+        request_logs = handler.begin_request() if handler is not None else None
+        logs_token = _request_logs.set(request_logs)
+        status_code = 500
+
+        async def _send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if request_logs is not None:
+                handler.end_request(request_logs, failed=status_code >= 500)
+            _request_logs.reset(logs_token)
+            request_id_var.reset(token)
+
+
+_handler: Optional[SampledQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    module_levels: Optional[Dict[str, str]] = None,
+    sampling: Optional[Dict[str, float]] = None,
+    queue_size: int = 10000,
+    stream=None,
+) -> SampledQueueHandler:
+    """
+    Route all logging through one queue to stdout (or stream). Call after the
+    application modules are imported: they set their own logger levels at import,
+    which module_levels then overrides. Safe to call again (reconfigures).
+    """
+    global _handler, _listener
+    stop_logging()
+
+    # The formatters use none of these, and looking them up costs more than the rest of a record.
+    # Caller information (pathname, lineno, funcName) is still filled in for any handler that uses it
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    output = _QueueDrainHandler(stream or sys.stdout, log_queue)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _handler = SampledQueueHandler(log_queue, sampling or {}, max_size=queue_size)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, SampledQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    for module, module_level in (module_levels or {}).items():
+        logging.getLogger(module).setLevel(str(module_level).upper())
+
+    _listener.start()
+    return _handler
+
+
+def stop_logging() -> None:
+    """Stop the listener after it has written everything already queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
+
+
+def configure_worker_logging() -> None:
+    """
+    In a forked worker process: write records straight to stdout. The queue
+    handler was inherited from the parent, but its listener thread was not, so
+    nothing would ever drain the queue.
+    """
+    global _handler, _listener
+    if _handler is None:
+        return
+    formatter = _listener.handlers[0].formatter if _listener is not None else JsonFormatter()
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+    output.addFilter(_tag_request_id)
+    root.addHandler(output)
+    _handler = None
+    _listener = None
+
+
+def _tag_request_id(record: logging.LogRecord) -> bool:
+    record.request_id = request_id_var.get()
+    return True
+
+
+def logging_stats() -> Optional[dict]:
+    return _handler.stats() if _handler is not None else None
@@ -0,0 +1,152 @@
+# Minimal MPEG audio (Layer III) frame parser.
+# Lets us join and inspect MP3 streams at frame boundaries without decoding,
+# so concatenating TTS chunks never runs a codec.
+from typing import Iterator, List, Optional, Tuple
+
+# Bitrates in kbps, indexed by the 4-bit bitrate field
+_BITRATES_V1_L3 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2_L3 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# Sample rates indexed by the 2-bit version field, then the 2-bit rate field
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+class FrameHeader:
+    """Decoded 4-byte MPEG Layer III frame header"""
+
+    __slots__ = ("version", "bitrate", "sample_rate", "padding", "channel_mode", "frame_length")
+
+    def __init__(self, version: int, bitrate: int, sample_rate: int, padding: int, channel_mode: int, frame_length: int):
+        self.version = version
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channel_mode = channel_mode
+        self.frame_length = frame_length
+
+    @property
+    def channels(self) -> int:
+        return 1 if self.channel_mode == 3 else 2
+
+    @property
+    def samples_per_frame(self) -> int:
+        return 1152 if self.version == 3 else 576
+
+    @property
+    def side_info_size(self) -> int:
+        if self.version == 3:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+
+def parse_frame_header(data: bytes, offset: int) -> Optional[FrameHeader]:
+    """
+    Parse the frame header at offset, or return None if it is not a valid
+    Layer III header (free-format bitrate is not supported).
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    if version == 1 or layer != 1:  # reserved version / not Layer III
+        return None
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = (_BITRATES_V1_L3 if version == 3 else _BITRATES_V2_L3)[bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+    coefficient = 144 if version == 3 else 72
+    frame_length = coefficient * bitrate * 1000 // sample_rate + padding
+    return FrameHeader(version, bitrate, sample_rate, padding, channel_mode, frame_length)
+
+
+def _skip_id3v2(data: bytes) -> int:
+    """Return the offset just past a leading ID3v2 tag (0 if none)"""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _audio_end(data: bytes) -> int:
+    """Return the end offset of audio data, excluding a trailing ID3v1 tag"""
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        return len(data) - 128
+    return len(data)
+
+
+def is_info_frame(data: bytes, offset: int, header: FrameHeader) -> bool:
+    """True for a Xing/Info/VBRI metadata frame (carries no audio)"""
+    xing_at = offset + 4 + header.side_info_size
+    if data[xing_at:xing_at + 4] in (b"Xing", b"Info"):
+        return True
+    return data[offset + 36:offset + 40] == b"VBRI"
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, FrameHeader]]:
+    """
+    Yield (offset, header) for every audio frame, skipping tags and
+    resynchronising over garbage between frames.
+    """
+    offset = _skip_id3v2(data)
+    end = _audio_end(data)
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is not None and offset + header.frame_length <= end:
+            # Require the next frame (or end of data) to line up, to avoid false syncs
+            next_offset = offset + header.frame_length
+            if next_offset + 4 > end or parse_frame_header(data, next_offset) is not None:
+                yield offset, header
+                offset = next_offset
+                continue
+        offset += 1
+
+
+def audio_frames(data: bytes) -> List[bytes]:
+    """Return the raw audio frames of an MP3 stream, without tags or Xing/Info frames"""
+    frames = []
+    for offset, header in iter_frames(data):
+        if not frames and is_info_frame(data, offset, header):
+            continue
+        frames.append(data[offset:offset + header.frame_length])
+    return frames
+
+
+def first_frame_header(data: bytes) -> Optional[FrameHeader]:
+    """Header of the first audio frame, used to read stream parameters"""
+    for offset, header in iter_frames(data):
+        if not is_info_frame(data, offset, header):
+            return header
+    return None
+
+
+def duration_seconds(data: bytes) -> float:
+    """Duration computed from frame headers"""
+    total = 0.0
+    for offset, header in iter_frames(data):
+        if total == 0.0 and is_info_frame(data, offset, header):
+            continue
+        total += header.samples_per_frame / header.sample_rate
+    return total
+
+
+def concat_mp3(parts: List[bytes]) -> bytes:
+    """
+    Join MP3 streams at frame boundaries (no decode/re-encode).
+    Tags and Xing/Info headers are dropped so players compute the
+    duration from the frames themselves.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(frame for part in parts for frame in audio_frames(part))
@@ -0,0 +1,194 @@
+# PCM audio pipeline on NumPy arrays.
+# Audio is decoded once (one ffmpeg process) into float32 samples, every stage
+# works on the array in place where it can (vectorized, no per-stage copies or
+# subprocesses), and the result is encoded once.
+#
+#   pipeline = Pipeline(gain(-3), normalize(-1.0), fade_in(50), fade_out(200))
+#   mp3 = pipeline.process(mp3_bytes)
+import subprocess
+from typing import Callable, Optional
+
+import numpy as np
+
+from utils.audio_formats import AUDIO_FORMATS, find_ffmpeg
+from utils.mp3_utils import first_frame_header
+
+# TTS providers return 24 kHz mono; used when the input's parameters cannot be read
+DEFAULT_SAMPLE_RATE = 24000
+DEFAULT_CHANNELS = 1
+
+FFMPEG_TIMEOUT_SECONDS = 120
+
+
+class Pcm:
+    """float32 samples shaped (frames, channels) in [-1, 1], plus the sample rate"""
+
+    __slots__ = ("samples", "sample_rate")
+
+    def __init__(self, samples: np.ndarray, sample_rate: int):
+        if samples.ndim == 1:
+            samples = samples.reshape(-1, 1)
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+
+Stage = Callable[[Pcm], Pcm]
+
+
+def _run_ffmpeg(args: list, data: bytes) -> bytes:
+    result = subprocess.run(
+        [find_ffmpeg(), "-hide_banner", "-loglevel", "error", *args],
+        input=data, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace')[-300:]}")
+    return result.stdout
+
+
+# ---------- decode / encode ----------
+
+def decode(audio_data: bytes, sample_rate: Optional[int] = None, channels: Optional[int] = None) -> Pcm:
+    """Decode any ffmpeg-readable audio to PCM, keeping an MP3's own rate/channels unless given"""
+    header = first_frame_header(audio_data)
+    sample_rate = sample_rate or (header.sample_rate if header else DEFAULT_SAMPLE_RATE)
+    channels = channels or (header.channels if header else DEFAULT_CHANNELS)
+    raw = _run_ffmpeg(
+        ["-i", "pipe:0", "-vn", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"],
+        audio_data,
+    )
+    samples = np.frombuffer(raw, dtype=np.float32).reshape(-1, channels).copy()  # writable for in-place stages
+    return Pcm(samples, sample_rate)
+
+
+def encode(pcm: Pcm, fmt: str = "mp3", bitrate: Optional[int] = None) -> bytes:
+    """Encode PCM with one ffmpeg process (bitrate in kbps, the format's default when None)"""
+    spec = AUDIO_FORMATS[fmt]
+    np.clip(pcm.samples, -1.0, 1.0, out=pcm.samples)
+    # 16-bit is what the encoders consume; converting here halves the data piped to ffmpeg
+    samples = (pcm.samples * 32767.0).astype(np.int16)
+    return _run_ffmpeg(
+        [
+            "-f", "s16le", "-ar", str(pcm.sample_rate), "-ac", str(pcm.channels), "-i", "pipe:0",
+            *spec["codec"], "-b:a", f"{bitrate or spec['default_kbps']}k", "pipe:1",
+        ],
+        samples.tobytes(),
+    )
+
+
+# ---------- generators ----------
+
+def tone(frequency: float, duration_ms: int, sample_rate: int, channels: int = 1, volume_db: float = 0.0) -> Pcm:
+    """Sine tone at volume_db dBFS"""
+    t = np.arange(int(sample_rate * duration_ms / 1000), dtype=np.float32) / sample_rate
+    wave = (db_to_amplitude(volume_db) * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return Pcm(np.repeat(wave[:, None], channels, axis=1), sample_rate)
+
+
+def db_to_amplitude(db: float) -> float:
+    return float(10 ** (db / 20))
+
+
+def _matched(clip: Pcm, pcm: Pcm) -> np.ndarray:
+    """clip's samples with pcm's channel count (sample rates must already match)"""
+    if clip.sample_rate != pcm.sample_rate:
+        raise ValueError(f"Sample rate mismatch: {clip.sample_rate} != {pcm.sample_rate}")
+    if clip.channels == pcm.channels:
+        return clip.samples
+    if clip.channels == 1:
+        return np.repeat(clip.samples, pcm.channels, axis=1)
+    return clip.samples.mean(axis=1, keepdims=True).repeat(pcm.channels, axis=1)
+
+
+# ---------- stages ----------
+
+def gain(db: float) -> Stage:
+    """Multiply by a fixed gain"""
+    factor = np.float32(db_to_amplitude(db))
+
+    def _gain(pcm: Pcm) -> Pcm:
+        pcm.samples *= factor
+        return pcm
+    return _gain
+
+
+def normalize(peak_db: float = -1.0) -> Stage:
+    """Scale so the loudest sample sits at peak_db dBFS (silence is left alone)"""
+    target = db_to_amplitude(peak_db)
+
+    def _normalize(pcm: Pcm) -> Pcm:
+        peak = float(np.max(np.abs(pcm.samples))) if pcm.frames else 0.0
+        if peak > 0:
+            pcm.samples *= np.float32(target / peak)
+        return pcm
+    return _normalize
+
+
+def fade_in(duration_ms: int) -> Stage:
+    def _fade_in(pcm: Pcm) -> Pcm:
+        n = min(pcm.frames, int(pcm.sample_rate * duration_ms / 1000))
+        if n > 0:
+            pcm.samples[:n] *= np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+        return pcm
+    return _fade_in
+
+
+def fade_out(duration_ms: int) -> Stage:
+    def _fade_out(pcm: Pcm) -> Pcm:
+        n = min(pcm.frames, int(pcm.sample_rate * duration_ms / 1000))
+        if n > 0:
+            pcm.samples[-n:] *= np.linspace(1.0, 0.0, n, dtype=np.float32)[:, None]
+        return pcm
+    return _fade_out
+
+
+def overlay_every(make_clip: Callable[[int, int], Pcm], interval_seconds: float, offset_seconds: float = 0.0) -> Stage:
+    """
+    Mix a clip into the audio every interval_seconds, starting at offset_seconds.
+    make_clip(sample_rate, channels) builds the clip for the audio's parameters.
+    """
+    def _overlay(pcm: Pcm) -> Pcm:
+        clip = _matched(make_clip(pcm.sample_rate, pcm.channels), pcm)
+        step = max(1, int(interval_seconds * pcm.sample_rate))
+        for start in range(int(offset_seconds * pcm.sample_rate), pcm.frames, step):
+            end = min(pcm.frames, start + len(clip))
+            pcm.samples[start:end] += clip[:end - start]
+        return pcm
+    return _overlay
+
+
+def append(make_clip: Callable[[int, int], Pcm]) -> Stage:
+    """Append a clip (built for the audio's parameters) at the end"""
+    def _append(pcm: Pcm) -> Pcm:
+        clip = _matched(make_clip(pcm.sample_rate, pcm.channels), pcm)
+        return Pcm(np.concatenate([pcm.samples, clip]), pcm.sample_rate)
+    return _append
+
+
+class Pipeline:
+    """Composable sequence of stages; decode once, run every stage, encode once"""
+
+    def __init__(self, *stages: Stage):
+        self.stages = list(stages)
+
+    def then(self, *stages: Stage) -> "Pipeline":
+        return Pipeline(*self.stages, *stages)
+
+    def run(self, pcm: Pcm) -> Pcm:
+        for stage in self.stages:
+            pcm = stage(pcm)
+        return pcm
+
+    def process(self, audio_data: bytes, fmt: str = "mp3", bitrate: Optional[int] = None) -> bytes:
+        return encode(self.run(decode(audio_data)), fmt, bitrate)